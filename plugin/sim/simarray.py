@@ -16,10 +16,13 @@
 #         Gris Ge <fge@redhat.com>
 
 import random
+import itertools
 import tempfile
 import os
+import shutil
 import time
 import sqlite3
+import unittest
 
 
 from lsm import (size_human_2_size_bytes)
@@ -65,11 +68,11 @@ def _random_vpd():
     return "".join(vpd)
 
 
-def _dict_factory(cursor, row):
-    d = {}
-    for idx, col in enumerate(cursor.description):
-        d[col[0]] = row[idx]
-    return d
+def _sql_value(value):
+    """
+    The value as _data_add() stores it.
+    """
+    return '' if value is None else str(value)
 
 
 class PoolRAID(object):
@@ -132,6 +135,31 @@ class BackStore(object):
     VERSION = "4.1"
     VERSION_SIGNATURE = 'LSM_SIMULATOR_DATA_%s_%s' % (VERSION, md5(VERSION))
     JOB_DEFAULT_DURATION = 1
+    # Seconds each kind of job takes on the virtual clock: a fixed part plus
+    # a part per GiB of data the operation has to copy or allocate.
+    JOB_DURATIONS = {
+        'volume_create': (0.5, 0),
+        'volume_delete': (0.5, 0),
+        'volume_resize': (0.5, 0.5),
+        'volume_replicate': (1, 2),
+        'volume_replicate_range': (0.5, 2),
+        'volume_child_dependency_rm': (1, 2),
+        'fs_create': (1, 0),
+        'fs_delete': (1, 0),
+        'fs_resize': (1, 0.5),
+        'fs_clone': (1, 0),
+        'fs_file_clone': (0.5, 0),
+        'fs_snapshot_create': (0.5, 0),
+        'fs_snapshot_delete': (0.5, 0),
+        'fs_snapshot_restore': (1, 0),
+        'fs_child_dependency_rm': (1, 2),
+    }
+    # On the virtual clock, each job_status() of an unfinished job lets this
+    # share of the job duration pass.
+    JOB_POLL_STEP = 0.1
+    # Clocks the jobs can run on.  The virtual one only moves when a client
+    # looks at or waits for a job, so nothing ever has to sleep.
+    CLOCKS = ('real', 'virtual')
     JOB_DATA_TYPE_VOL = 1
     JOB_DATA_TYPE_FS = 2
     JOB_DATA_TYPE_FS_SNAP = 3
@@ -149,6 +177,28 @@ class BackStore(object):
     _LIST_SPLITTER = '#'
     _ID_FMT_LEN = 5
 
+    # What sim_populate() can add, also the names of the sim URI parameters
+    # asking for it.
+    POPULATE_KEYS = ('pools', 'disks', 'volumes', 'access_groups',
+                     'initiators', 'masks', 'fs', 'fs_snapshots', 'exports')
+    _POPULATE_DISK_SIZE = size_human_2_size_bytes('1PiB')
+    _POPULATE_VOL_SIZE = size_human_2_size_bytes('1GiB')
+    _POPULATE_FS_SIZE = size_human_2_size_bytes('1GiB')
+
+    # Indexes on the columns referring to other tables, so that looking up
+    # the masks, initiators, replicas and so on of one object, and the
+    # ON DELETE CASCADE checks, don't scan the whole table.
+    _INDEXES = (
+        ('vol_masks', 'vol_id'), ('vol_masks', 'ag_id'),
+        ('inits', 'owner_ag_id'),
+        ('vol_reps', 'src_vol_id'), ('vol_reps', 'dst_vol_id'),
+        ('volumes', 'pool_id'), ('disks', 'owner_pool_id'),
+        ('pools', 'parent_pool_id'), ('fss', 'pool_id'),
+        ('fs_snaps', 'fs_id'),
+        ('fs_clones', 'src_fs_id'), ('fs_clones', 'dst_fs_id'),
+        ('exps', 'fs_id'), ('exp_root_hosts', 'exp_id'),
+        ('exp_rw_hosts', 'exp_id'), ('exp_ro_hosts', 'exp_id'))
+
     SUPPORTED_VCR_RAID_TYPES = [
         Volume.RAID_TYPE_RAID0, Volume.RAID_TYPE_RAID1,
         Volume.RAID_TYPE_RAID5, Volume.RAID_TYPE_RAID6,
@@ -159,7 +209,15 @@ class BackStore(object):
         8 * 1024, 16 * 1024, 32 * 1024, 64 * 1024, 128 * 1024, 256 * 1024,
         512 * 1024, 1024 * 1024]
 
-    def __init__(self, statefile, timeout):
+    # All SQL is parameterized, so each distinct statement is compiled
+    # once and then served from the sqlite3 module statement cache.
+    _SQL_CACHED_STATEMENTS = 256
+
+    # sqlite journal modes the state file can be switched to.  With 'wal'
+    # readers work on a snapshot and neither wait for nor block the writer.
+    JOURNAL_MODES = ('delete', 'wal')
+
+    def __init__(self, statefile, timeout, journal_mode=None):
         if not os.path.exists(statefile):
             os.close(os.open(statefile, os.O_WRONLY | os.O_CREAT))
             # Due to umask, os.open() created file might not be 666 permission.
@@ -168,8 +226,13 @@ def __init__(self, statefile, timeout):
         self.statefile = statefile
         self.lastrowid = None
         self.sql_conn = sqlite3.connect(
-            statefile, timeout=int(int_div(timeout, 1000)), isolation_level="IMMEDIATE")
-        self.sql_conn.row_factory = _dict_factory
+            statefile, timeout=int(int_div(timeout, 1000)),
+            isolation_level="IMMEDIATE",
+            cached_statements=BackStore._SQL_CACHED_STATEMENTS)
+
+        if journal_mode is not None:
+            self._journal_mode_set(journal_mode)
+
         # Create tables no matter exist or not. No lock required.
 
         sql_cmd = "PRAGMA foreign_keys = ON;\n"
@@ -395,7 +458,8 @@ def __init__(self, statefile, timeout):
 
         # Create views, SUBSTR() used below is alternative way of PRINTF()
         # which only exists on sqlite 3.8+ while RHEL6 or Ubuntu 12.04 ships
-        # older version.
+        # older version.  IDs are zero padded to _ID_FMT_LEN digits but not
+        # cut, so they stay unique past 10 ** _ID_FMT_LEN rows.
         sql_cmd += \
             """
             CREATE VIEW pools_view AS
@@ -403,7 +467,7 @@ def __init__(self, statefile, timeout):
                     pool0.id,
                         'POOL_ID_' ||
                             SUBSTR('{ID_PADDING}' || pool0.id,
-                                   -{ID_FMT_LEN}, {ID_FMT_LEN})
+                                   -MAX({ID_FMT_LEN}, LENGTH(pool0.id)))
                     lsm_pool_id,
                     pool0.name,
                     pool0.status,
@@ -415,7 +479,8 @@ def __init__(self, statefile, timeout):
                     pool0.parent_pool_id,
                         'POOL_ID_' ||
                             SUBSTR('{ID_PADDING}' || pool0.parent_pool_id,
-                                   -{ID_FMT_LEN}, {ID_FMT_LEN})
+                                   -MAX({ID_FMT_LEN},
+                                        LENGTH(pool0.parent_pool_id)))
                     parent_lsm_pool_id,
                     pool0.strip_size,
                     pool1.total_space total_space,
@@ -498,7 +563,7 @@ def __init__(self, statefile, timeout):
                     id,
                         'TGT_PORT_ID_' ||
                             SUBSTR('{ID_PADDING}' || id,
-                                   -{ID_FMT_LEN}, {ID_FMT_LEN})
+                                   -MAX({ID_FMT_LEN}, LENGTH(id)))
                     lsm_tgt_id,
                     port_type,
                     service_address,
@@ -516,7 +581,7 @@ def __init__(self, statefile, timeout):
                     id,
                         'DISK_ID_' ||
                             SUBSTR('{ID_PADDING}' || id,
-                                   -{ID_FMT_LEN}, {ID_FMT_LEN})
+                                   -MAX({ID_FMT_LEN}, LENGTH(id)))
                     lsm_disk_id,
                         disk_prefix || '_' || id
                     name,
@@ -540,7 +605,7 @@ def __init__(self, statefile, timeout):
                     id,
                         'VOL_ID_' ||
                             SUBSTR('{ID_PADDING}' || id,
-                                   -{ID_FMT_LEN}, {ID_FMT_LEN})
+                                   -MAX({ID_FMT_LEN}, LENGTH(id)))
                     lsm_vol_id,
                     vpd83,
                     name,
@@ -554,7 +619,7 @@ def __init__(self, statefile, timeout):
                     pool_id,
                         'POOL_ID_' ||
                             SUBSTR('{ID_PADDING}' || pool_id,
-                                   -{ID_FMT_LEN}, {ID_FMT_LEN})
+                                   -MAX({ID_FMT_LEN}, LENGTH(pool_id)))
                     lsm_pool_id
                 FROM
                     volumes;
@@ -567,7 +632,7 @@ def __init__(self, statefile, timeout):
                     id,
                         'FS_ID_' ||
                             SUBSTR('{ID_PADDING}' || id,
-                                   -{ID_FMT_LEN}, {ID_FMT_LEN})
+                                   -MAX({ID_FMT_LEN}, LENGTH(id)))
                     lsm_fs_id,
                     name,
                     total_space,
@@ -576,7 +641,7 @@ def __init__(self, statefile, timeout):
                     pool_id,
                         'POOL_ID_' ||
                             SUBSTR('{ID_PADDING}' || pool_id,
-                                   -{ID_FMT_LEN}, {ID_FMT_LEN})
+                                   -MAX({ID_FMT_LEN}, LENGTH(pool_id)))
                     lsm_pool_id
                 FROM
                     fss;
@@ -589,7 +654,7 @@ def __init__(self, statefile, timeout):
                     id,
                         'BAT_ID_' ||
                             SUBSTR('{ID_PADDING}' || id,
-                                   -{ID_FMT_LEN}, {ID_FMT_LEN})
+                                   -MAX({ID_FMT_LEN}, LENGTH(id)))
                     lsm_bat_id,
                     name,
                     type,
@@ -604,14 +669,14 @@ def __init__(self, statefile, timeout):
                     id,
                         'FS_SNAP_ID_' ||
                             SUBSTR('{ID_PADDING}' || id,
-                                   -{ID_FMT_LEN}, {ID_FMT_LEN})
+                                   -MAX({ID_FMT_LEN}, LENGTH(id)))
                     lsm_fs_snap_id,
                     name,
                     timestamp,
                     fs_id,
                         'FS_ID_' ||
                             SUBSTR('{ID_PADDING}' || fs_id,
-                                   -{ID_FMT_LEN}, {ID_FMT_LEN})
+                                   -MAX({ID_FMT_LEN}, LENGTH(fs_id)))
                     lsm_fs_id
                 FROM
                     fs_snaps;
@@ -624,7 +689,7 @@ def __init__(self, statefile, timeout):
                     vol.id,
                         'VOL_ID_' ||
                             SUBSTR('{ID_PADDING}' || vol.id,
-                                   -{ID_FMT_LEN}, {ID_FMT_LEN})
+                                   -MAX({ID_FMT_LEN}, LENGTH(vol.id)))
                     lsm_vol_id,
                     vol.vpd83,
                     vol.name,
@@ -633,7 +698,7 @@ def __init__(self, statefile, timeout):
                     vol.pool_id,
                         'POOL_ID_' ||
                             SUBSTR('{ID_PADDING}' || vol.pool_id,
-                                   -{ID_FMT_LEN}, {ID_FMT_LEN})
+                                   -MAX({ID_FMT_LEN}, LENGTH(vol.pool_id)))
                     lsm_pool_id,
                     vol.admin_state,
                     vol.is_hw_raid_vol,
@@ -654,7 +719,7 @@ def __init__(self, statefile, timeout):
                     ag.id,
                         'AG_ID_' ||
                             SUBSTR('{ID_PADDING}' || ag.id,
-                                   -{ID_FMT_LEN}, {ID_FMT_LEN})
+                                   -MAX({ID_FMT_LEN}, LENGTH(ag.id)))
                     lsm_ag_id,
                     ag.name,
                         CASE
@@ -683,7 +748,7 @@ def __init__(self, statefile, timeout):
                     ag_new.id,
                         'AG_ID_' ||
                             SUBSTR('{ID_PADDING}' || ag_new.id,
-                                   -{ID_FMT_LEN}, {ID_FMT_LEN})
+                                   -MAX({ID_FMT_LEN}, LENGTH(ag_new.id)))
                     lsm_ag_id,
                     ag_new.name,
                     ag_new.init_type,
@@ -724,12 +789,12 @@ def __init__(self, statefile, timeout):
                     exp.id,
                         'EXP_ID_' ||
                             SUBSTR('{ID_PADDING}' || exp.id,
-                                   -{ID_FMT_LEN}, {ID_FMT_LEN})
+                                   -MAX({ID_FMT_LEN}, LENGTH(exp.id)))
                     lsm_exp_id,
                     exp.fs_id,
                         'FS_ID_' ||
                             SUBSTR('{ID_PADDING}' || exp.fs_id,
-                                   -{ID_FMT_LEN}, {ID_FMT_LEN})
+                                   -MAX({ID_FMT_LEN}, LENGTH(exp.fs_id)))
                     lsm_fs_id,
                     exp.exp_path,
                     exp.auth_type,
@@ -810,6 +875,41 @@ def __init__(self, statefile, timeout):
                 "Stored simulator state incompatible with "
                 "simulator, please move or delete %s" % self.statefile)
 
+        # Not part of the script above, which stops at the first table that
+        # already exists, so that older state files get them too.
+        sql_cur.executescript(''.join(
+            "CREATE INDEX IF NOT EXISTS %s_%s_idx ON %s (%s);\n" %
+            (table, column, table, column)
+            for (table, column) in BackStore._INDEXES))
+
+        # Holds the time of the virtual clock, no row for the real clock.
+        sql_cur.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sim_clock (
+            id INTEGER PRIMARY KEY,
+            now REAL NOT NULL);
+            """)
+
+    def _journal_mode_set(self, journal_mode):
+        """
+        The journal mode is kept in the state file, so it applies to every
+        process using it from then on.
+        """
+        journal_mode = journal_mode.lower()
+        if journal_mode not in BackStore.JOURNAL_MODES:
+            raise LsmError(
+                ErrorNumber.INVALID_ARGUMENT,
+                "Invalid journal_mode '%s', supported: %s" %
+                (journal_mode, ", ".join(BackStore.JOURNAL_MODES)))
+
+        cur_mode = self.sql_conn.execute(
+            "PRAGMA journal_mode=%s;" % journal_mode).fetchone()[0]
+        if cur_mode.lower() != journal_mode:
+            raise LsmError(
+                ErrorNumber.INVALID_ARGUMENT,
+                "Unable to switch state file %s to journal_mode '%s'" %
+                (self.statefile, journal_mode))
+
     def _check_version(self):
         sim_syss = self.sim_syss()
         if len(sim_syss) == 0 or not sim_syss[0]:
@@ -824,11 +924,20 @@ def _check_version(self):
             "Stored simulator state incompatible with "
             "simulator, please move or delete %s" % self.statefile)
 
-    def check_version_and_init(self):
+    def check_version_and_init(self, populate=None):
         """
         Raise error if version not match.
-        If empty database found, initiate.
+        If empty database found, initiate, adding what populate asks for
+        with sim_populate().
         """
+        # Most of the time the state file is initialized already, find that
+        # out without waiting for the write lock.
+        self.trans_begin_read()
+        initialized = self._check_version()
+        self.trans_rollback()
+        if initialized:
+            return
+
         # The complex lock workflow is all caused by python sqlite3 do
         # autocommit for "CREATE TABLE" command.
         self.trans_begin()
@@ -954,80 +1063,72 @@ def check_version_and_init(self):
                 raid_type=Volume.RAID_TYPE_RAID0,
                 sim_disk_ids=test_pool_disks)
 
-            self._data_add(
-                'tgts',
+            self._data_add_many('tgts', [
                 {
                     'port_type': TargetPort.TYPE_FC,
                     'service_address': '50:0a:09:86:99:4b:8d:c5',
                     'network_address': '50:0a:09:86:99:4b:8d:c5',
                     'physical_address': '50:0a:09:86:99:4b:8d:c5',
                     'physical_name': 'FC_a_0b',
-                })
-
-            self._data_add(
-                'tgts',
+                },
                 {
                     'port_type': TargetPort.TYPE_FCOE,
                     'service_address': '50:0a:09:86:99:4b:8d:c6',
                     'network_address': '50:0a:09:86:99:4b:8d:c6',
                     'physical_address': '50:0a:09:86:99:4b:8d:c6',
                     'physical_name': 'FCoE_b_0c',
-                })
-            self._data_add(
-                'tgts',
+                },
                 {
                     'port_type': TargetPort.TYPE_ISCSI,
                     'service_address': 'iqn.1986-05.com.example:sim-tgt-03',
                     'network_address': 'sim-iscsi-tgt-3.example.com:3260',
                     'physical_address': 'a4:4e:31:47:f4:e0',
                     'physical_name': 'iSCSI_c_0d',
-                })
-            self._data_add(
-                'tgts',
+                },
                 {
                     'port_type': TargetPort.TYPE_ISCSI,
                     'service_address': 'iqn.1986-05.com.example:sim-tgt-03',
                     'network_address': '10.0.0.1:3260',
                     'physical_address': 'a4:4e:31:47:f4:e1',
                     'physical_name': 'iSCSI_c_0e',
-                })
-            self._data_add(
-                'tgts',
+                },
                 {
                     'port_type': TargetPort.TYPE_ISCSI,
                     'service_address': 'iqn.1986-05.com.example:sim-tgt-03',
                     'network_address': '[2001:470:1f09:efe:a64e:31ff::1]:3260',
                     'physical_address': 'a4:4e:31:47:f4:e1',
                     'physical_name': 'iSCSI_c_0e',
-                })
+                }])
 
-            self._data_add(
-                'batteries',
+            self._data_add_many('batteries', [
                 {
                     'name': 'Battery SIMB01, 8000 mAh, 05 March 2016',
                     'type': Battery.TYPE_CHEMICAL,
                     'status': Battery.STATUS_OK,
-                })
-
-            self._data_add(
-                'batteries',
+                },
                 {
                     'name': 'Capacitor SIMC01, 500 J, 05 March 2016',
                     'type': Battery.TYPE_CAPACITOR,
                     'status': Battery.STATUS_OK,
-                })
+                }])
+
+            if populate:
+                self.sim_populate(populate)
 
             self.trans_commit()
             return
 
-    def _sql_exec(self, sql_cmd):
+    def _sql_exec(self, sql_cmd, sql_params=()):
         """
-        Execute sql command and get all output.
+        Execute sql command with sql_params as the values of its '?'
+        placeholders and get all output as a list of dict.
         """
-        sql_cur = self.sql_conn.cursor()
-        sql_cur.execute(sql_cmd)
+        sql_cur = self.sql_conn.execute(sql_cmd, sql_params)
         self.lastrowid = sql_cur.lastrowid
-        return sql_cur.fetchall()
+        if sql_cur.description is None:
+            return []
+        keys = [col[0] for col in sql_cur.description]
+        return [dict(zip(keys, row)) for row in sql_cur.fetchall()]
 
     def _get_table(self, table_name):
         sql_cmd = "SELECT * FROM %s" % table_name
@@ -1036,25 +1137,244 @@ def _get_table(self, table_name):
     def trans_begin(self):
         self.sql_conn.execute("BEGIN IMMEDIATE TRANSACTION;")
 
+    def trans_begin_read(self):
+        """
+        Begin a transaction which only reads, it does not take the write
+        lock and sees the state file as of its first read.  End it with
+        trans_rollback().
+        """
+        self.sql_conn.execute("BEGIN DEFERRED TRANSACTION;")
+
     def trans_commit(self):
         self.sql_conn.commit()
 
     def trans_rollback(self):
         self.sql_conn.rollback()
 
+    def trans_savepoint(self):
+        """
+        Mark a point inside the transaction to go back to with
+        trans_savepoint_rollback(), dropped with trans_savepoint_release().
+        """
+        self.sql_conn.execute("SAVEPOINT sim_item;")
+
+    def trans_savepoint_release(self):
+        self.sql_conn.execute("RELEASE SAVEPOINT sim_item;")
+
+    def trans_savepoint_rollback(self):
+        self.sql_conn.execute("ROLLBACK TO SAVEPOINT sim_item;")
+        self.trans_savepoint_release()
+
+    @staticmethod
+    def _insert_sql(table_name, keys):
+        return "INSERT INTO %s (%s) VALUES (%s);" % \
+            (table_name, ", ".join(keys), ", ".join(["?"] * len(keys)))
+
     def _data_add(self, table_name, data_dict):
-        keys = list(data_dict.keys())
-        values = ['' if v is None else str(v) for v in list(data_dict.values())]
+        keys = sorted(data_dict.keys())
+        self._sql_exec(BackStore._insert_sql(table_name, keys),
+                       [_sql_value(data_dict[k]) for k in keys])
 
-        sql_cmd = "INSERT INTO %s (%s) VALUES (%s);" % \
-                  (table_name,
-                   "'%s'" % ("', '".join(keys)),
-                   "'%s'" % ("', '".join(values)))
-        self._sql_exec(sql_cmd)
+    def _data_add_many(self, table_name, data_dicts):
+        """
+        Insert data dicts, which all have the same keys, from a list or a
+        generator with a single executemany().  self.lastrowid is not
+        updated.
+        """
+        data_dicts = iter(data_dicts)
+        try:
+            first = next(data_dicts)
+        except StopIteration:
+            return
+        keys = sorted(first.keys())
+        self.sql_conn.executemany(
+            BackStore._insert_sql(table_name, keys),
+            ([_sql_value(d[k]) for k in keys]
+             for d in itertools.chain([first], data_dicts)))
 
-    def _data_find(self, table, condition, flag_unique=False):
+    def _next_id(self, table_name):
+        return self._sql_exec(
+            "SELECT ifnull(MAX(id), 0) AS max_id FROM %s;" %
+            table_name)[0]['max_id'] + 1
+
+    def sim_populate(self, counts):
+        """
+        Add as many of each kind of data as the counts dict, keyed by
+        POPULATE_KEYS, asks for, with batched inserts.  This is for building
+        large state files to benchmark against, the caller holds the
+        transaction.
+
+        Disks are spread over the new pools, which are RAID 0 pools of
+        their disks, and so are volumes and file systems.  Initiators are
+        spread over the new access groups, masks over the pairs of new
+        volumes and access groups, and snapshots and exports over the new
+        file systems.
+        """
+        cnt = dict((k, 0) for k in BackStore.POPULATE_KEYS)
+        for key, value in counts.items():
+            if key not in cnt or value < 0:
+                raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                               "Invalid populate count %s=%s" % (key, value))
+            cnt[key] = value
+
+        # Each pool needs a disk, each access group an initiator.
+        cnt['disks'] = max(cnt['disks'], cnt['pools'])
+        cnt['initiators'] = max(cnt['initiators'], cnt['access_groups'])
+
+        for (key, needed) in (('volumes', 'pools'), ('fs', 'pools'),
+                              ('disks', 'pools'),
+                              ('initiators', 'access_groups'),
+                              ('masks', 'access_groups'),
+                              ('fs_snapshots', 'fs'), ('exports', 'fs')):
+            if cnt[key] and not cnt[needed]:
+                raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                               "Populating %s needs %s" % (key, needed))
+        if cnt['masks'] > cnt['volumes'] * cnt['access_groups']:
+            raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                           "Can not have more masks than pairs of volumes "
+                           "and access groups")
+
+        pool_id = self._next_id('pools')
+        disk_id = self._next_id('disks')
+        vol_id = self._next_id('volumes')
+        ag_id = self._next_id('ags')
+        fs_id = self._next_id('fss')
+        exp_id = self._next_id('exps')
+        now = int(time.time())
+
+        self._data_add_many('pools', ({
+            'id': pool_id + i,
+            'name': 'Scale Pool %d' % (pool_id + i),
+            'status': Pool.STATUS_OK,
+            'status_info': '',
+            'element_type': Pool.ELEMENT_TYPE_FS |
+            Pool.ELEMENT_TYPE_VOLUME | Pool.ELEMENT_TYPE_DELTA,
+            'unsupported_actions': 0,
+            'raid_type': Volume.RAID_TYPE_RAID0,
+            'member_type': Pool.MEMBER_TYPE_DISK,
+            'strip_size': BackStore.DEFAULT_STRIP_SIZE,
+        } for i in range(cnt['pools'])))
+
+        self._data_add_many('disks', ({
+            'id': disk_id + i,
+            'disk_prefix': "1PiB SAS Disk",
+            'total_space': BackStore._POPULATE_DISK_SIZE,
+            'disk_type': Disk.TYPE_SAS,
+            'status': Disk.STATUS_OK,
+            'vpd83': '5000c5%010x' % (disk_id + i),
+            'rpm': 15000,
+            'link_type': Disk.LINK_TYPE_SAS,
+            'location': "Port: %d Box: 2 Bay: %d" % (i % 16, i),
+            'owner_pool_id': pool_id + i % cnt['pools'],
+            'role': 'DATA',
+        } for i in range(cnt['disks'])))
+
+        self._data_add_many('volumes', ({
+            'id': vol_id + i,
+            'vpd83': '600508b1001c%020x' % (vol_id + i),
+            'name': 'scale_vol_%d' % (vol_id + i),
+            'pool_id': pool_id + i % cnt['pools'],
+            'total_space': BackStore._POPULATE_VOL_SIZE,
+            'consumed_size': BackStore._POPULATE_VOL_SIZE,
+            'admin_state': Volume.ADMIN_STATE_ENABLED,
+            'is_hw_raid_vol': 0,
+            'write_cache_policy': BackStore.DEFAULT_WRITE_CACHE_POLICY,
+            'read_cache_policy': BackStore.DEFAULT_READ_CACHE_POLICY,
+            'phy_disk_cache': BackStore.DEFAULT_PHYSICAL_DISK_CACHE,
+        } for i in range(cnt['volumes'])))
+
+        self._data_add_many('ags', ({
+            'id': ag_id + i,
+            'name': 'scale_ag_%d' % (ag_id + i),
+        } for i in range(cnt['access_groups'])))
+
+        self._data_add_many('inits', ({
+            'id': 'iqn.2026-01.com.example:scale-%d-%d' % (ag_id, i),
+            'init_type': AccessGroup.INIT_TYPE_ISCSI_IQN,
+            'owner_ag_id': ag_id + i % cnt['access_groups'],
+        } for i in range(cnt['initiators'])))
+
+        # Round r masks volume v to access group (v + r) % access_groups,
+        # which never repeats a pair and spreads masks over all of them.
+        self._data_add_many('vol_masks', ({
+            'vol_id': vol_id + i % cnt['volumes'],
+            'ag_id': ag_id + (i % cnt['volumes'] + i // cnt['volumes']) %
+            cnt['access_groups'],
+        } for i in range(cnt['masks'])))
+
+        self._data_add_many('fss', ({
+            'id': fs_id + i,
+            'name': 'scale_fs_%d' % (fs_id + i),
+            'total_space': BackStore._POPULATE_FS_SIZE,
+            'consumed_size': BackStore._POPULATE_FS_SIZE,
+            'free_space': BackStore._POPULATE_FS_SIZE,
+            'pool_id': pool_id + i % cnt['pools'],
+        } for i in range(cnt['fs'])))
+
+        self._data_add_many('fs_snaps', ({
+            'name': 'scale_fs_snap_%d_%d' % (fs_id, i),
+            'fs_id': fs_id + i % cnt['fs'],
+            'timestamp': now,
+        } for i in range(cnt['fs_snapshots'])))
+
+        self._data_add_many('exps', ({
+            'id': exp_id + i,
+            'fs_id': fs_id + i % cnt['fs'],
+            'exp_path': '/scale_exp_%d' % (exp_id + i),
+            'anon_uid': NfsExport.ANON_UID_GID_NA,
+            'anon_gid': NfsExport.ANON_UID_GID_NA,
+            'auth_type': 'standard',
+            'options': '',
+        } for i in range(cnt['exports'])))
+
+        self._data_add_many('exp_rw_hosts', ({
+            'host': 'scale-host-%d' % (exp_id + i),
+            'exp_id': exp_id + i,
+        } for i in range(cnt['exports'])))
+
+    def sim_page(self, table_name, columns, filters, page_size, cursor):
+        """
+        Return a tuple of a list of up to page_size sim data dict from
+        table_name in the order of their id and the cursor of the next page
+        or None if there is no more.  The cursor is the id of the last
+        returned row.  The filters dict uses the lsm search keys, the columns
+        dict maps them to the columns of table_name.
+        """
+        conditions = ['id > ?']
+        values = [0]
+        if cursor is not None:
+            try:
+                values = [int(cursor)]
+            except ValueError:
+                raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                               "Invalid cursor: '%s'" % cursor)
+
+        for key, value in (filters or {}).items():
+            if key == 'system_id':
+                if value != BackStore.SYS_ID:
+                    return [], None
+                continue
+            if key not in columns:
+                raise LsmError(ErrorNumber.UNSUPPORTED_SEARCH_KEY,
+                               "Unsupported search_key: '%s'" % key)
+            conditions.append('%s = ?' % columns[key])
+            values.append(value)
+
+        # Ask for one more row than needed to know whether this is the last
+        # page.
+        values.append(page_size + 1)
+        sql_cmd = "SELECT * FROM %s WHERE %s ORDER BY id LIMIT ?" % \
+                  (table_name, ' AND '.join(conditions))
+        sim_datas = self._sql_exec(sql_cmd, values)
+
+        if len(sim_datas) > page_size:
+            del sim_datas[page_size:]
+            return sim_datas, str(sim_datas[-1]['id'])
+        return sim_datas, None
+
+    def _data_find(self, table, condition, sql_params=(), flag_unique=False):
         sql_cmd = "SELECT * FROM %s WHERE %s" % (table, condition)
-        sim_datas = self._sql_exec(sql_cmd)
+        sim_datas = self._sql_exec(sql_cmd, sql_params)
         if flag_unique:
             if len(sim_datas) == 0:
                 return None
@@ -1068,54 +1388,104 @@ def _data_find(self, table, condition, flag_unique=False):
             return sim_datas
 
     def _data_update(self, table, data_id, column_name, value):
-        if value is None:
-            sql_cmd = "UPDATE %s SET %s=NULL WHERE id='%s'" % \
-                (table, column_name, data_id)
-        else:
-            sql_cmd = "UPDATE %s SET %s='%s' WHERE id='%s'" % \
-                (table, column_name, value, data_id)
-
-        self._sql_exec(sql_cmd)
+        sql_cmd = "UPDATE %s SET %s=? WHERE id=?" % (table, column_name)
+        self._sql_exec(sql_cmd, (value, data_id))
 
-    def _data_delete(self, table, condition):
+    def _data_delete(self, table, condition, sql_params=()):
         sql_cmd = "DELETE FROM %s WHERE %s;" % (table, condition)
-        self._sql_exec(sql_cmd)
+        self._sql_exec(sql_cmd, sql_params)
 
-    def sim_job_create(self, job_data_type=None, data_id=None):
+    def sim_clock_now(self):
+        """
+        Return the time of the virtual clock, None when the real one is used.
+        """
+        sim_clock = self._data_find('sim_clock', 'id=1', flag_unique=True)
+        if sim_clock is None:
+            return None
+        return sim_clock['now']
+
+    def sim_clock_set(self, clock):
+        """
+        Switch the jobs over to the real or the virtual clock, keeping the
+        progress of the ones in flight.  The virtual clock starts at 0.
+        """
+        if clock not in BackStore.CLOCKS:
+            raise LsmError(
+                ErrorNumber.INVALID_ARGUMENT,
+                "Invalid clock '%s', supported: %s" %
+                (clock, ", ".join(BackStore.CLOCKS)))
+
+        virtual_now = self.sim_clock_now()
+        if clock == 'virtual' and virtual_now is None:
+            self._sql_exec("UPDATE jobs SET timestamp = timestamp - ?;",
+                           (time.time(),))
+            self._data_add('sim_clock', {'id': 1, 'now': 0.0})
+        elif clock == 'real' and virtual_now is not None:
+            self._sql_exec("UPDATE jobs SET timestamp = timestamp + ?;",
+                           (time.time() - virtual_now,))
+            self._data_delete('sim_clock', 'id=1')
+
+    def sim_clock_advance(self, until):
+        """
+        Move the virtual clock forward to until, it never goes back.
+        """
+        self._sql_exec("UPDATE sim_clock SET now = MAX(now, ?) WHERE id=1;",
+                       (until,))
+
+    def sim_job_create(self, job_data_type=None, data_id=None, op=None,
+                       size_bytes=0):
         """
         Return a job id(Integer)
+        On the virtual clock the job takes as long as JOB_DURATIONS says for
+        op and size_bytes, LSM_SIM_TIME overrides that.
         """
+        now = self.sim_clock_now()
+        duration = os.getenv("LSM_SIM_TIME")
+        if duration is None:
+            if now is not None and op in BackStore.JOB_DURATIONS:
+                (fixed, per_gib) = BackStore.JOB_DURATIONS[op]
+                duration = fixed + per_gib * float(size_bytes) / 2 ** 30
+            else:
+                duration = BackStore.JOB_DEFAULT_DURATION
+        if now is None:
+            now = time.time()
+
         self._data_add(
             "jobs",
             {
-                "duration": os.getenv(
-                    "LSM_SIM_TIME", BackStore.JOB_DEFAULT_DURATION),
-                "timestamp": time.time(),
+                "duration": duration,
+                "timestamp": now,
                 "data_type": job_data_type,
                 "data_id": data_id,
             })
         return self.lastrowid
 
+    def sim_job_of_id(self, sim_job_id):
+        sim_job = self._data_find('jobs', 'id=?', (sim_job_id,),
+                                  flag_unique=True)
+        if sim_job is None:
+            raise LsmError(
+                ErrorNumber.NOT_FOUND_JOB, "Job not found")
+        return sim_job
+
     def sim_job_delete(self, sim_job_id):
-        self._data_delete('jobs', 'id="%s"' % sim_job_id)
+        self._data_delete('jobs', 'id=?', (sim_job_id,))
 
     def sim_job_status(self, sim_job_id):
         """
         Return (progress, data_type, data) tuple.
         progress is the integer of percent.
         """
-        sim_job = self._data_find('jobs', 'id=%s' % sim_job_id,
-                                  flag_unique=True)
-        if sim_job is None:
-            raise LsmError(
-                ErrorNumber.NOT_FOUND_JOB, "Job not found")
+        sim_job = self.sim_job_of_id(sim_job_id)
+        now = self.sim_clock_now()
+        if now is None:
+            now = time.time()
 
-        if sim_job['duration'] != 0:
-            progress = int(
-                (time.time() - float(sim_job['timestamp'])) /
-                sim_job['duration'] * 100)
-        else:
+        start = float(sim_job['timestamp'])
+        if now >= start + sim_job['duration']:
             progress = 100
+        else:
+            progress = int((now - start) / sim_job['duration'] * 100)
 
         data = None
         data_type = None
@@ -1147,7 +1517,7 @@ def lsm_disk_ids_of_pool(self, sim_pool_id):
         return list(
             d['lsm_disk_id']
             for d in self._data_find(
-                'disks_view', 'owner_pool_id="%s"' % sim_pool_id))
+                'disks_view', 'owner_pool_id=?', (sim_pool_id,)))
 
     def sim_disks(self):
         """
@@ -1193,17 +1563,10 @@ def sim_pool_create_from_disk(self, name, sim_disk_ids, raid_type,
 
         # update disk owner
         sim_pool_id = self.lastrowid
-        for sim_disk_id in sim_disk_ids[:data_disk_count]:
-            self._data_update(
-                'disks', sim_disk_id, 'owner_pool_id', sim_pool_id)
-            self._data_update(
-                'disks', sim_disk_id, 'role', 'DATA')
-
-        for sim_disk_id in sim_disk_ids[data_disk_count:]:
-            self._data_update(
-                'disks', sim_disk_id, 'owner_pool_id', sim_pool_id)
-            self._data_update(
-                'disks', sim_disk_id, 'role', 'PARITY')
+        self.sql_conn.executemany(
+            "UPDATE disks SET owner_pool_id=?, role=? WHERE id=?",
+            [(sim_pool_id, 'DATA' if i < data_disk_count else 'PARITY',
+              sim_disk_id) for i, sim_disk_id in enumerate(sim_disk_ids)])
 
         return sim_pool_id
 
@@ -1226,13 +1589,13 @@ def sim_pool_create_sub_pool(self, name, parent_pool_id, size,
 
     def sim_pool_disks_count(self, sim_pool_id):
         return self._sql_exec(
-            "SELECT COUNT(id) FROM disks WHERE owner_pool_id=%s;" %
-            sim_pool_id)[0][0]
+            "SELECT COUNT(id) AS count FROM disks WHERE owner_pool_id=?;",
+            (sim_pool_id,))[0]['count']
 
     def sim_pool_data_disks_count(self, sim_pool_id=None):
         return self._sql_exec(
-            "SELECT COUNT(id) FROM disks WHERE "
-            "owner_pool_id=%s and role='DATA';" % sim_pool_id)[0][0]
+            "SELECT COUNT(id) AS count FROM disks WHERE "
+            "owner_pool_id=? and role='DATA';", (sim_pool_id,))[0]['count']
 
     def sim_vols(self, sim_ag_id=None):
         """
@@ -1240,13 +1603,13 @@ def sim_vols(self, sim_ag_id=None):
         """
         if sim_ag_id:
             return self._data_find(
-                'volumes_by_ag_view', 'ag_id=%s' % sim_ag_id)
+                'volumes_by_ag_view', 'ag_id=?', (sim_ag_id,))
         else:
             return self._get_table('volumes_view')
 
     def _sim_data_of_id(self, table_name, data_id, lsm_error_no, data_name):
         sim_data = self._data_find(
-            table_name, 'id=%s' % data_id, flag_unique=True)
+            table_name, 'id=?', (data_id,), flag_unique=True)
         if sim_data is None:
             if lsm_error_no:
                 raise LsmError(
@@ -1275,10 +1638,12 @@ def _block_rounding(size_bytes):
         return (size_bytes + BackStore.BLK_SIZE - 1) // \
             BackStore.BLK_SIZE * BackStore.BLK_SIZE
 
-    def sim_vol_create(self, name, size_bytes, sim_pool_id, is_hw_raid_vol=0):
+    def sim_vol_create(self, name, size_bytes, sim_pool_id, is_hw_raid_vol=0,
+                       check_free_space=True):
 
         size_bytes = BackStore._block_rounding(size_bytes)
-        self._check_pool_free_space(sim_pool_id, size_bytes)
+        if check_free_space:
+            self._check_pool_free_space(sim_pool_id, size_bytes)
         sim_vol = dict()
         sim_vol['vpd83'] = _random_vpd()
         sim_vol['name'] = name
@@ -1322,21 +1687,19 @@ def sim_vol_delete(self, sim_vol_id):
                         "Requested volume has child dependency")
         if sim_vol['is_hw_raid_vol']:
             # Reset disk roles
-            for d in self._data_find('disks_view',
-                                     'owner_pool_id="%s"' % sim_vol["pool_id"]):
-                self._data_update("disks", d["id"], 'role', None)
+            self._sql_exec("UPDATE disks SET role=NULL WHERE owner_pool_id=?",
+                           (sim_vol['pool_id'],))
 
             # Delete the parent pool instead if found a HW RAID volume.
-            self._data_delete("pools", 'id="%s"' % sim_vol['pool_id'])
+            self._data_delete("pools", 'id=?', (sim_vol['pool_id'],))
         else:
-            self._data_delete("volumes", 'id="%s"' % sim_vol_id)
+            self._data_delete("volumes", 'id=?', (sim_vol_id,))
 
     def sim_vol_mask(self, sim_vol_id, sim_ag_id):
         self.sim_vol_of_id(sim_vol_id)
         self.sim_ag_of_id(sim_ag_id)
         exist_mask = self._data_find(
-            'vol_masks', 'ag_id="%s" AND vol_id="%s"' %
-            (sim_ag_id, sim_vol_id))
+            'vol_masks', 'ag_id=? AND vol_id=?', (sim_ag_id, sim_vol_id))
         if exist_mask:
             raise LsmError(
                 ErrorNumber.NO_STATE_CHANGE,
@@ -1350,10 +1713,11 @@ def sim_vol_mask(self, sim_vol_id, sim_ag_id):
     def sim_vol_unmask(self, sim_vol_id, sim_ag_id):
         self.sim_vol_of_id(sim_vol_id)
         self.sim_ag_of_id(sim_ag_id)
-        condition = 'ag_id="%s" AND vol_id="%s"' % (sim_ag_id, sim_vol_id)
-        exist_mask = self._data_find('vol_masks', condition)
+        condition = 'ag_id=? AND vol_id=?'
+        sql_params = (sim_ag_id, sim_vol_id)
+        exist_mask = self._data_find('vol_masks', condition, sql_params)
         if exist_mask:
-            self._data_delete('vol_masks', condition)
+            self._data_delete('vol_masks', condition, sql_params)
         else:
             raise LsmError(
                 ErrorNumber.NO_STATE_CHANGE,
@@ -1363,12 +1727,12 @@ def sim_vol_unmask(self, sim_vol_id, sim_ag_id):
     def _sim_vol_ids_of_masked_ag(self, sim_ag_id):
         return list(
             m['vol_id'] for m in self._data_find(
-                'vol_masks', 'ag_id="%s"' % sim_ag_id))
+                'vol_masks', 'ag_id=?', (sim_ag_id,)))
 
     def _sim_ag_ids_of_masked_vol(self, sim_vol_id):
         return list(
             m['ag_id'] for m in self._data_find(
-                'vol_masks', 'vol_id="%s"' % sim_vol_id))
+                'vol_masks', 'vol_id=?', (sim_vol_id,)))
 
     def sim_vol_resize(self, sim_vol_id, new_size_bytes):
         new_size_bytes = BackStore._block_rounding(new_size_bytes)
@@ -1412,7 +1776,7 @@ def dst_sim_vol_ids_of_src(self, src_sim_vol_id):
         self.sim_vol_of_id(src_sim_vol_id)
         return list(
             d['dst_vol_id'] for d in self._data_find(
-                'vol_reps', 'src_vol_id="%s"' % src_sim_vol_id))
+                'vol_reps', 'src_vol_id=?', (src_sim_vol_id,)))
 
     def sim_vol_replica(self, src_sim_vol_id, dst_sim_vol_id, rep_type,
                         blk_ranges=None):
@@ -1430,7 +1794,7 @@ def sim_vol_replica(self, src_sim_vol_id, dst_sim_vol_id, rep_type,
 
         cur_src_sim_vol_ids = list(
             r['src_vol_id'] for r in self._data_find(
-                'vol_reps', 'dst_vol_id="%s"' % dst_sim_vol_id))
+                'vol_reps', 'dst_vol_id=?', (dst_sim_vol_id,)))
 
         if len(cur_src_sim_vol_ids) == 1:
             # We already have a relationship, do not need to add more
@@ -1455,7 +1819,7 @@ def sim_vol_src_replica_break(self, src_sim_vol_id):
                 "Provided volume is not a replication source")
 
         self._data_delete(
-            'vol_reps', 'src_vol_id="%s"' % src_sim_vol_id)
+            'vol_reps', 'src_vol_id=?', (src_sim_vol_id,))
 
     def sim_vol_state_change(self, sim_vol_id, new_admin_state):
         sim_vol = self.sim_vol_of_id(sim_vol_id)
@@ -1479,12 +1843,14 @@ def _sim_ag_format(sim_ag):
 
     def sim_ags(self, sim_vol_id=None):
         if sim_vol_id:
-            sim_ags = self._data_find(
-                'ags_by_vol_view', 'vol_id=%s' % sim_vol_id)
-        else:
-            sim_ags = self._get_table('ags_view')
+            # One by one rather than through ags_by_vol_view, which has to
+            # group the initiators of every access group before it can be
+            # filtered.
+            return [self.sim_ag_of_id(sim_ag_id) for sim_ag_id in
+                    self._sim_ag_ids_of_masked_vol(sim_vol_id)]
 
-        return [BackStore._sim_ag_format(a) for a in sim_ags]
+        return [BackStore._sim_ag_format(a)
+                for a in self._get_table('ags_view')]
 
     def _sim_init_create(self, init_type, init_id, sim_ag_id):
         try:
@@ -1527,7 +1893,7 @@ def sim_ag_delete(self, sim_ag_id):
                 ErrorNumber.IS_MASKED,
                 "Access group has volume masked to")
 
-        self._data_delete('ags', 'id="%s"' % sim_ag_id)
+        self._data_delete('ags', 'id=?', (sim_ag_id,))
 
     def sim_ag_init_add(self, sim_ag_id, init_id, init_type):
         sim_ag = self.sim_ag_of_id(sim_ag_id)
@@ -1556,7 +1922,7 @@ def sim_ag_init_delete(self, sim_ag_id, init_id):
                 ErrorNumber.LAST_INIT_IN_ACCESS_GROUP,
                 "Refused to remove the last initiator from access group")
 
-        self._data_delete('inits', 'id="%s"' % init_id)
+        self._data_delete('inits', 'id=?', (init_id,))
 
     def sim_ag_of_id(self, sim_ag_id):
         sim_ag = self._sim_data_of_id(
@@ -1605,7 +1971,7 @@ def sim_fs_delete(self, sim_fs_id):
                 ErrorNumber.HAS_CHILD_DEPENDENCY,
                 "Requested file system has child dependency")
 
-        self._data_delete("fss", 'id="%s"' % sim_fs_id)
+        self._data_delete("fss", 'id=?', (sim_fs_id,))
 
     def sim_fs_resize(self, sim_fs_id, new_size_bytes):
         new_size_bytes = BackStore._block_rounding(new_size_bytes)
@@ -1635,7 +2001,7 @@ def sim_fs_resize(self, sim_fs_id, new_size_bytes):
 
     def sim_fs_snaps(self, sim_fs_id):
         self.sim_fs_of_id(sim_fs_id)
-        return self._data_find('fs_snaps_view', 'fs_id="%s"' % sim_fs_id)
+        return self._data_find('fs_snaps_view', 'fs_id=?', (sim_fs_id,))
 
     def sim_fs_snap_of_id(self, sim_fs_snap_id, sim_fs_id=None):
         sim_fs_snap = self._sim_data_of_id(
@@ -1676,11 +2042,10 @@ def sim_fs_snap_restore(self, sim_fs_id, sim_fs_snap_id, files,
     def sim_fs_snap_delete(self, sim_fs_snap_id, sim_fs_id):
         self.sim_fs_of_id(sim_fs_id)
         self.sim_fs_snap_of_id(sim_fs_snap_id, sim_fs_id)
-        self._data_delete('fs_snaps', 'id="%s"' % sim_fs_snap_id)
+        self._data_delete('fs_snaps', 'id=?', (sim_fs_snap_id,))
 
     def sim_fs_snap_del_by_fs(self, sim_fs_id):
-        sql_cmd = "DELETE FROM fs_snaps WHERE fs_id='%s';" % sim_fs_id
-        self._sql_exec(sql_cmd)
+        self._data_delete('fs_snaps', 'fs_id=?', (sim_fs_id,))
 
     def sim_fs_clone(self, src_sim_fs_id, dst_sim_fs_id, sim_fs_snap_id):
         self.sim_fs_of_id(src_sim_fs_id)
@@ -1715,10 +2080,10 @@ def clone_dst_sim_fs_ids_of_src(self, src_sim_fs_id):
         self.sim_fs_of_id(src_sim_fs_id)
         return list(
             d['dst_fs_id'] for d in self._data_find(
-                'fs_clones', 'src_fs_id="%s"' % src_sim_fs_id))
+                'fs_clones', 'src_fs_id=?', (src_sim_fs_id,)))
 
     def sim_fs_src_clone_break(self, src_sim_fs_id):
-        self._data_delete('fs_clones', 'src_fs_id="%s"' % src_sim_fs_id)
+        self._data_delete('fs_clones', 'src_fs_id=?', (src_sim_fs_id,))
 
     def _sim_exp_format(self, sim_exp):
         for key_name in ['root_hosts', 'rw_hosts', 'ro_hosts']:
@@ -1793,7 +2158,7 @@ def sim_exp_create(self, sim_fs_id, exp_path, root_hosts, rw_hosts,
 
     def sim_exp_delete(self, sim_exp_id):
         self.sim_exp_of_id(sim_exp_id)
-        self._data_delete('exps', 'id="%s"' % sim_exp_id)
+        self._data_delete('exps', 'id=?', (sim_exp_id,))
 
     def sim_tgts(self):
         """
@@ -1823,11 +2188,12 @@ def sim_vol_wcp_set(self, sim_vol_id, wcp):
 class SimArray(object):
     SIM_DATA_FILE = os.getenv("LSM_SIM_DATA",
                               tempfile.gettempdir() + '/lsm_sim_data')
+    POPULATE_KEYS = BackStore.POPULATE_KEYS
 
     @staticmethod
     def _lsm_id_to_sim_id(lsm_id, lsm_error):
         try:
-            return int(lsm_id[-BackStore._ID_FMT_LEN:])
+            return int(lsm_id.rsplit('_', 1)[-1])
         except ValueError:
             raise lsm_error
 
@@ -1875,24 +2241,71 @@ def _sim_ag_id_of(ag_id):
                 "File system export not found"))
 
     @_handle_errors
-    def __init__(self, statefile, timeout):
+    def __init__(self, statefile, timeout, populate=None, journal_mode=None,
+                 clock=None):
         if statefile is None:
             statefile = SimArray.SIM_DATA_FILE
 
-        self.bs_obj = BackStore(statefile, timeout)
-        self.bs_obj.check_version_and_init()
+        self.bs_obj = BackStore(statefile, timeout, journal_mode)
+        self.bs_obj.check_version_and_init(populate)
+        if clock is not None:
+            self.bs_obj.trans_begin()
+            self.bs_obj.sim_clock_set(clock)
+            self.bs_obj.trans_commit()
         self.statefile = statefile
         self.timeout = timeout
 
-    def _job_create(self, data_type=None, sim_data_id=None):
+    def _job_create(self, data_type=None, sim_data_id=None, op=None,
+                    size_bytes=0):
         sim_job_id = self.bs_obj.sim_job_create(
-            data_type, sim_data_id)
+            data_type, sim_data_id, op, size_bytes)
         return "JOB_ID_%0*d" % (BackStore._ID_FMT_LEN, sim_job_id)
 
-    @_handle_errors
-    def job_status(self, job_id, flags=0):
-        sim_job_id = SimArray._sim_job_id_of(job_id)
+    def _each(self, func, items):
+        """
+        Call func on each item inside the transaction begun by the caller and
+        return the [result, error] pair of each, error being the [code,
+        message] of the LsmError func raised.  What a failed item changed is
+        rolled back on its own.
+        """
+        rc = []
+        for item in items:
+            self.bs_obj.trans_savepoint()
+            try:
+                rc.append([func(item), None])
+            except LsmError as lsm_err:
+                self.bs_obj.trans_savepoint_rollback()
+                rc.append([None, [lsm_err.code, lsm_err.msg]])
+            else:
+                self.bs_obj.trans_savepoint_release()
+        return rc
+
+    def _job_clock_advance(self, sim_job_id, seconds=None):
+        """
+        On the virtual clock, let the time pass a client waiting on the job
+        for that many seconds sees, but no further than the job end.  With
+        seconds None, a JOB_POLL_STEP of the job duration passes.
+        Return False when the real clock is used.
+        """
+        # Don't take the write lock for the real clock
+        if self.bs_obj.sim_clock_now() is None:
+            return False
 
+        self.bs_obj.trans_begin()
+        now = self.bs_obj.sim_clock_now()
+        if now is None:
+            self.bs_obj.trans_rollback()
+            return False
+
+        sim_job = self.bs_obj.sim_job_of_id(sim_job_id)
+        end = float(sim_job['timestamp']) + sim_job['duration']
+        if seconds is None:
+            seconds = sim_job['duration'] * BackStore.JOB_POLL_STEP
+        self.bs_obj.sim_clock_advance(min(end, now + seconds))
+        self.bs_obj.trans_commit()
+        return True
+
+    def _job_status(self, sim_job_id):
         (progress, data_type, sim_data) = self.bs_obj.sim_job_status(
             sim_job_id)
         status = JobStatus.INPROGRESS
@@ -1909,6 +2322,32 @@ def job_status(self, job_id, flags=0):
 
         return (status, progress, data)
 
+    @_handle_errors
+    def job_status(self, job_id, flags=0):
+        sim_job_id = SimArray._sim_job_id_of(job_id)
+        self._job_clock_advance(sim_job_id)
+        return self._job_status(sim_job_id)
+
+    @_handle_errors
+    def job_wait(self, job_id, timeout_ms=None, flags=0):
+        """
+        Return once the job is done or timeout_ms passed.  On the virtual
+        clock the time is let pass instead of waited for.
+        """
+        sim_job_id = SimArray._sim_job_id_of(job_id)
+        if timeout_ms is None:
+            timeout_ms = self.timeout
+        seconds = timeout_ms / 1000.0
+
+        if not self._job_clock_advance(sim_job_id, seconds):
+            sim_job = self.bs_obj.sim_job_of_id(sim_job_id)
+            end = min(float(sim_job['timestamp']) + sim_job['duration'],
+                      time.time() + seconds)
+            while time.time() < end:
+                time.sleep(max(0, end - time.time()))
+
+        return self._job_status(sim_job_id)
+
     @_handle_errors
     def job_free(self, job_id, flags=0):
         self.bs_obj.trans_begin()
@@ -1967,6 +2406,13 @@ def volumes(self):
         return list(
             SimArray._sim_vol_2_lsm(v) for v in self.bs_obj.sim_vols())
 
+    @_handle_errors
+    def volumes_page(self, filters, page_size, cursor):
+        sim_vols, cursor = self.bs_obj.sim_page(
+            'volumes_view', {'id': 'lsm_vol_id', 'pool_id': 'lsm_pool_id'},
+            filters, page_size, cursor)
+        return [SimArray._sim_vol_2_lsm(v) for v in sim_vols], cursor
+
     @staticmethod
     def _sim_pool_2_lsm(sim_pool):
         pool_id = sim_pool['lsm_pool_id']
@@ -1984,12 +2430,20 @@ def _sim_pool_2_lsm(sim_pool):
 
     @_handle_errors
     def pools(self, flags=0):
-        self.bs_obj.trans_begin()
+        self.bs_obj.trans_begin_read()
         sim_pools = self.bs_obj.sim_pools()
         self.bs_obj.trans_rollback()
         return list(
             SimArray._sim_pool_2_lsm(sim_pool) for sim_pool in sim_pools)
 
+    @_handle_errors
+    def pools_page(self, filters, page_size, cursor):
+        self.bs_obj.trans_begin_read()
+        sim_pools, cursor = self.bs_obj.sim_page(
+            'pools_view', {'id': 'lsm_pool_id'}, filters, page_size, cursor)
+        self.bs_obj.trans_rollback()
+        return [SimArray._sim_pool_2_lsm(p) for p in sim_pools], cursor
+
     @staticmethod
     def _sim_disk_2_lsm(sim_disk):
         disk_status = Disk.STATUS_OK
@@ -2011,6 +2465,12 @@ def disks(self):
             SimArray._sim_disk_2_lsm(sim_disk)
             for sim_disk in self.bs_obj.sim_disks())
 
+    @_handle_errors
+    def disks_page(self, filters, page_size, cursor):
+        sim_disks, cursor = self.bs_obj.sim_page(
+            'disks_view', {'id': 'lsm_disk_id'}, filters, page_size, cursor)
+        return [SimArray._sim_disk_2_lsm(d) for d in sim_disks], cursor
+
     @_handle_errors
     def volume_create(self, pool_id, vol_name, size_bytes, thinp, flags=0,
                       _internal_use=False, _is_hw_raid_vol=0):
@@ -2030,27 +2490,70 @@ def volume_create(self, pool_id, vol_name, size_bytes, thinp, flags=0,
             return new_sim_vol_id
 
         job_id = self._job_create(
-            BackStore.JOB_DATA_TYPE_VOL, new_sim_vol_id)
+            BackStore.JOB_DATA_TYPE_VOL, new_sim_vol_id, 'volume_create',
+            size_bytes)
         self.bs_obj.trans_commit()
 
         return job_id, None
 
+    @_handle_errors
+    def volume_create_many(self, pool_id, vol_names, size_bytes, thinp,
+                           flags=0):
+        """
+        All in one transaction, with the free space of the pool looked up
+        once instead of for each volume.
+        """
+        sim_pool_id = SimArray._sim_pool_id_of(pool_id)
+        size_bytes = BackStore._block_rounding(size_bytes)
+
+        self.bs_obj.trans_begin()
+        free_space = [self.bs_obj.sim_pool_of_id(sim_pool_id)['free_space']]
+
+        def _create(vol_name):
+            if free_space[0] < size_bytes:
+                raise LsmError(ErrorNumber.NOT_ENOUGH_SPACE,
+                               "Insufficient space in pool")
+            new_sim_vol_id = self.bs_obj.sim_vol_create(
+                vol_name, size_bytes, sim_pool_id, check_free_space=False)
+            free_space[0] -= size_bytes
+            return self._job_create(
+                BackStore.JOB_DATA_TYPE_VOL, new_sim_vol_id, 'volume_create',
+                size_bytes), None
+
+        rc = self._each(_create, vol_names)
+        self.bs_obj.trans_commit()
+        return rc
+
     @_handle_errors
     def volume_delete(self, vol_id, flags=0):
         self.bs_obj.trans_begin()
         self.bs_obj.sim_vol_delete(SimArray._sim_vol_id_of(vol_id))
-        job_id = self._job_create()
+        job_id = self._job_create(op='volume_delete')
         self.bs_obj.trans_commit()
         return job_id
 
+    @_handle_errors
+    def volume_delete_many(self, vol_ids, flags=0):
+        self.bs_obj.trans_begin()
+
+        def _delete(vol_id):
+            self.bs_obj.sim_vol_delete(SimArray._sim_vol_id_of(vol_id))
+            return self._job_create(op='volume_delete')
+
+        rc = self._each(_delete, vol_ids)
+        self.bs_obj.trans_commit()
+        return rc
+
     @_handle_errors
     def volume_resize(self, vol_id, new_size_bytes, flags=0):
         self.bs_obj.trans_begin()
 
         sim_vol_id = SimArray._sim_vol_id_of(vol_id)
+        old_size_bytes = self.bs_obj.sim_vol_of_id(sim_vol_id)['total_space']
         self.bs_obj.sim_vol_resize(sim_vol_id, new_size_bytes)
         job_id = self._job_create(
-            BackStore.JOB_DATA_TYPE_VOL, sim_vol_id)
+            BackStore.JOB_DATA_TYPE_VOL, sim_vol_id, 'volume_resize',
+            abs(new_size_bytes - old_size_bytes))
         self.bs_obj.trans_commit()
 
         return job_id, None
@@ -2071,7 +2574,8 @@ def volume_replicate(self, dst_pool_id, rep_type, src_vol_id, new_vol_name,
         self.bs_obj.sim_vol_replica(src_sim_vol_id, dst_sim_vol_id, rep_type)
 
         job_id = self._job_create(
-            BackStore.JOB_DATA_TYPE_VOL, dst_sim_vol_id)
+            BackStore.JOB_DATA_TYPE_VOL, dst_sim_vol_id, 'volume_replicate',
+            src_sim_vol['total_space'])
         self.bs_obj.trans_commit()
 
         return job_id, None
@@ -2097,7 +2601,10 @@ def volume_replicate_range(self, rep_type, src_vol_id, dst_vol_id, ranges,
             SimArray._sim_pool_id_of(src_vol_id),
             SimArray._sim_pool_id_of(dst_vol_id), rep_type, ranges)
 
-        job_id = self._job_create()
+        job_id = self._job_create(
+            op='volume_replicate_range',
+            size_bytes=sum(r.block_count for r in ranges) *
+            BackStore.BLK_SIZE)
 
         self.bs_obj.trans_commit()
         return job_id
@@ -2149,10 +2656,12 @@ def volume_child_dependency(self, vol_id, flags=0):
     def volume_child_dependency_rm(self, vol_id, flags=0):
         self.bs_obj.trans_begin()
 
-        self.bs_obj.sim_vol_src_replica_break(
-            SimArray._sim_vol_id_of(vol_id))
+        sim_vol_id = SimArray._sim_vol_id_of(vol_id)
+        self.bs_obj.sim_vol_src_replica_break(sim_vol_id)
 
-        job_id = self._job_create()
+        job_id = self._job_create(
+            op='volume_child_dependency_rm',
+            size_bytes=self.bs_obj.sim_vol_of_id(sim_vol_id)['total_space'])
         self.bs_obj.trans_commit()
         return job_id
 
@@ -2180,7 +2689,8 @@ def fs_create(self, pool_id, fs_name, size_bytes, flags=0,
             return new_sim_fs_id
 
         job_id = self._job_create(
-            BackStore.JOB_DATA_TYPE_FS, new_sim_fs_id)
+            BackStore.JOB_DATA_TYPE_FS, new_sim_fs_id, 'fs_create',
+            size_bytes)
         self.bs_obj.trans_commit()
 
         return job_id, None
@@ -2189,7 +2699,7 @@ def fs_create(self, pool_id, fs_name, size_bytes, flags=0,
     def fs_delete(self, fs_id, flags=0):
         self.bs_obj.trans_begin()
         self.bs_obj.sim_fs_delete(SimArray._sim_fs_id_of(fs_id))
-        job_id = self._job_create()
+        job_id = self._job_create(op='fs_delete')
         self.bs_obj.trans_commit()
         return job_id
 
@@ -2197,8 +2707,11 @@ def fs_delete(self, fs_id, flags=0):
     def fs_resize(self, fs_id, new_size_bytes, flags=0):
         sim_fs_id = SimArray._sim_fs_id_of(fs_id)
         self.bs_obj.trans_begin()
+        old_size_bytes = self.bs_obj.sim_fs_of_id(sim_fs_id)['total_space']
         self.bs_obj.sim_fs_resize(sim_fs_id, new_size_bytes)
-        job_id = self._job_create(BackStore.JOB_DATA_TYPE_FS, sim_fs_id)
+        job_id = self._job_create(
+            BackStore.JOB_DATA_TYPE_FS, sim_fs_id, 'fs_resize',
+            abs(new_size_bytes - old_size_bytes))
         self.bs_obj.trans_commit()
         return job_id, None
 
@@ -2221,7 +2734,8 @@ def fs_clone(self, src_fs_id, dst_fs_name, snap_id, flags=0):
         self.bs_obj.sim_fs_clone(src_sim_fs_id, dst_sim_fs_id, sim_fs_snap_id)
 
         job_id = self._job_create(
-            BackStore.JOB_DATA_TYPE_FS, dst_sim_fs_id)
+            BackStore.JOB_DATA_TYPE_FS, dst_sim_fs_id, 'fs_clone',
+            src_sim_fs['total_space'])
         self.bs_obj.trans_commit()
 
         return job_id, None
@@ -2237,7 +2751,7 @@ def fs_file_clone(self, fs_id, src_fs_name, dst_fs_name, snap_id, flags=0):
             SimArray._sim_fs_id_of(fs_id), src_fs_name, dst_fs_name,
             sim_fs_snap_id)
 
-        job_id = self._job_create()
+        job_id = self._job_create(op='fs_file_clone')
         self.bs_obj.trans_commit()
         return job_id
 
@@ -2259,7 +2773,8 @@ def fs_snapshot_create(self, fs_id, snap_name, flags=0):
         sim_fs_snap_id = self.bs_obj.sim_fs_snap_create(
             SimArray._sim_fs_id_of(fs_id), snap_name)
         job_id = self._job_create(
-            BackStore.JOB_DATA_TYPE_FS_SNAP, sim_fs_snap_id)
+            BackStore.JOB_DATA_TYPE_FS_SNAP, sim_fs_snap_id,
+            'fs_snapshot_create')
         self.bs_obj.trans_commit()
         return job_id, None
 
@@ -2269,7 +2784,7 @@ def fs_snapshot_delete(self, fs_id, snap_id, flags=0):
         self.bs_obj.sim_fs_snap_delete(
             SimArray._sim_fs_snap_id_of(snap_id),
             SimArray._sim_fs_id_of(fs_id))
-        job_id = self._job_create()
+        job_id = self._job_create(op='fs_snapshot_delete')
         self.bs_obj.trans_commit()
         return job_id
 
@@ -2285,7 +2800,7 @@ def fs_snapshot_restore(self, fs_id, snap_id, files, restore_files,
             SimArray._sim_fs_id_of(fs_id),
             sim_fs_snap_id, files, restore_files, flag_all_files)
 
-        job_id = self._job_create()
+        job_id = self._job_create(op='fs_snapshot_restore')
         self.bs_obj.trans_commit()
         return job_id
 
@@ -2293,7 +2808,7 @@ def fs_snapshot_restore(self, fs_id, snap_id, files, restore_files,
     def fs_child_dependency(self, fs_id, files, flags=0, _internal_use=False):
         sim_fs_id = SimArray._sim_fs_id_of(fs_id)
         if _internal_use is False:
-            self.bs_obj.trans_begin()
+            self.bs_obj.trans_begin_read()
         if self.bs_obj.clone_dst_sim_fs_ids_of_src(sim_fs_id) == [] and \
            self.bs_obj.sim_fs_snaps(sim_fs_id) == []:
             if _internal_use is False:
@@ -2318,7 +2833,9 @@ def fs_child_dependency_rm(self, fs_id, files, flags=0):
         src_sim_fs_id = SimArray._sim_fs_id_of(fs_id)
         self.bs_obj.sim_fs_src_clone_break(src_sim_fs_id)
         self.bs_obj.sim_fs_snap_del_by_fs(src_sim_fs_id)
-        job_id = self._job_create()
+        job_id = self._job_create(
+            op='fs_child_dependency_rm',
+            size_bytes=self.bs_obj.sim_fs_of_id(src_sim_fs_id)['total_space'])
         self.bs_obj.trans_commit()
         return job_id
 
@@ -2362,6 +2879,13 @@ def _sim_ag_2_lsm(sim_ag):
     def ags(self):
         return list(SimArray._sim_ag_2_lsm(a) for a in self.bs_obj.sim_ags())
 
+    @_handle_errors
+    def ags_page(self, filters, page_size, cursor):
+        sim_ags, cursor = self.bs_obj.sim_page(
+            'ags_view', {'id': 'lsm_ag_id'}, filters, page_size, cursor)
+        return [SimArray._sim_ag_2_lsm(BackStore._sim_ag_format(a))
+                for a in sim_ags], cursor
+
     @_handle_errors
     def access_group_create(self, name, init_id, init_type, sys_id, flags=0):
         if sys_id != BackStore.SYS_ID:
@@ -2409,6 +2933,17 @@ def volume_mask(self, ag_id, vol_id, flags=0):
         self.bs_obj.trans_commit()
         return None
 
+    @_handle_errors
+    def volume_mask_many(self, ag_id, vol_ids, flags=0):
+        sim_ag_id = SimArray._sim_ag_id_of(ag_id)
+        self.bs_obj.trans_begin()
+        rc = self._each(
+            lambda vol_id: self.bs_obj.sim_vol_mask(
+                SimArray._sim_vol_id_of(vol_id), sim_ag_id),
+            vol_ids)
+        self.bs_obj.trans_commit()
+        return rc
+
     @_handle_errors
     def volume_unmask(self, ag_id, vol_id, flags=0):
         self.bs_obj.trans_begin()
@@ -2420,7 +2955,7 @@ def volume_unmask(self, ag_id, vol_id, flags=0):
 
     @_handle_errors
     def volumes_accessible_by_access_group(self, ag_id, flags=0):
-        self.bs_obj.trans_begin()
+        self.bs_obj.trans_begin_read()
 
         sim_vols = self.bs_obj.sim_vols(
             sim_ag_id=SimArray._sim_ag_id_of(ag_id))
@@ -2430,7 +2965,7 @@ def volumes_accessible_by_access_group(self, ag_id, flags=0):
 
     @_handle_errors
     def access_groups_granted_to_volume(self, vol_id, flags=0):
-        self.bs_obj.trans_begin()
+        self.bs_obj.trans_begin_read()
         sim_ags = self.bs_obj.sim_ags(
             sim_vol_id=SimArray._sim_vol_id_of(vol_id))
         self.bs_obj.trans_rollback()
@@ -2663,3 +3198,200 @@ def volume_read_cache_policy_update(self, volume, rcp, flags=0):
                                 "Volume not found"))
         self.bs_obj.sim_vol_rcp_set(sim_vol_id, rcp)
         self.bs_obj.trans_commit()
+
+
+class TestSimArrayQueryPlan(unittest.TestCase):
+    """
+    Looking up the masks of one volume or access group must stay an index
+    search however many there are.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.sim_array = SimArray(
+            os.path.join(self.tmpdir, 'state'), 30000,
+            dict(pools=1, volumes=20, access_groups=5, masks=40))
+        self.sql_conn = self.sim_array.bs_obj.sql_conn
+        if not hasattr(self.sql_conn, 'set_trace_callback'):
+            self.skipTest('sqlite3 has no set_trace_callback()')
+        self.views = set(r[0] for r in self.sql_conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='view'"))
+
+    def tearDown(self):
+        self.sql_conn.close()
+        shutil.rmtree(self.tmpdir)
+
+    def _table_scans(self, func, *args):
+        """
+        Runs func and returns the full scans of a table in the query plans
+        of the statements it executed.
+        """
+        sql_cmds = []
+        self.sql_conn.set_trace_callback(sql_cmds.append)
+        try:
+            func(*args)
+        finally:
+            self.sql_conn.set_trace_callback(None)
+
+        scans = []
+        for sql_cmd in sql_cmds:
+            if not sql_cmd.lstrip().upper().startswith('SELECT'):
+                continue
+            subqueries = set(self.views)
+            for row in self.sql_conn.execute(
+                    'EXPLAIN QUERY PLAN ' + sql_cmd):
+                # 'SCAN TABLE volumes AS vol' before sqlite 3.36, 'SCAN vol'
+                # since
+                detail = row[-1].split()
+                if detail[0] in ('CO-ROUTINE', 'MATERIALIZE'):
+                    subqueries.add(detail[-1])
+                if detail[0] != 'SCAN' or detail[1] == 'SUBQUERY':
+                    continue
+                name = detail[2] if detail[1] == 'TABLE' else detail[1]
+                if name not in subqueries:
+                    scans.append('%s: %s' % (sql_cmd, row[-1]))
+        return scans
+
+    def test_masks(self):
+        self.assertEqual(len(self.sim_array.volumes_accessible_by_access_group(
+            'AG_ID_00001')), 8)
+        self.assertEqual(len(self.sim_array.access_groups_granted_to_volume(
+            'VOL_ID_00002')), 2)
+
+        self.assertEqual(self._table_scans(
+            self.sim_array.volumes_accessible_by_access_group,
+            'AG_ID_00001'), [])
+        self.assertEqual(self._table_scans(
+            self.sim_array.access_groups_granted_to_volume,
+            'VOL_ID_00002'), [])
+        self.assertEqual(self._table_scans(
+            self.sim_array.volume_child_dependency, 'VOL_ID_00002'), [])
+
+
+class TestSimArrayJournalMode(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.statefile = os.path.join(self.tmpdir, 'state')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_wal(self):
+        writer = SimArray(self.statefile, 100, journal_mode='wal')
+        reader = SimArray(self.statefile, 100)
+        self.assertEqual(reader.bs_obj.sql_conn.execute(
+            "PRAGMA journal_mode;").fetchone()[0], 'wal')
+
+        # A writer can commit while a reader is in the middle of its read
+        # transaction, which keeps seeing the state as of its start.
+        reader.bs_obj.trans_begin_read()
+        vol_count = len(reader.bs_obj.sim_vols())
+        writer.volume_create('POOL_ID_00001', 'wal_vol', 2 ** 30,
+                             Volume.PROVISION_FULL)
+        self.assertEqual(len(reader.bs_obj.sim_vols()), vol_count)
+        reader.bs_obj.trans_rollback()
+        self.assertEqual(len(reader.bs_obj.sim_vols()), vol_count + 1)
+
+        reader.bs_obj.sql_conn.close()
+        writer.bs_obj.sql_conn.close()
+
+    def test_invalid(self):
+        self.assertRaises(LsmError, SimArray, self.statefile, 100,
+                          journal_mode='memory')
+
+
+class TestSimArrayJobClock(unittest.TestCase):
+    """
+    Jobs on the virtual clock take as long as their latency model says,
+    without anybody sleeping.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.sim_array = SimArray(os.path.join(self.tmpdir, 'state'), 30000,
+                                  clock='virtual')
+
+    def tearDown(self):
+        self.sim_array.bs_obj.sql_conn.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_wait(self):
+        start = time.time()
+        (job_id, _) = self.sim_array.volume_create(
+            'POOL_ID_00001', 'clock_vol', 10 * 2 ** 30,
+            Volume.PROVISION_FULL)
+        (status, _, vol) = self.sim_array.job_wait(job_id)
+        self.assertEqual(status, JobStatus.COMPLETE)
+        self.assertEqual(self.sim_array.bs_obj.sim_clock_now(), 0.5)
+
+        # 1s plus 2s per GiB
+        (job_id, _) = self.sim_array.volume_replicate(
+            'POOL_ID_00001', Volume.REPLICATE_CLONE, vol.id, 'clock_rep')
+        self.assertEqual(self.sim_array.job_status(job_id)[:2],
+                         (JobStatus.INPROGRESS, 10))
+        self.assertEqual(self.sim_array.job_wait(job_id, 2100)[:2],
+                         (JobStatus.INPROGRESS, 20))
+        (status, progress, rep_vol) = self.sim_array.job_wait(job_id)
+        self.assertEqual((status, progress, rep_vol.name),
+                         (JobStatus.COMPLETE, 100, 'clock_rep'))
+        self.assertEqual(self.sim_array.bs_obj.sim_clock_now(), 21.5)
+        self.assertTrue(time.time() - start < 5)
+
+    def test_real(self):
+        (job_id, _) = self.sim_array.volume_create(
+            'POOL_ID_00001', 'clock_vol', 2 ** 30, Volume.PROVISION_FULL)
+        self.sim_array.bs_obj.trans_begin()
+        self.sim_array.bs_obj.sim_clock_set('real')
+        self.sim_array.bs_obj.trans_commit()
+        self.assertEqual(self.sim_array.job_status(job_id)[:2],
+                         (JobStatus.INPROGRESS, 0))
+        self.assertEqual(self.sim_array.job_wait(job_id)[:2],
+                         (JobStatus.COMPLETE, 100))
+        self.assertRaises(LsmError, self.sim_array.bs_obj.sim_clock_set,
+                          'wall')
+
+
+class TestSimArrayMany(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.sim_array = SimArray(os.path.join(self.tmpdir, 'state'), 30000,
+                                  dict(access_groups=1))
+
+    def tearDown(self):
+        self.sim_array.bs_obj.sql_conn.close()
+        shutil.rmtree(self.tmpdir)
+
+    def _errors(self, rc):
+        return [error and error[0] for (_, error) in rc]
+
+    def test_many(self):
+        rc = self.sim_array.volume_create_many(
+            'POOL_ID_00001', ['many_1', 'many_2', 'many_1', 'many_3'],
+            2 ** 30, Volume.PROVISION_FULL)
+        self.assertEqual(self._errors(rc),
+                         [None, None, ErrorNumber.NAME_CONFLICT, None])
+        self.assertTrue(rc[0][0][0].startswith('JOB_ID_'))
+        vol_ids = sorted(v.id for v in self.sim_array.volumes()
+                         if v.name.startswith('many_'))
+        self.assertEqual(len(vol_ids), 3)
+
+        pool = [p for p in self.sim_array.pools()
+                if p.id == 'POOL_ID_00001'][0]
+        rc = self.sim_array.volume_create_many(
+            'POOL_ID_00001', ['many_4', 'many_5'], pool.free_space // 2 + 1,
+            Volume.PROVISION_FULL)
+        self.assertEqual(self._errors(rc),
+                         [None, ErrorNumber.NOT_ENOUGH_SPACE])
+
+        rc = self.sim_array.volume_mask_many(
+            'AG_ID_00001', vol_ids[:2] + ['VOL_ID_99999'])
+        self.assertEqual(self._errors(rc),
+                         [None, None, ErrorNumber.NOT_FOUND_VOLUME])
+
+        rc = self.sim_array.volume_delete_many(vol_ids)
+        self.assertEqual(self._errors(rc),
+                         [ErrorNumber.IS_MASKED, ErrorNumber.IS_MASKED, None])
+        self.assertEqual(len(self.sim_array.volumes_accessible_by_access_group(
+            'AG_ID_00001')), 2)
@@ -38,11 +38,23 @@ def plugin_register(self, uri, password, timeout, flags=0):
         # The caller may want to start clean, so we allow the caller to specify
         # a file to store and retrieve individual state.
         qp = uri_parse(uri)
-        if 'parameters' in qp and 'statefile' in qp['parameters'] \
-                and qp['parameters']['statefile'] is not None:
-            self.sim_array = SimArray(qp['parameters']['statefile'], timeout)
-        else:
-            self.sim_array = SimArray(None, timeout)
+        parameters = qp.get('parameters') or {}
+
+        # A new state file can be populated with as many pools, volumes and
+        # so on as asked for, e.g. sim://?statefile=/tmp/big&volumes=100000
+        populate = {}
+        for key in SimArray.POPULATE_KEYS:
+            if parameters.get(key) is not None:
+                try:
+                    populate[key] = int(parameters[key])
+                except ValueError:
+                    raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                                   "Invalid URI parameter %s=%s" %
+                                   (key, parameters[key]))
+
+        self.sim_array = SimArray(parameters.get('statefile'), timeout,
+                                  populate, parameters.get('journal_mode'),
+                                  parameters.get('clock'))
 
         return None
 
@@ -52,6 +64,9 @@ def plugin_unregister(self, flags=0):
     def job_status(self, job_id, flags=0):
         return self.sim_array.job_status(job_id, flags)
 
+    def job_wait(self, job_id, timeout_ms=None, flags=0):
+        return self.sim_array.job_wait(job_id, timeout_ms, flags)
+
     def job_free(self, job_id, flags=0):
         return self.sim_array.job_free(job_id, flags)
 
@@ -111,27 +126,54 @@ def pools(self, search_key=None, search_value=None, flags=0):
             [SimPlugin._sim_data_2_lsm(p) for p in sim_pools],
             search_key, search_value)
 
+    def pools_page(self, filters=None, page_size=Client.PAGE_SIZE_DEFAULT,
+                   cursor=None, flags=0):
+        sim_datas, cursor = self.sim_array.pools_page(
+            filters, page_size, cursor)
+        return [SimPlugin._sim_data_2_lsm(d) for d in sim_datas], cursor
+
     def volumes(self, search_key=None, search_value=None, flags=0):
         sim_vols = self.sim_array.volumes()
         return search_property(
             [SimPlugin._sim_data_2_lsm(v) for v in sim_vols],
             search_key, search_value)
 
+    def volumes_page(self, filters=None, page_size=Client.PAGE_SIZE_DEFAULT,
+                     cursor=None, flags=0):
+        sim_datas, cursor = self.sim_array.volumes_page(
+            filters, page_size, cursor)
+        return [SimPlugin._sim_data_2_lsm(d) for d in sim_datas], cursor
+
     def disks(self, search_key=None, search_value=None, flags=0):
         sim_disks = self.sim_array.disks()
         return search_property(
             [SimPlugin._sim_data_2_lsm(d) for d in sim_disks],
             search_key, search_value)
 
+    def disks_page(self, filters=None, page_size=Client.PAGE_SIZE_DEFAULT,
+                   cursor=None, flags=0):
+        sim_datas, cursor = self.sim_array.disks_page(
+            filters, page_size, cursor)
+        return [SimPlugin._sim_data_2_lsm(d) for d in sim_datas], cursor
+
     def volume_create(self, pool, volume_name, size_bytes, provisioning,
                       flags=0):
         sim_vol = self.sim_array.volume_create(
             pool.id, volume_name, size_bytes, provisioning, flags)
         return SimPlugin._sim_data_2_lsm(sim_vol)
 
+    def volume_create_many(self, pool, volume_names, size_bytes,
+                           provisioning, flags=0):
+        return self.sim_array.volume_create_many(
+            pool.id, volume_names, size_bytes, provisioning, flags)
+
     def volume_delete(self, volume, flags=0):
         return self.sim_array.volume_delete(volume.id, flags)
 
+    def volume_delete_many(self, volumes, flags=0):
+        return self.sim_array.volume_delete_many(
+            [v.id for v in volumes], flags)
+
     def volume_resize(self, volume, new_size_bytes, flags=0):
         sim_vol = self.sim_array.volume_resize(
             volume.id, new_size_bytes, flags)
@@ -166,6 +208,13 @@ def access_groups(self, search_key=None, search_value=None, flags=0):
             [SimPlugin._sim_data_2_lsm(a) for a in sim_ags],
             search_key, search_value)
 
+    def access_groups_page(self, filters=None,
+                           page_size=Client.PAGE_SIZE_DEFAULT, cursor=None,
+                           flags=0):
+        sim_datas, cursor = self.sim_array.ags_page(
+            filters, page_size, cursor)
+        return [SimPlugin._sim_data_2_lsm(d) for d in sim_datas], cursor
+
     def access_group_create(self, name, init_id, init_type, system,
                             flags=0):
         sim_ag = self.sim_array.access_group_create(
@@ -191,6 +240,10 @@ def volume_mask(self, access_group, volume, flags=0):
         return self.sim_array.volume_mask(
             access_group.id, volume.id, flags)
 
+    def volume_mask_many(self, access_group, volumes, flags=0):
+        return self.sim_array.volume_mask_many(
+            access_group.id, [v.id for v in volumes], flags)
+
     def volume_unmask(self, access_group, volume, flags=0):
         return self.sim_array.volume_unmask(
             access_group.id, volume.id, flags)
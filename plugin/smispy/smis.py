@@ -32,7 +32,7 @@
 from lsm.plugin.smispy import smis_ag
 from lsm.plugin.smispy import dmtf
 from lsm.plugin.smispy.utils import (merge_list, handle_cim_errors,
-                                     hex_string_format)
+                                     hex_string_format, cim_path_key)
 import pywbem
 
 
@@ -96,6 +96,22 @@ def _lsm_tgt_port_type_of_cim_fc_tgt(cim_fc_tgt):
     return TargetPort.TYPE_FC
 
 
+def _invalidates(*kinds):
+    """
+    Drop the SmisCommon caches of given kinds, SmisCommon.CACHE_XXX, once
+    the decorated method has changed the array, or might have.
+    """
+    def decorator(method):
+        def invalidate_wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                if self._c is not None:
+                    self._c.cache_invalidate(*kinds)
+        return invalidate_wrapper
+    return decorator
+
+
 class Smis(IStorageAreaNetwork):
     """
     SMI-S plug-ing which exposes a small subset of the overall provided
@@ -161,9 +177,43 @@ def plugin_register(self, uri, password, timeout, flags=0):
                                "ca_cert_file: '%s' does not exists")
             no_ssl_verify = False
 
+        enum_strategy = {}
+        for kind in (SmisCommon.ENUM_VOLUME, SmisCommon.ENUM_DISK):
+            key = '%s_enum' % kind
+            if key in u['parameters']:
+                enum_strategy[kind] = u['parameters'][key]
+                if enum_strategy[kind] not in (SmisCommon.ENUM_WALK,
+                                               SmisCommon.ENUM_BATCH):
+                    raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                                   "%s: '%s' is not 'walk' or 'batch'" %
+                                   (key, enum_strategy[kind]))
+
+        max_object_count = None
+        if 'max_object_count' in u['parameters']:
+            try:
+                max_object_count = int(u['parameters']['max_object_count'])
+            except ValueError:
+                max_object_count = -1
+            if max_object_count < 0:
+                raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                               "max_object_count: '%s' is not a number" %
+                               u['parameters']['max_object_count'])
+
+        indication_listener = None
+        if 'indication_listener' in u['parameters']:
+            (host, _, listener_port) = \
+                u['parameters']['indication_listener'].rpartition(':')
+            if not host or not listener_port.isdigit():
+                raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                               "indication_listener: '%s' is not "
+                               "<host>:<port>" %
+                               u['parameters']['indication_listener'])
+            indication_listener = (host, int(listener_port))
+
         self._c = SmisCommon(
             url, u['username'], password, namespace, no_ssl_verify,
-            debug_path, system_list, ca_cert_file)
+            debug_path, system_list, ca_cert_file, enum_strategy,
+            max_object_count, indication_listener)
 
         self.tmo = timeout
 
@@ -177,6 +227,8 @@ def time_out_get(self, flags=0):
 
     @handle_cim_errors
     def plugin_unregister(self, flags=0):
+        if self._c is not None:
+            self._c.close()
         self._c = None
 
     @handle_cim_errors
@@ -184,6 +236,16 @@ def capabilities(self, system, flags=0):
         cim_sys = smis_sys.cim_sys_of_sys_id(self._c, system.id)
         return smis_cap.get(self._c, cim_sys, system)
 
+    @handle_cim_errors
+    def plugin_stats(self, flags=0):
+        """
+        Requests sent to the SMI-S provider and what the session cache of
+        SmisCommon saved of them, see SmisCommon.stats().
+        """
+        if self._c is None:
+            return {}
+        return self._c.stats()
+
     @handle_cim_errors
     def plugin_info(self, flags=0):
         return "Generic SMI-S support", VERSION
@@ -229,6 +291,8 @@ def job_status(self, job_id, flags=0):
                 status = JobStatus.COMPLETE
                 percent_complete = 100
 
+                # The job might have deleted a volume
+                self._c.cache_invalidate(SmisCommon.CACHE_VOL_POOL)
                 if SmisCommon.cim_job_completed_ok(cim_job):
                     if retrieve_data == SmisCommon.JOB_RETRIEVE_VOLUME or \
                        retrieve_data == SmisCommon.JOB_RETRIEVE_VOLUME_CREATE:
@@ -315,23 +379,33 @@ def volumes(self, search_key=None, search_value=None, flags=0):
         As 'Block Services Package' is mandatory for 'Array' profile, we
         don't check support status here as startup() already checked 'Array'
         profile.
+        The volumes of all pools are fetched at once by
+        smis_vol.cim_vols_of_cim_pools().
         """
         rc = []
         cim_sys_pros = smis_sys.cim_sys_id_pros()
         cim_syss = smis_sys.root_cim_sys(self._c, cim_sys_pros)
         cim_vol_pros = smis_vol.cim_vol_pros()
+        pool_pros = smis_pool.cim_pool_id_pros()
+        cim_pools = []
+        sys_id_of_pool_id = {}
         for cim_sys in cim_syss:
             sys_id = smis_sys.sys_id_of_cim_sys(cim_sys)
-            pool_pros = smis_pool.cim_pool_id_pros()
-            cim_pools = smis_pool.cim_pools_of_cim_sys_path(
-                self._c, cim_sys.path, pool_pros)
-            for cim_pool in cim_pools:
-                pool_id = smis_pool.pool_id_of_cim_pool(cim_pool)
-                cim_vols = smis_vol.cim_vol_of_cim_pool_path(
-                    self._c, cim_pool.path, cim_vol_pros)
-                for cim_vol in cim_vols:
-                    rc.append(
-                        smis_vol.cim_vol_to_lsm_vol(cim_vol, pool_id, sys_id))
+            for cim_pool in smis_pool.cim_pools_of_cim_sys_path(
+                    self._c, cim_sys.path, pool_pros):
+                cim_pools.append(cim_pool)
+                sys_id_of_pool_id[
+                    smis_pool.pool_id_of_cim_pool(cim_pool)] = sys_id
+
+        for (cim_vol, cim_pool) in smis_vol.cim_vols_of_cim_pools(
+                self._c, cim_pools, cim_vol_pros):
+            pool_id = smis_pool.pool_id_of_cim_pool(cim_pool)
+            self._c.cache_set(
+                SmisCommon.CACHE_VOL_POOL, cim_path_key(cim_vol.path),
+                pool_id)
+            rc.append(
+                smis_vol.cim_vol_to_lsm_vol(
+                    cim_vol, pool_id, sys_id_of_pool_id[pool_id]))
         return search_property(rc, search_key, search_value)
 
     @handle_cim_errors
@@ -591,6 +665,7 @@ def _volume_delete_netapp_e(self, volume, flags=0):
             pass
 
     @handle_cim_errors
+    @_invalidates(SmisCommon.CACHE_VOL_POOL)
     def volume_delete(self, volume, flags=0):
         """
         Delete a volume
@@ -1130,7 +1205,7 @@ def _is_access_group(self, cim_spc):
 
     def _cim_spc_of(self, system_id, property_list=None):
         """
-        Return a list of CIM_SCSIProtocolController.
+        Return a generator of CIM_SCSIProtocolController.
         Following SNIA SMIS 'Masking and Mapping Profile':
             CIM_ControllerConfigurationService
                 |
@@ -1139,7 +1214,6 @@ def _cim_spc_of(self, system_id, property_list=None):
             CIM_SCSIProtocolController
         """
         cim_ccs = None
-        rc_cim_spcs = []
 
         if property_list is None:
             property_list = []
@@ -1157,15 +1231,13 @@ def _cim_spc_of(self, system_id, property_list=None):
             raise LsmError(ErrorNumber.NO_SUPPORT,
                            'AccessGroup is not supported by this array')
 
-        cim_spcs = self._c.Associators(
+        cim_spcs = self._c.IterAssociators(
             cim_ccs.path,
             AssocClass='CIM_ConcreteDependency',
             ResultClass='CIM_SCSIProtocolController',
             PropertyList=property_list)
-        for cim_spc in cim_spcs:
-            if self._is_access_group(cim_spc):
-                rc_cim_spcs.append(cim_spc)
-        return rc_cim_spcs
+        return (cim_spc for cim_spc in cim_spcs
+                if self._is_access_group(cim_spc))
 
     @handle_cim_errors
     def volumes_accessible_by_access_group(self, access_group, flags=0):
@@ -1265,7 +1337,7 @@ def _cim_init_mg_of(self, system_id, property_list=None):
 
         cim_gmms = self._c.cim_gmms_of_sys_id(system_id)
 
-        return self._c.Associators(
+        return self._c.IterAssociators(
             cim_gmms.path,
             AssocClass='CIM_ServiceAffectsElement',
             ResultClass='CIM_InitiatorMaskingGroup',
@@ -1293,15 +1365,13 @@ def access_groups(self, search_key=None, search_value=None, flags=0):
                 cim_init_mgs = self._cim_init_mg_of(
                     system_id, cim_init_mg_pros)
                 rc.extend(
-                    list(
-                        smis_ag.cim_init_mg_to_lsm_ag(self._c, x, system_id)
-                        for x in cim_init_mgs))
+                    smis_ag.cim_init_mg_to_lsm_ag(self._c, x, system_id)
+                    for x in cim_init_mgs)
             elif mask_type == smis_cap.MASK_TYPE_MASK:
                 cim_spcs = self._cim_spc_of(system_id, cim_spc_pros)
                 rc.extend(
-                    list(
-                        smis_ag.cim_spc_to_lsm_ag(self._c, cim_spc, system_id)
-                        for cim_spc in cim_spcs))
+                    smis_ag.cim_spc_to_lsm_ag(self._c, cim_spc, system_id)
+                    for cim_spc in cim_spcs)
             else:
                 raise LsmError(ErrorNumber.PLUGIN_BUG,
                                "_get_cim_spc_by_id(): Got invalid mask_type: "
@@ -1448,6 +1518,7 @@ def _ag_init_del_group(self, access_group, init_id):
             self._c, cim_init_mg, access_group.system_id)
 
     @handle_cim_errors
+    @_invalidates(SmisCommon.CACHE_INITIATORS)
     def access_group_initiator_delete(self, access_group, init_id, init_type,
                                       flags=0):
         if self._c.is_netappe():
@@ -1502,21 +1573,22 @@ def disks(self, search_key=None, search_value=None, flags=0):
         sub ComputerSystem. To improve performance of listing disks, we will
         use EnumerateInstances(). Which means we have to filter the results
         by ourselves in case URI contain 'system=xxx'.
+        The Primordial CIM_StorageExtent of all disks are fetched at once by
+        smis_disk.cim_disks_to_lsm_disks().
         """
-        rc = []
         self._c.profile_check(SmisCommon.SNIA_DISK_LITE_PROFILE,
                               SmisCommon.SMIS_SPEC_VER_1_4,
                               raise_error=True)
         cim_disk_pros = smis_disk.cim_disk_pros()
-        cim_disks = self._c.EnumerateInstances(
+        cim_disks = self._c.IterEnumerateInstances(
             'CIM_DiskDrive', PropertyList=cim_disk_pros)
-        for cim_disk in cim_disks:
-            if self._c.system_list and \
-               smis_disk.sys_id_of_cim_disk(cim_disk) not in \
-               self._c.system_list:
-                continue
+        if self._c.system_list:
+            cim_disks = (
+                cim_disk for cim_disk in cim_disks
+                if smis_disk.sys_id_of_cim_disk(cim_disk) in
+                self._c.system_list)
 
-            rc.extend([smis_disk.cim_disk_to_lsm_disk(self._c, cim_disk)])
+        rc = list(smis_disk.cim_disks_to_lsm_disks(self._c, cim_disks))
         return search_property(rc, search_key, search_value)
 
     @staticmethod
@@ -2014,6 +2086,7 @@ def access_group_create(self, name, init_id, init_type, system,
         return smis_ag.cim_init_mg_to_lsm_ag(self._c, cim_init_mg, system.id)
 
     @handle_cim_errors
+    @_invalidates(SmisCommon.CACHE_INITIATORS)
     def access_group_delete(self, access_group, flags=0):
         self._c.profile_check(
             SmisCommon.SNIA_GROUP_MASK_PROFILE, SmisCommon.SMIS_SPEC_VER_1_5,
@@ -229,15 +229,18 @@ def lsm_init_id_to_snia(lsm_init_id):
 def cim_init_path_check_or_create(smis_common, system_id, init_id, init_type):
     """
     Check whether CIM_StorageHardwareID exists, if not, create new one.
+    The paths of all CIM_StorageHardwareID are cached for the session.
     """
-    cim_inits = smis_common.EnumerateInstances(
-        'CIM_StorageHardwareID',
-        PropertyList=_CIM_INIT_PROS)
+    def _fetch():
+        return dict(
+            (init_id_of_cim_init(cim_init), cim_init.path)
+            for cim_init in smis_common.IterEnumerateInstances(
+                'CIM_StorageHardwareID', PropertyList=_CIM_INIT_PROS))
 
-    if len(cim_inits):
-        for cim_init in cim_inits:
-            if init_id_of_cim_init(cim_init) == init_id:
-                return cim_init.path
+    cim_init_path_of_id = smis_common.cache_get(
+        SmisCommon.CACHE_INITIATORS, None, _fetch)
+    if init_id in cim_init_path_of_id:
+        return cim_init_path_of_id[init_id]
 
     # Create new one
     if init_type == AccessGroup.INIT_TYPE_WWPN:
@@ -255,9 +258,11 @@ def cim_init_path_check_or_create(smis_common, system_id, init_id, init_type):
         'StorageID': init_id,
         'IDType': dmtf_id_type,
     }
-    return smis_common.invoke_method_wait(
+    cim_init_path = smis_common.invoke_method_wait(
         'CreateStorageHardwareID', cim_hwms.path, in_params,
         out_key='HardwareID', expect_class='CIM_StorageHardwareID')
+    cim_init_path_of_id[init_id] = cim_init_path
+    return cim_init_path
 
 
 def cim_vols_masked_to_cim_spc_path(smis_common, cim_spc_path,
@@ -269,12 +274,12 @@ def cim_vols_masked_to_cim_spc_path(smis_common, cim_spc_path,
                 |   CIM_ProtocolControllerForUnit
                 v
         CIM_StorageVolume
-    Return a list of CIMInstance
+    Return a generator of CIMInstance
     """
     if property_list is None:
         property_list = []
 
-    return smis_common.Associators(
+    return smis_common.IterAssociators(
         cim_spc_path,
         AssocClass='CIM_ProtocolControllerForUnit',
         ResultClass='CIM_StorageVolume',
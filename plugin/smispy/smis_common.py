@@ -25,14 +25,17 @@
 import datetime
 import time
 import sys
+import threading
 import six
 
-from lsm import LsmError, ErrorNumber, md5
+from lsm import LsmError, ErrorNumber, md5, error
 
 import pywbem
 from lsm.plugin.smispy.utils import merge_list
 from lsm.plugin.smispy import dmtf
 
+_now = getattr(time, 'monotonic', time.time)
+
 
 def _profile_register_load(wbem_conn):
     """
@@ -146,6 +149,78 @@ def _profile_spec_ver_to_num(spec_ver_str):
     return None
 
 
+class EnumBatchUnusable(Exception):
+    """
+    Raised by the batch() of SmisCommon.enum_by_strategy() before it
+    generates anything when what the provider returned does not look
+    complete, for walk() to be used instead.
+    """
+    pass
+
+
+class _JobIndications(object):
+    """
+    Listens to the CIM_InstModification indications of CIM_ConcreteJob
+    so that invoke_method_wait() checks a job when it changes instead of
+    on its next poll.
+    """
+    _QUERY = "SELECT * FROM CIM_InstModification " \
+             "WHERE SourceInstance ISA CIM_ConcreteJob"
+    _SUBSCRIPTION_MANAGER_ID = 'libstoragemgmt'
+
+    def __init__(self, wbem_conn, host, port):
+        self.count = 0
+        self._cond = threading.Condition()
+        self._sub_mgr = None
+        self._server_id = None
+        self._listener = pywbem.WBEMListener(host, http_port=port)
+        self._listener.add_callback(self._indication)
+        self._listener.start()
+        try:
+            self._sub_mgr = pywbem.WBEMSubscriptionManager(
+                _JobIndications._SUBSCRIPTION_MANAGER_ID)
+            self._server_id = self._sub_mgr.add_server(
+                pywbem.WBEMServer(wbem_conn))
+            self._sub_mgr.add_listener_destinations(
+                self._server_id, 'http://%s:%d' % (host, port))
+            cim_filter = self._sub_mgr.add_filter(
+                self._server_id, wbem_conn.default_namespace,
+                _JobIndications._QUERY, 'WQL')
+            self._sub_mgr.add_subscriptions(self._server_id, cim_filter.path)
+        except Exception:
+            self.close()
+            raise
+
+    def _indication(self, indication, host):
+        # Called in the thread of the listener.  Every job change wakes up
+        # the waiting one which finds out with GetInstance() whether it
+        # is its own.
+        with self._cond:
+            self.count += 1
+            self._cond.notify_all()
+
+    def wait(self, seen, timeout):
+        """
+        Wait until an indication newer than the count seen arrives or
+        timeout seconds have passed.  Return the count.
+        """
+        with self._cond:
+            if self.count == seen and timeout > 0:
+                self._cond.wait(timeout)
+            return self.count
+
+    def close(self):
+        try:
+            if self._server_id is not None:
+                # Removes the filter, destination and subscription made
+                self._sub_mgr.remove_server(self._server_id)
+        except Exception as e:
+            error("Failed to remove job indication subscription: %s" % e)
+        finally:
+            self._server_id = None
+            self._listener.stop()
+
+
 class SmisCommon(object):
     # Even many CIM_XXX_Service in DMTF shared the same return value
     # definition as SNIA do, but there is no DMTF standard motioned
@@ -180,16 +255,49 @@ class SmisCommon(object):
     JOB_RETRIEVE_VOLUME = 1
     JOB_RETRIEVE_VOLUME_CREATE = 2
 
+    # Default MaxObjectCount of WBEM pull operations, 0 for not using them
+    PULL_MAX_OBJECT_COUNT = 1000
+
+    # Kinds of objects cached for the session, see cache_get()
+    CACHE_SERVICES = 'services'
+    CACHE_ROOT_SYSTEMS = 'root_systems'
+    CACHE_VOL_POOL = 'volume_pool'
+    CACHE_INITIATORS = 'initiators'
+
+    ENUM_WALK = 'walk'
+    ENUM_BATCH = 'batch'
+    ENUM_VOLUME = 'volume'
+    ENUM_DISK = 'disk'
+
+    # How providers refuse the enumerations of a batch(), including the
+    # filtered ones.
+    _ENUM_REFUSED_ERRORS = (
+        pywbem.CIM_ERR_NOT_SUPPORTED,
+        pywbem.CIM_ERR_INVALID_CLASS,
+        pywbem.CIM_ERR_QUERY_LANGUAGE_NOT_SUPPORTED,
+        pywbem.CIM_ERR_INVALID_QUERY,
+        pywbem.CIM_ERR_FILTERED_ENUMERATION_NOT_SUPPORTED)
+
     IAAN_WBEM_HTTP_PORT = 5988
     IAAN_WBEM_HTTPS_PORT = 5989
 
-    _INVOKE_MAX_LOOP_COUNT = 60
-    _INVOKE_CHECK_INTERVAL = 5
+    # The job of an asynchronous method is first checked once the time
+    # its earlier jobs took has passed, or after _INVOKE_FIRST_INTERVAL
+    # seconds, then after twice as long each time up to
+    # _INVOKE_MAX_INTERVAL seconds, until _INVOKE_TIMEOUT seconds.
+    _INVOKE_FIRST_INTERVAL = 0.1
+    _INVOKE_MAX_INTERVAL = 10
+    _INVOKE_TIMEOUT = 300
+    # With job indications, polling is only there in case one gets lost.
+    _INVOKE_MAX_INTERVAL_INDICATION = 60
+    # Weight of the last job in the expected duration of a method.
+    _INVOKE_DURATION_WEIGHT = 0.3
 
     def __init__(self, url, username, password,
                  namespace=dmtf.DEFAULT_NAMESPACE,
                  no_ssl_verify=False, debug_path=None, system_list=None,
-                 ca_cert_file=None):
+                 ca_cert_file=None, enum_strategy=None,
+                 max_object_count=None, indication_listener=None):
         self._wbem_conn = None
         self._profile_dict = {}
         self.root_blk_cim_rp = None    # For root_cim_
@@ -197,6 +305,24 @@ def __init__(self, url, username, password,
         self.system_list = system_list
         self._debug_path = debug_path
         self._ca_cert_file = ca_cert_file
+        # SmisCommon.ENUM_XXX of SmisCommon.ENUM_VOLUME and etc, see
+        # enum_by_strategy()
+        self._enum_strategy = dict(enum_strategy or {})
+        self._request_count = 0
+        # {kind: {key: (value, requests to fetch it)}}
+        self._cache = {}
+        # {kind: {'hits': 0, 'misses': 0, ...}}
+        self._cache_stats = {}
+        if max_object_count is None:
+            max_object_count = SmisCommon.PULL_MAX_OBJECT_COUNT
+        self._max_object_count = max_object_count
+        # (host, port) to receive job indications on, see
+        # _job_indications_get()
+        self._indication_listener = indication_listener
+        self._job_indications = None
+        # {method name: expected duration of its jobs in seconds}
+        self._job_durations = {}
+        self._job_stats = {'count': 0, 'polls': 0}
 
         if namespace is None:
             namespace = dmtf.DEFAULT_NAMESPACE
@@ -216,6 +342,11 @@ def __init__(self, url, username, password,
         if debug_path is not None:
             self._wbem_conn.debug = True
 
+        # WBEM pull operations(DSP0200 1.4) are in pywbem 0.9 or later.
+        # Set to False when provider does not support them.
+        self._pull = max_object_count > 0 and \
+            hasattr(self._wbem_conn, 'OpenEnumerateInstances')
+
         if namespace.lower() == SmisCommon._MEGARAID_NAMESPACE.lower():
             # Skip profile register check on MegaRAID for better performance.
             # MegaRAID SMI-S profile support status will not change for a
@@ -272,7 +403,8 @@ def profile_check(self, profile_name, spec_ver, raise_error=False):
 
     def _vendor_namespace(self):
         if self.root_blk_cim_rp:
-            cim_syss_path = self._wbem_conn.AssociatorNames(
+            cim_syss_path = self._request(
+                'AssociatorNames',
                 self.root_blk_cim_rp.path,
                 ResultClass='CIM_ComputerSystem',
                 AssocClass='CIM_ElementConformsToProfile')
@@ -288,37 +420,243 @@ def _vendor_namespace(self):
                 ErrorNumber.PLUGIN_BUG,
                 "_vendor_namespace(): self.root_blk_cim_rp not set yet")
 
-    def EnumerateInstances(self, ClassName, namespace=None, **params):
+    def _request(self, operation, *args, **params):
+        """
+        Send a request to the provider, all of them go through here to be
+        counted.
+        """
+        self._request_count += 1
+        return getattr(self._wbem_conn, operation)(*args, **params)
+
+    def _cache_kind_stats(self, kind):
+        if kind not in self._cache_stats:
+            self._cache_stats[kind] = {
+                'hits': 0, 'misses': 0, 'invalidations': 0,
+                'requests_saved': 0}
+        return self._cache_stats[kind]
+
+    def cache_get(self, kind, key, fetch):
+        """
+        Usage:
+            Return the object cached for this session under kind and key,
+            or fetch() it from the provider and cache it.
+            Objects are kept until cache_invalidate() of their kind, so only
+            cache what the provider does not change by itself.
+        Parameter:
+            kind    # SmisCommon.CACHE_XXX
+            key     # Hashable
+            fetch   # Function returning the object
+        Returns:
+            The object
+        """
+        stats = self._cache_kind_stats(kind)
+        kind_cache = self._cache.setdefault(kind, {})
+        if key in kind_cache:
+            (value, cost) = kind_cache[key]
+            stats['hits'] += 1
+            stats['requests_saved'] += cost
+            return value
+
+        stats['misses'] += 1
+        request_count = self._request_count
+        value = fetch()
+        kind_cache[key] = (value, self._request_count - request_count)
+        return value
+
+    def cache_set(self, kind, key, value, cost=1):
+        """
+        Cache an object found by the way, cost is the number of requests
+        fetching it would have taken.
+        """
+        self._cache.setdefault(kind, {})[key] = (value, cost)
+
+    def cache_invalidate(self, *kinds):
+        """
+        Drop all cached objects of given kinds, SmisCommon.CACHE_XXX.
+        """
+        for kind in kinds:
+            if self._cache.pop(kind, None):
+                self._cache_kind_stats(kind)['invalidations'] += 1
+
+    def stats(self):
+        """
+        Return a dict of the requests sent to the provider
+        ('cim_requests') and the hits, misses, invalidations and requests
+        saved of each kind of cached object('cim_cache_<kind>').
+        """
+        rc = {'cim_requests': {'count': self._request_count},
+              'cim_jobs': dict(self._job_stats)}
+        if self._job_indications:
+            rc['cim_jobs']['indications'] = self._job_indications.count
+        for (kind, stats) in self._cache_stats.items():
+            rc['cim_cache_%s' % kind] = dict(
+                stats, entries=len(self._cache.get(kind, {})))
+        return rc
+
+    def _enumerate_namespace_check(self):
         if self._wbem_conn.default_namespace in dmtf.INTEROP_NAMESPACES:
             # We have to enumerate in vendor namespace
             self._wbem_conn.default_namespace = self._vendor_namespace()
+
+    def EnumerateInstances(self, ClassName, namespace=None, **params):
+        self._enumerate_namespace_check()
         params['LocalOnly'] = False
-        return self._wbem_conn.EnumerateInstances(
-            ClassName, namespace, **params)
+        return self._request(
+            'EnumerateInstances', ClassName, namespace, **params)
 
     def EnumerateInstanceNames(self, ClassName, namespace=None, **params):
-        if self._wbem_conn.default_namespace in dmtf.INTEROP_NAMESPACES:
-            # We have to enumerate in vendor namespace
-            self._wbem_conn.default_namespace = self._vendor_namespace()
+        self._enumerate_namespace_check()
         params['LocalOnly'] = False
-        return self._wbem_conn.EnumerateInstanceNames(
-            ClassName, namespace, **params)
+        return self._request(
+            'EnumerateInstanceNames', ClassName, namespace, **params)
 
     def Associators(self, ObjectName, **params):
-        return self._wbem_conn.Associators(ObjectName, **params)
+        return self._request('Associators', ObjectName, **params)
+
+    def _pulled(self, pull_method, objs, eos, context):
+        """
+        Generator of the objects of a pull enumeration, pulling
+        MaxObjectCount more whenever the previous ones are consumed.
+        An enumeration not consumed to the end is closed.
+        """
+        try:
+            while True:
+                for obj in objs:
+                    yield obj
+                if eos:
+                    break
+                (objs, eos, context) = self._request(
+                    pull_method, context,
+                    MaxObjectCount=self._max_object_count)
+        finally:
+            if not eos:
+                try:
+                    self._request('CloseEnumeration', context)
+                except Exception:
+                    pass
+
+    def _iter(self, open_method, pull_method, classic_method, *args,
+              **params):
+        """
+        Return an iterator of the objects classic_method would return a list
+        of, using open_method and pull_method instead when supported so the
+        provider sends them MaxObjectCount at a time.
+        The open request is sent before returning, so errors of it are
+        raised here as they would be by classic_method.
+        CIM_ERR_NOT_SUPPORTED is how providers refuse both operations they
+        don't have and classes they won't enumerate(like association
+        classes), so pull operations are only given up on for the session
+        when classic_method then works.
+        A FilterQuery in params can only be sent by open_method, without
+        pull operations CIM_ERR_NOT_SUPPORTED is raised instead of
+        returning unfiltered objects.
+        """
+        filtered = 'FilterQuery' in params
+        if filtered and not self._pull:
+            raise pywbem.CIMError(
+                pywbem.CIM_ERR_NOT_SUPPORTED,
+                "%s with FilterQuery needs pull operations" % open_method)
+        if self._pull:
+            pull_params = dict(params)
+            # Not parameters of pull operations, always False for LSM.
+            pull_params.pop('LocalOnly', None)
+            pull_params.pop('IncludeQualifiers', None)
+            try:
+                (objs, eos, context) = self._request(
+                    open_method, *args, MaxObjectCount=self._max_object_count,
+                    **pull_params)
+                return self._pulled(pull_method, objs, eos, context)
+            except pywbem.CIMError as ce:
+                if filtered or ce.args[0] != pywbem.CIM_ERR_NOT_SUPPORTED:
+                    raise
+                # Raises the same error when it is the class refused.
+                cim_objs = self._request(classic_method, *args, **params)
+                self._pull = False
+                return iter(cim_objs)
+        return iter(self._request(classic_method, *args, **params))
+
+    def IterEnumerateInstances(self, ClassName, namespace=None, **params):
+        """
+        Like EnumerateInstances(), but return an iterator using
+        OpenEnumerateInstances() and PullInstancesWithPath() when supported.
+        """
+        self._enumerate_namespace_check()
+        params['LocalOnly'] = False
+        return self._iter(
+            'OpenEnumerateInstances', 'PullInstancesWithPath',
+            'EnumerateInstances', ClassName, namespace, **params)
+
+    def IterEnumerateInstanceNames(self, ClassName, namespace=None,
+                                   **params):
+        """
+        Like EnumerateInstanceNames(), but return an iterator using
+        OpenEnumerateInstancePaths() and PullInstancePaths() when supported.
+        """
+        self._enumerate_namespace_check()
+        return self._iter(
+            'OpenEnumerateInstancePaths', 'PullInstancePaths',
+            'EnumerateInstanceNames', ClassName, namespace, **params)
+
+    def IterAssociators(self, ObjectName, **params):
+        """
+        Like Associators(), but return an iterator using
+        OpenAssociatorInstances() and PullInstancesWithPath() when
+        supported.
+        """
+        return self._iter(
+            'OpenAssociatorInstances', 'PullInstancesWithPath',
+            'Associators', ObjectName, **params)
 
     def AssociatorNames(self, ObjectName, **params):
-        return self._wbem_conn.AssociatorNames(ObjectName, **params)
+        return self._request('AssociatorNames', ObjectName, **params)
 
     def GetInstance(self, InstanceName, **params):
         params['LocalOnly'] = False
-        return self._wbem_conn.GetInstance(InstanceName, **params)
+        return self._request('GetInstance', InstanceName, **params)
 
     def DeleteInstance(self, InstanceName, **params):
-        return self._wbem_conn.DeleteInstance(InstanceName, **params)
+        return self._request('DeleteInstance', InstanceName, **params)
 
     def References(self, ObjectName, **params):
-        return self._wbem_conn.References(ObjectName, **params)
+        return self._request('References', ObjectName, **params)
+
+    def enum_by_strategy(self, kind, batch, walk):
+        """
+        Usage:
+            List objects of given kind using the strategy of this provider:
+                SmisCommon.ENUM_WALK(default)
+                    walk(), requests per object.
+                SmisCommon.ENUM_BATCH
+                    batch(), a few requests for all objects.
+                    Falls back to walk() when batch() raises
+                    EnumBatchUnusable, or gets one of
+                    SmisCommon._ENUM_REFUSED_ERRORS, before generating
+                    anything. On the errors the provider refused the
+                    enumerations, walk() is then used for the rest of the
+                    session.
+        Parameter:
+            kind        # SmisCommon.ENUM_VOLUME or SmisCommon.ENUM_DISK
+            batch       # Generator function of the objects
+            walk        # Generator function of the same objects as batch
+        Returns:
+            Generator of what batch() or walk() generates
+        """
+        if self._enum_strategy.get(kind) == SmisCommon.ENUM_BATCH:
+            generated = False
+            try:
+                for obj in batch():
+                    generated = True
+                    yield obj
+                return
+            except EnumBatchUnusable:
+                pass
+            except pywbem.CIMError as ce:
+                if generated or \
+                   ce.args[0] not in SmisCommon._ENUM_REFUSED_ERRORS:
+                    raise
+                self._enum_strategy[kind] = SmisCommon.ENUM_WALK
+        for obj in walk():
+            yield obj
 
     def is_megaraid(self):
         return self._vendor_product == SmisCommon._PRODUCT_MEGARAID
@@ -438,8 +776,8 @@ def invoke_method(self, cmd, cim_path, in_params, out_handler=None,
         if retrieve_data is None:
             retrieve_data = SmisCommon.JOB_RETRIEVE_NONE
         try:
-            (rc, out) = self._wbem_conn.InvokeMethod(
-                cmd, cim_path, **in_params)
+            (rc, out) = self._request(
+                'InvokeMethod', cmd, cim_path, **in_params)
 
             # Check to see if operation is done
             if rc == SmisCommon.SNIA_INVOKE_OK:
@@ -486,7 +824,8 @@ def invoke_method_wait(self, cmd, cim_path, in_params,
         If flag_out_array is True, return the first element of out[out_key].
         """
         cim_job = dict()
-        (rc, out) = self._wbem_conn.InvokeMethod(cmd, cim_path, **in_params)
+        (rc, out) = self._request(
+            'InvokeMethod', cmd, cim_path, **in_params)
 
         try:
             if rc == SmisCommon.SNIA_INVOKE_OK:
@@ -511,21 +850,36 @@ def invoke_method_wait(self, cmd, cim_path, in_params,
             elif rc == SmisCommon.SNIA_INVOKE_ASYNC:
                 cim_job = {}
                 cim_job_path = out['Job']
-                loop_counter = 0
                 job_pros = ['JobState', 'ErrorDescription',
                             'OperationalStatus']
                 cim_xxxs_path = []
-                while loop_counter <= SmisCommon._INVOKE_MAX_LOOP_COUNT:
+                start = _now()
+                deadline = start + SmisCommon._INVOKE_TIMEOUT
+                indications = self._job_indications_get()
+                seen = indications.count if indications else 0
+                self._job_stats['count'] += 1
+                for delay in self._job_poll_delays(cmd):
+                    delay = min(delay, deadline - _now())
+                    if indications:
+                        seen = indications.wait(seen, delay)
+                    elif delay > 0:
+                        time.sleep(delay)
+                    self._job_stats['polls'] += 1
                     cim_job = self.GetInstance(cim_job_path,
                                                PropertyList=job_pros)
                     job_state = cim_job['JobState']
                     if job_state in (dmtf.JOB_STATE_NEW,
                                      dmtf.JOB_STATE_STARTING,
                                      dmtf.JOB_STATE_RUNNING):
-                        loop_counter += 1
-                        time.sleep(SmisCommon._INVOKE_CHECK_INTERVAL)
+                        if _now() >= deadline:
+                            raise LsmError(
+                                ErrorNumber.TIMEOUT,
+                                "The job generated by %s() failed to "
+                                "finish in %ds" %
+                                (cmd, SmisCommon._INVOKE_TIMEOUT))
                         continue
                     elif job_state == dmtf.JOB_STATE_COMPLETED:
+                        self._job_duration_learn(cmd, _now() - start)
                         if not SmisCommon.cim_job_completed_ok(cim_job):
                             raise LsmError(
                                 ErrorNumber.PLUGIN_BUG,
@@ -543,14 +897,6 @@ def invoke_method_wait(self, cmd, cim_path, in_params,
                             "invoke_method_wait(): Got unknown job state "
                             "%d: %s" % (job_state, list(cim_job.items())))
 
-                if loop_counter > SmisCommon._INVOKE_MAX_LOOP_COUNT:
-                    raise LsmError(
-                        ErrorNumber.TIMEOUT,
-                        "The job generated by %s() failed to finish in %ds" %
-                        (cmd,
-                         SmisCommon._INVOKE_CHECK_INTERVAL *
-                         SmisCommon._INVOKE_MAX_LOOP_COUNT))
-
                 if len(cim_xxxs_path) == 1:
                     return cim_xxxs_path[0]
                 else:
@@ -574,13 +920,64 @@ def invoke_method_wait(self, cmd, cim_path, in_params,
             self._dump_wbem_xml(cmd)
             six.reraise(*exc_info)
 
+    def _job_poll_delays(self, cmd):
+        """
+        Generate the seconds to wait before each check of a job started by
+        method cmd.
+        """
+        max_interval = SmisCommon._INVOKE_MAX_INTERVAL
+        if self._job_indications:
+            max_interval = SmisCommon._INVOKE_MAX_INTERVAL_INDICATION
+        delay = SmisCommon._INVOKE_FIRST_INTERVAL
+        expected = self._job_durations.get(cmd)
+        if expected is not None:
+            yield min(max(expected, delay), max_interval)
+            # Close to the expected end, the job is checked again soon.
+            delay = max(delay, expected / 8)
+        while True:
+            yield delay
+            delay = min(delay * 2, max_interval)
+
+    def _job_duration_learn(self, cmd, duration):
+        expected = self._job_durations.get(cmd)
+        if expected is not None:
+            duration = expected + SmisCommon._INVOKE_DURATION_WEIGHT * (
+                duration - expected)
+        self._job_durations[cmd] = duration
+
+    def _job_indications_get(self):
+        """
+        Return the _JobIndications of the indication_listener given to
+        __init__() or None.  A provider which can not be subscribed to
+        is polled only.
+        """
+        if self._job_indications is None and self._indication_listener:
+            (host, port) = self._indication_listener
+            try:
+                self._job_indications = _JobIndications(
+                    self._wbem_conn, host, port)
+            except Exception as e:
+                error("Job indications disabled: %s" % e)
+                self._job_indications = False
+        return self._job_indications or None
+
+    def close(self):
+        """
+        Remove the job indication subscription, if any.
+        """
+        if self._job_indications:
+            self._job_indications.close()
+        self._job_indications = None
+
     def _cim_srv_of_sys_id(self, srv_name, sys_id, raise_error):
         property_list = ['SystemName']
 
         try:
-            cim_srvs = self.EnumerateInstances(
-                srv_name,
-                PropertyList=property_list)
+            # Services do not come and go, enumerate each class once.
+            cim_srvs = self.cache_get(
+                SmisCommon.CACHE_SERVICES, srv_name,
+                lambda: self.EnumerateInstances(
+                    srv_name, PropertyList=property_list))
             for cim_srv in cim_srvs:
                 if cim_srv['SystemName'] == sys_id:
                     return cim_srv
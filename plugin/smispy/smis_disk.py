@@ -15,8 +15,8 @@
 # Author: Gris Ge <fge@redhat.com>
 
 from lsm import Disk, md5, LsmError, ErrorNumber
-from lsm.plugin.smispy.smis_common import SmisCommon
-from lsm.plugin.smispy.utils import merge_list
+from lsm.plugin.smispy.smis_common import SmisCommon, EnumBatchUnusable
+from lsm.plugin.smispy.utils import merge_list, cim_path_key
 from lsm.plugin.smispy import dmtf
 
 
@@ -120,12 +120,16 @@ def _pri_cim_ext_of_cim_disk(smis_common, cim_disk_path, property_list=None):
     else:
         property_list = merge_list(property_list, ['Primordial'])
 
-    cim_exts = smis_common.Associators(
+    cim_exts = smis_common.IterAssociators(
         cim_disk_path,
         AssocClass='CIM_MediaPresent',
         ResultClass='CIM_StorageExtent',
         PropertyList=property_list)
-    cim_exts = [p for p in cim_exts if p["Primordial"]]
+    return _the_pri_cim_ext(
+        cim_disk_path, [p for p in cim_exts if p["Primordial"]])
+
+
+def _the_pri_cim_ext(cim_disk_path, cim_exts):
     if len(cim_exts) == 1:
         # As SNIA commanded, only _ONE_ Primordial CIM_StorageExtent for
         # each CIM_DiskDrive
@@ -138,6 +142,63 @@ def _pri_cim_ext_of_cim_disk(smis_common, cim_disk_path, property_list=None):
                        (cim_disk_path, cim_exts))
 
 
+def _cim_disks_to_lsm_disks_batch(smis_common, cim_disks):
+    """
+    Batched version of cim_disk_to_lsm_disk() for all cim_disks, a list of
+    CIM_DiskDrive, using two or three enumerations whatever the number of
+    disks:
+        OpenEnumerateInstances('CIM_StorageExtent')  # Primordial only
+        EnumerateInstanceNames('CIM_MediaPresent')
+        EnumerateInstanceNames('CIM_IsSpare')      # If spare profile
+    The Primordial CIM_StorageExtent are selected by a DMTF:FQL FilterQuery,
+    as the class also holds every CIM_StorageVolume of the array, so pull
+    operations with filtered enumerations are needed.
+    The association names hold the disk path('Antecedent') and its extent
+    path('Dependent'), or the spare extent path('Antecedent') for
+    CIM_IsSpare, they are joined by the keys of the paths.
+    Raise EnumBatchUnusable when a disk has no Primordial CIM_StorageExtent
+    in the associations.
+    """
+    cim_ext_of_key = {}
+    for cim_ext in smis_common.IterEnumerateInstances(
+            'CIM_StorageExtent', FilterQueryLanguage='DMTF:FQL',
+            FilterQuery='Primordial = TRUE',
+            PropertyList=['Primordial', 'BlockSize', 'NumberOfBlocks']):
+        # In case the provider ignored the filter.
+        if 'Primordial' in cim_ext and cim_ext['Primordial']:
+            cim_ext_of_key[cim_path_key(cim_ext.path)] = cim_ext
+
+    cim_exts_of_disk_key = {}
+    for cim_mp_path in smis_common.IterEnumerateInstanceNames(
+            'CIM_MediaPresent'):
+        cim_ext = cim_ext_of_key.get(cim_path_key(cim_mp_path['Dependent']))
+        if cim_ext is not None:
+            cim_exts_of_disk_key.setdefault(
+                cim_path_key(cim_mp_path['Antecedent']), []).append(cim_ext)
+    del cim_ext_of_key
+
+    for cim_disk in cim_disks:
+        if cim_path_key(cim_disk.path) not in cim_exts_of_disk_key:
+            # Unlike walk, nothing tells whether the provider has no such
+            # extent or just did not list it.
+            raise EnumBatchUnusable()
+
+    spare_ext_keys = set()
+    if _flag_spare(smis_common):
+        spare_ext_keys = set(
+            cim_path_key(cim_is_spare_path['Antecedent'])
+            for cim_is_spare_path in
+            smis_common.IterEnumerateInstanceNames('CIM_IsSpare'))
+
+    for cim_disk in cim_disks:
+        cim_ext = _the_pri_cim_ext(
+            cim_disk.path,
+            cim_exts_of_disk_key.get(cim_path_key(cim_disk.path), []))
+        yield _cim_disk_to_lsm_disk(
+            smis_common, cim_disk, cim_ext,
+            cim_path_key(cim_ext.path) in spare_ext_keys)
+
+
 # LSIESG_DiskDrive['MediaType']
 # Value was retrieved from MOF file of MegaRAID SMI-S provider.
 _MEGARAID_DISK_MEDIA_TYPE_SSD = 1
@@ -168,6 +229,12 @@ def _disk_type_megaraid(cim_disk):
     return Disk.TYPE_UNKNOWN
 
 
+def _flag_spare(smis_common):
+    return smis_common.profile_check(SmisCommon.SNIA_SPARE_DISK_PROFILE,
+                                     SmisCommon.SMIS_SPEC_VER_1_4,
+                                     raise_error=False)
+
+
 def cim_disk_to_lsm_disk(smis_common, cim_disk):
     """
     Convert CIM_DiskDrive to lsm.Disk.
@@ -178,15 +245,51 @@ def cim_disk_to_lsm_disk(smis_common, cim_disk):
         smis_common, cim_disk.path,
         property_list=['BlockSize', 'NumberOfBlocks'])
 
-    status = _disk_status_of_cim_disk(cim_disk)
-    if smis_common.profile_check(SmisCommon.SNIA_SPARE_DISK_PROFILE,
-                                 SmisCommon.SMIS_SPEC_VER_1_4,
-                                 raise_error=False):
+    is_spare = False
+    if _flag_spare(smis_common):
         cim_srss = smis_common.AssociatorNames(
             cim_ext.path, AssocClass='CIM_IsSpare',
             ResultClass='CIM_StorageRedundancySet')
-        if len(cim_srss) >= 1:
-            status |= Disk.STATUS_SPARE_DISK
+        is_spare = len(cim_srss) >= 1
+
+    return _cim_disk_to_lsm_disk(smis_common, cim_disk, cim_ext, is_spare)
+
+
+def cim_disks_to_lsm_disks(smis_common, cim_disks):
+    """
+    Return a generator of lsm.Disk converted from cim_disks, an iterable of
+    CIM_DiskDrive.
+    Using SmisCommon.ENUM_DISK strategy of smis_common.enum_by_strategy():
+        SmisCommon.ENUM_WALK
+            cim_disk_to_lsm_disk() for each disk, one or two requests per
+            disk.
+        SmisCommon.ENUM_BATCH
+            Two or three enumerations whatever the number of disks, for
+            shelves with thousands of disks. Needs pull operations with
+            DMTF:FQL filtering, walks when a disk has no Primordial
+            CIM_StorageExtent in the associations.
+    """
+    # batch() checks all disks before walk() may have to list them again.
+    cim_disks = list(cim_disks)
+
+    def _batch():
+        return _cim_disks_to_lsm_disks_batch(smis_common, cim_disks)
+
+    def _walk():
+        for cim_disk in cim_disks:
+            yield cim_disk_to_lsm_disk(smis_common, cim_disk)
+
+    return smis_common.enum_by_strategy(SmisCommon.ENUM_DISK, _batch, _walk)
+
+
+def _cim_disk_to_lsm_disk(smis_common, cim_disk, cim_ext, is_spare):
+    """
+    Convert CIM_DiskDrive to lsm.Disk using its Primordial
+    CIM_StorageExtent.
+    """
+    status = _disk_status_of_cim_disk(cim_disk)
+    if is_spare:
+        status |= Disk.STATUS_SPARE_DISK
 
     if 'EMCInUse' in list(cim_disk.keys()) and cim_disk['EMCInUse'] is False:
         status |= Disk.STATUS_FREE
@@ -15,7 +15,8 @@
 # Author: Gris Ge <fge@redhat.com>
 
 from lsm.plugin.smispy.utils import (merge_list, path_str_to_cim_path,
-                                     cim_path_to_path_str)
+                                     cim_path_to_path_str, cim_path_key)
+from lsm.plugin.smispy.smis_common import SmisCommon
 from lsm.plugin.smispy import dmtf
 
 
@@ -33,7 +34,8 @@ def cim_pools_of_cim_sys_path(smis_common, cim_sys_path, property_list=None):
             CIM_StoragePool
     As 'Block Services Package' is mandatory for 'Array' profile which already
     checked by plugin_register(), we don't do any profile check here.
-    Primordial pool will be eliminated from return list.
+    Return a generator of CIM_StoragePool.
+    Primordial pool will be eliminated.
     These pools will be eliminated also:
         * Spare pool with CIM_StoragePool['Usage'] == dmtf.POOL_USAGE_SPARE
         * IBM ArrayPool(IBMTSDS_ArrayPool)
@@ -44,13 +46,12 @@ def cim_pools_of_cim_sys_path(smis_common, cim_sys_path, property_list=None):
     else:
         property_list = merge_list(property_list, ['Primordial', 'Usage'])
 
-    cim_pools = smis_common.Associators(
+    cim_pools = smis_common.IterAssociators(
         cim_sys_path,
         AssocClass='CIM_HostedStoragePool',
         ResultClass='CIM_StoragePool',
         PropertyList=property_list)
 
-    rc = []
     for cim_pool in cim_pools:
         if 'Primordial' in cim_pool and cim_pool['Primordial']:
             continue
@@ -77,9 +78,7 @@ def cim_pools_of_cim_sys_path(smis_common, cim_sys_path, property_list=None):
         if cim_pool.classname == 'IBMTSDS_ArrayPool' or \
            cim_pool.classname == 'IBMTSDS_ArraySitePool':
             continue
-        rc.append(cim_pool)
-
-    return rc
+        yield cim_pool
 
 
 def cim_pool_id_pros():
@@ -252,17 +251,23 @@ def lsm_pool_to_cim_pool_path(smis_common, lsm_pool):
 def pool_id_of_cim_vol(smis_common, cim_vol_path):
     """
     Find out the lsm.Pool.id of CIM_StorageVolume
+    The answer is cached for the session, volumes() caches those of all
+    volumes.
     """
-    property_list = cim_pool_id_pros()
-    cim_pools = smis_common.Associators(
-        cim_vol_path,
-        AssocClass='CIM_AllocatedFromStoragePool',
-        ResultClass='CIM_StoragePool',
-        PropertyList=property_list)
-    if len(cim_pools) != 1:
-        raise LsmError(
-            ErrorNumber.PLUGIN_BUG,
-            "pool_id_of_cim_vol(): Got unexpected count(%d) of cim_pool " %
-            len(cim_pools) +
-            "associated to cim_vol: %s, %s" % (cim_vol_path, cim_pools))
-    return pool_id_of_cim_pool(cim_pools[0])
+    def _fetch():
+        property_list = cim_pool_id_pros()
+        cim_pools = smis_common.Associators(
+            cim_vol_path,
+            AssocClass='CIM_AllocatedFromStoragePool',
+            ResultClass='CIM_StoragePool',
+            PropertyList=property_list)
+        if len(cim_pools) != 1:
+            raise LsmError(
+                ErrorNumber.PLUGIN_BUG,
+                "pool_id_of_cim_vol(): Got unexpected count(%d) of "
+                "cim_pool " % len(cim_pools) +
+                "associated to cim_vol: %s, %s" % (cim_vol_path, cim_pools))
+        return pool_id_of_cim_pool(cim_pools[0])
+
+    return smis_common.cache_get(
+        SmisCommon.CACHE_VOL_POOL, cim_path_key(cim_vol_path), _fetch)
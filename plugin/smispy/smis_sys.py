@@ -16,6 +16,7 @@
 
 from lsm import System, LsmError, ErrorNumber
 from lsm.plugin.smispy.utils import merge_list
+from lsm.plugin.smispy.smis_common import SmisCommon
 from lsm.plugin.smispy import dmtf
 
 
@@ -48,6 +49,25 @@ def sys_id_of_cim_vol(cim_vol):
             (list(cim_vol.items()), cim_vol.path))
 
 
+def _root_cim_sys(smis_common, property_list):
+    if smis_common.is_megaraid():
+        cim_syss = smis_common.EnumerateInstances(
+            'CIM_ComputerSystem', PropertyList=property_list)
+    else:
+        cim_syss = smis_common.Associators(
+            smis_common.root_blk_cim_rp.path,
+            ResultClass='CIM_ComputerSystem',
+            AssocClass='CIM_ElementConformsToProfile',
+            PropertyList=property_list)
+
+        if len(cim_syss) == 0:
+            raise LsmError(ErrorNumber.NO_SUPPORT,
+                           "Current SMI-S provider does not provide "
+                           "the root CIM_ComputerSystem associated "
+                           "to 'Array' CIM_RegisteredProfile.")
+    return cim_syss
+
+
 def root_cim_sys(smis_common, property_list=None):
     """
     Use this association to find out the root CIM_ComputerSystem:
@@ -63,21 +83,14 @@ def root_cim_sys(smis_common, property_list=None):
     else:
         property_list = merge_list(property_list, id_pros)
 
-    if smis_common.is_megaraid():
-        cim_syss = smis_common.EnumerateInstances(
-            'CIM_ComputerSystem', PropertyList=property_list)
+    # The systems themselves do not change, only properties like
+    # OperationalStatus do. Cache them when nothing else is wanted.
+    if set(property_list) == set(id_pros):
+        cim_syss = smis_common.cache_get(
+            SmisCommon.CACHE_ROOT_SYSTEMS, None,
+            lambda: _root_cim_sys(smis_common, property_list))
     else:
-        cim_syss = smis_common.Associators(
-            smis_common.root_blk_cim_rp.path,
-            ResultClass='CIM_ComputerSystem',
-            AssocClass='CIM_ElementConformsToProfile',
-            PropertyList=property_list)
-
-        if len(cim_syss) == 0:
-            raise LsmError(ErrorNumber.NO_SUPPORT,
-                           "Current SMI-S provider does not provide "
-                           "the root CIM_ComputerSystem associated "
-                           "to 'Array' CIM_RegisteredProfile.")
+        cim_syss = _root_cim_sys(smis_common, property_list)
 
     # System URI Filtering
     if smis_common.system_list:
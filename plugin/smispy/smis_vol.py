@@ -24,8 +24,9 @@
 
 from lsm import md5, Volume, LsmError, ErrorNumber
 from lsm.plugin.smispy.utils import (
-    merge_list, cim_path_to_path_str, path_str_to_cim_path)
+    merge_list, cim_path_to_path_str, path_str_to_cim_path, cim_path_key)
 from lsm.plugin.smispy import dmtf
+from lsm.plugin.smispy.smis_common import SmisCommon, EnumBatchUnusable
 
 
 def cim_vol_id_pros():
@@ -73,25 +74,96 @@ def cim_vol_of_cim_pool_path(smis_common, cim_pool_path, property_list=None):
         CIM_StorageVolume
     CIM_StorageVolume['Usage'] == dmtf.VOL_USAGE_SYS_RESERVED will be filtered
     out.
-    Return a list of CIM_StorageVolume.
+    Return a generator of CIM_StorageVolume.
     """
     if property_list is None:
         property_list = ['Usage']
     else:
         property_list = merge_list(property_list, ['Usage'])
 
-    cim_vols = smis_common.Associators(
+    cim_vols = smis_common.IterAssociators(
         cim_pool_path,
         AssocClass='CIM_AllocatedFromStoragePool',
         ResultClass='CIM_StorageVolume',
         PropertyList=property_list)
 
-    needed_cim_vols = []
-    for cim_vol in cim_vols:
-        if 'Usage' not in cim_vol or \
-           cim_vol['Usage'] != dmtf.VOL_USAGE_SYS_RESERVED:
-            needed_cim_vols.append(cim_vol)
-    return needed_cim_vols
+    return (cim_vol for cim_vol in cim_vols if _cim_vol_is_needed(cim_vol))
+
+
+def _cim_vol_is_needed(cim_vol):
+    return 'Usage' not in cim_vol or \
+        cim_vol['Usage'] != dmtf.VOL_USAGE_SYS_RESERVED
+
+
+def _cim_vols_of_cim_pools_batch(smis_common, cim_pools, property_list):
+    """
+    Two enumerations whatever the number of pools:
+        EnumerateInstanceNames('CIM_AllocatedFromStoragePool')
+        EnumerateInstances('CIM_StorageVolume')
+    The association names hold the pool path('Antecedent') and the volume
+    path('Dependent'), the volumes are joined to the pools by the keys of
+    these paths as they are received.
+    Raise EnumBatchUnusable when none of the associations is of cim_pools.
+    """
+    cim_pool_of_key = dict(
+        (cim_path_key(cim_pool.path), cim_pool) for cim_pool in cim_pools)
+
+    pool_key_of_vol_key = {}
+    for cim_afsp_path in smis_common.IterEnumerateInstanceNames(
+            'CIM_AllocatedFromStoragePool'):
+        pool_key = cim_path_key(cim_afsp_path['Antecedent'])
+        # Dependent could also be a CIM_StoragePool allocated from this
+        # one, it never matches a volume below.
+        if pool_key in cim_pool_of_key:
+            pool_key_of_vol_key[
+                cim_path_key(cim_afsp_path['Dependent'])] = pool_key
+
+    if len(pool_key_of_vol_key) == 0:
+        # Either the pools have no volume or the provider does not list
+        # the associations, only walking them tells.
+        raise EnumBatchUnusable()
+
+    for cim_vol in smis_common.IterEnumerateInstances(
+            'CIM_StorageVolume', PropertyList=property_list):
+        pool_key = pool_key_of_vol_key.get(cim_path_key(cim_vol.path))
+        if pool_key is not None and _cim_vol_is_needed(cim_vol):
+            yield cim_vol, cim_pool_of_key[pool_key]
+
+
+def cim_vols_of_cim_pools(smis_common, cim_pools, property_list=None):
+    """
+    Return a generator of (cim_vol, cim_pool) for the CIM_StorageVolume
+    allocated from each of cim_pools, a list of CIM_StoragePool.
+    Using SmisCommon.ENUM_VOLUME strategy of smis_common.enum_by_strategy():
+        SmisCommon.ENUM_WALK
+            cim_vol_of_cim_pool_path() for each pool, one request per pool.
+        SmisCommon.ENUM_BATCH
+            Two enumerations whatever the number of pools, for providers
+            with hundreds of pools.  Walks when no volume is found in the
+            associations.
+    CIM_StorageVolume['Usage'] == dmtf.VOL_USAGE_SYS_RESERVED will be filtered
+    out.
+    """
+    if property_list is None:
+        property_list = ['Usage']
+    else:
+        property_list = merge_list(property_list, ['Usage'])
+
+    if len(cim_pools) == 0:
+        return iter([])
+
+    def _batch():
+        return _cim_vols_of_cim_pools_batch(
+            smis_common, cim_pools, property_list)
+
+    def _walk():
+        for cim_pool in cim_pools:
+            for cim_vol in cim_vol_of_cim_pool_path(
+                    smis_common, cim_pool.path, property_list):
+                yield cim_vol, cim_pool
+
+    return smis_common.enum_by_strategy(
+        SmisCommon.ENUM_VOLUME, _batch, _walk)
 
 
 def _vpd83_in_cim_vol_name(cim_vol):
@@ -106,3 +106,19 @@ def path_str_to_cim_path(path_str):
     """
     path_dict = json.loads(path_str)
     return pywbem.CIMInstanceName(**path_dict)
+
+
+def cim_path_key(cim_path):
+    """
+    Return a hashable key of a CIMInstanceName built from its keybindings
+    only, so paths of the same instance returned by different requests
+    match whatever host, namespace or class name they carry.
+    Args:
+        cim_path: CIM path
+    """
+    key = []
+    for name, value in cim_path.keybindings.items():
+        if isinstance(value, pywbem.CIMInstanceName):
+            value = cim_path_key(value)
+        key.append((name.lower(), value))
+    return tuple(sorted(key))
@@ -27,6 +27,9 @@
     INetworkAttachedStorage, INfs
 
 from lsm._client import Client
-from lsm._pluginrunner import PluginRunner, search_property
+from lsm._cache import CachedClient
+from lsm._pool import ClientPool
+from lsm._pluginrunner import PluginRunner, search_property, \
+    search_properties
 
 __all__ = []
@@ -0,0 +1,296 @@
+# Copyright (C) 2026 Red Hat, Inc.
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; If not, see <http://www.gnu.org/licenses/>.
+
+import copy
+import functools
+import json
+import threading
+import time
+import unittest
+
+from lsm._common import LsmError, ErrorNumber, JobStatus
+from lsm._data import DataEncoder as _DataEncoder
+from lsm._data import System, Pool
+from lsm._client import Client, _RpcRecorder, _RpcRecorded
+
+_now = getattr(time, 'monotonic', time.time)
+
+
+class CachedClient(object):
+    """
+    Wraps an lsm.Client and keeps the results of read only calls for a
+    while, so that tools asking for the same systems, pools or capabilities
+    over and over don't go to the plug-in (and the array) every time:
+
+        c = lsm.CachedClient(lsm.Client(uri), ttls={'volumes': 10})
+
+    ttls maps method names out of CACHEABLE to the number of seconds to keep
+    their results, it is merged over DEFAULT_TTLS and a ttl of 0 turns
+    caching of that method off.  Results are cached per method and
+    arguments, every call returns a copy of its own.
+
+    Every call which is not known to leave the array alone (volume_create,
+    volume_mask, access_group_*, fs_* and so on) drops the whole cache once
+    it succeeds, as does job_status() or job_wait() reporting a finished
+    job.  The cache can also be dropped with cache_invalidate().  Hit and
+    miss counts are returned by cache_stats().
+
+    Everything else is passed through to the wrapped client.
+    """
+
+    DEFAULT_TTLS = {
+        'systems': 60,
+        'pools': 30,
+        'capabilities': 300,
+        'target_ports': 300,
+        'volume_raid_create_cap_get': 300,
+        'plugin_info': 300,
+    }
+
+    # Calls which don't change anything on the array, the ones which can
+    # have a ttl.
+    CACHEABLE = frozenset([
+        'capabilities', 'plugin_info', 'systems', 'pools', 'pools_page',
+        'volumes', 'volumes_page', 'disks', 'disks_page', 'access_groups',
+        'access_groups_page', 'volumes_accessible_by_access_group',
+        'access_groups_granted_to_volume', 'volume_child_dependency',
+        'volume_replicate_range_block_size', 'fs', 'fs_snapshots',
+        'fs_child_dependency', 'export_auth', 'exports', 'target_ports',
+        'volume_raid_info', 'pool_member_info', 'volume_raid_create_cap_get',
+        'batteries', 'volume_cache_info'])
+
+    # Calls which don't change anything on the array but are never cached.
+    PASS_THROUGH = frozenset([
+        'time_out_set', 'time_out_get', 'job_free', 'available_plugins',
+        'plugin_stats', 'close', 'pools_iter', 'volumes_iter', 'disks_iter',
+        'access_groups_iter'])
+
+    def __init__(self, client, ttls=None):
+        self._client = client
+        self._ttls = dict(CachedClient.DEFAULT_TTLS)
+        if ttls:
+            for (method, ttl) in ttls.items():
+                if method not in CachedClient.CACHEABLE:
+                    raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                                   "Method '%s' can not be cached" % method)
+                self._ttls[method] = ttl
+
+        self._lock = threading.Lock()
+        self._cache = {}        # (method, args key) -> (expiry, result)
+        self._hits = {}
+        self._misses = {}
+        self._invalidations = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name.startswith('_') or not callable(attr) or \
+                name in CachedClient.PASS_THROUGH:
+            return attr
+        if name in CachedClient.CACHEABLE:
+            if self._ttls.get(name, 0) > 0:
+                return functools.partial(self._cached_call, name)
+            return attr
+        if name in ('job_status', 'job_wait'):
+            return functools.partial(self._job_status, name)
+        return functools.partial(self._mutating_call, name)
+
+    @staticmethod
+    def _key(method, args, kwargs):
+        """
+        Returns the cache key for a call, made from the arguments as they
+        would be sent to the plug-in so that equal lsm objects and positional
+        or keyword arguments give the same key.
+        """
+        try:
+            Client.__dict__[method](_RpcRecorder(), *args, **kwargs)
+        except _RpcRecorded as rec:
+            return method, json.dumps(rec.params, cls=_DataEncoder,
+                                      sort_keys=True)
+        raise LsmError(ErrorNumber.PLUGIN_BUG,
+                       "Method '%s' did not issue a request" % method)
+
+    def _cached_call(self, method, *args, **kwargs):
+        key = CachedClient._key(method, args, kwargs)
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > _now():
+                self._hits[method] = self._hits.get(method, 0) + 1
+                return copy.deepcopy(entry[1])
+            self._misses[method] = self._misses.get(method, 0) + 1
+            generation = self._invalidations
+
+        result = getattr(self._client, method)(*args, **kwargs)
+
+        with self._lock:
+            # Don't keep a result which may predate an invalidation
+            if generation == self._invalidations:
+                self._cache[key] = (_now() + self._ttls[method], result)
+        return copy.deepcopy(result)
+
+    def _mutating_call(self, method, *args, **kwargs):
+        result = getattr(self._client, method)(*args, **kwargs)
+        self.cache_invalidate()
+        return result
+
+    def _job_status(self, method, *args, **kwargs):
+        result = getattr(self._client, method)(*args, **kwargs)
+        if result[0] != JobStatus.INPROGRESS:
+            self.cache_invalidate()
+        return result
+
+    def cache_invalidate(self, method=None):
+        """
+        Drops the cached results of method, or of all methods when method is
+        None.
+        """
+        with self._lock:
+            self._invalidations += 1
+            if method is None:
+                self._cache.clear()
+            else:
+                for key in [k for k in self._cache.keys() if k[0] == method]:
+                    del self._cache[key]
+
+    def cache_stats(self):
+        """
+        Returns a dict with the 'hits' and 'misses' of each cached method,
+        their totals and the number of 'invalidations'.
+        """
+        with self._lock:
+            methods = {}
+            for method in set(self._hits.keys()) | set(self._misses.keys()):
+                methods[method] = {'hits': self._hits.get(method, 0),
+                                   'misses': self._misses.get(method, 0)}
+            return {'hits': sum(self._hits.values()),
+                    'misses': sum(self._misses.values()),
+                    'invalidations': self._invalidations,
+                    'methods': methods}
+
+
+class _FakeClient(object):
+    """
+    Counts the calls made to it, in place of a Client connected to a plug-in.
+    """
+    def __init__(self):
+        self.calls = []
+        self.job_done = False
+
+    def systems(self, flags=0):
+        self.calls.append('systems')
+        return [System('sim-01', 'system', System.STATUS_OK, '')]
+
+    def pools(self, search_key=None, search_value=None, flags=0):
+        self.calls.append('pools')
+        return [Pool('POOL_ID_1', 'pool', Pool.ELEMENT_TYPE_VOLUME, 0,
+                     2 ** 40, 2 ** 39, Pool.STATUS_OK, '', 'sim-01')]
+
+    def capabilities(self, system, flags=0):
+        self.calls.append('capabilities')
+        return system.id
+
+    def volume_delete(self, volume, flags=0):
+        self.calls.append('volume_delete')
+        return 'JOB_1'
+
+    def job_status(self, job_id, flags=0):
+        self.calls.append('job_status')
+        if self.job_done:
+            return JobStatus.COMPLETE, 100, None
+        return JobStatus.INPROGRESS, 50, None
+
+    def job_wait(self, job_id, timeout_ms=None, flags=0):
+        self.calls.append('job_wait')
+        self.job_done = True
+        return JobStatus.COMPLETE, 100, None
+
+    def time_out_get(self, flags=0):
+        self.calls.append('time_out_get')
+        return 30000
+
+
+class TestCachedClient(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = _FakeClient()
+        self.c = CachedClient(self.fake)
+
+    def test_hits(self):
+        self.assertEqual(self.c.systems()[0].id, 'sim-01')
+        self.assertEqual(self.c.systems()[0].id, 'sim-01')
+        self.c.pools()
+        self.c.pools(search_key='id', search_value='POOL_ID_1')
+        self.c.pools(None, None, 0)
+        self.assertEqual(self.fake.calls, ['systems', 'pools', 'pools'])
+
+        stats = self.c.cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 3))
+        self.assertEqual(stats['methods']['systems'],
+                         {'hits': 1, 'misses': 1})
+
+    def test_equal_args(self):
+        s1 = System('sim-01', 'system', System.STATUS_OK, '')
+        s2 = System('sim-01', 'system', System.STATUS_OK, '')
+        self.assertEqual(self.c.capabilities(s1), 'sim-01')
+        self.assertEqual(self.c.capabilities(system=s2), 'sim-01')
+        self.assertEqual(self.fake.calls, ['capabilities'])
+
+    def test_ttl(self):
+        c = CachedClient(self.fake, ttls={'systems': 0, 'pools': 0.05})
+        c.systems()
+        c.systems()
+        c.pools()
+        c.pools()
+        time.sleep(0.1)
+        c.pools()
+        self.assertEqual(self.fake.calls,
+                         ['systems', 'systems', 'pools', 'pools'])
+        self.assertRaises(LsmError, CachedClient, self.fake,
+                          {'volume_delete': 10})
+
+    def test_invalidate(self):
+        self.c.pools()
+        self.c.time_out_get()
+        self.c.pools()
+        self.c.volume_delete(None)
+        self.c.pools()
+        self.c.cache_invalidate('systems')
+        self.c.pools()
+        self.c.cache_invalidate()
+        self.c.pools()
+        self.assertEqual(self.fake.calls,
+                         ['pools', 'time_out_get', 'volume_delete', 'pools',
+                          'pools'])
+
+    def test_job_done(self):
+        self.c.pools()
+        self.c.job_status('JOB_1')
+        self.c.pools()
+        self.fake.job_done = True
+        self.c.job_status('JOB_1')
+        self.c.pools()
+        self.assertEqual(self.fake.calls.count('pools'), 2)
+        self.c.job_wait('JOB_1')
+        self.c.pools()
+        self.assertEqual(self.fake.calls.count('pools'), 3)
+
+    def test_copy(self):
+        self.c.pools().append(None)
+        self.assertEqual(len(self.c.pools()), 1)
+        self.c.pools()[0]._name = 'changed'
+        self.assertEqual(self.c.pools()[0].name, 'pool')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,6 +15,7 @@
 # Author: tasleson
 import os
 import sys
+import inspect
 from lsm import (Volume, NfsExport, Capabilities, Pool, System, Battery,
                  Disk, AccessGroup, FileSystem, FsSnapshot,
                  uri_parse, LsmError, ErrorNumber,
@@ -22,6 +23,7 @@
 
 from lsm._common import return_requires as _return_requires
 from lsm._common import UDS_PATH as _UDS_PATH
+from lsm._common import job_wait_poll as _job_wait_poll
 from lsm._transport import TransPort as _TransPort
 from lsm._data import IData as _IData
 
@@ -47,6 +49,22 @@ def _check_search_key(search_key, supported_keys):
     return
 
 
+def _check_filters(filters, supported_keys):
+    if filters is None:
+        return
+    if not isinstance(filters, dict):
+        raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                       "Invalid filters, should be a dict")
+    for search_key in filters.keys():
+        _check_search_key(search_key, supported_keys)
+
+
+def _check_page_size(page_size):
+    if not isinstance(page_size, six.integer_types) or page_size < 1:
+        raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                       "Invalid page_size, should be a positive integer")
+
+
 # Descriptive exception about daemon not running.
 def _raise_no_daemon():
     raise LsmError(ErrorNumber.DAEMON_NOT_RUNNING,
@@ -54,6 +72,28 @@ def _raise_no_daemon():
                    "name lsmd), please start service")
 
 
+class _RpcRecorded(Exception):
+    """
+    Raised by _RpcRecorder in place of doing the rpc.
+    """
+    def __init__(self, method, params):
+        Exception.__init__(self)
+        self.method = method
+        self.params = params
+
+
+class _RpcRecorder(object):
+    """
+    Stands in for the Client so that a Client method can be run for its
+    argument checking and marshalling without sending anything.
+    """
+    def __init__(self):
+        self._tp = self
+
+    def rpc(self, method, args):
+        raise _RpcRecorded(method, args)
+
+
 # Main client class for library.
 # ** IMPORTANT **
 # Theory of operation for methods in this class.
@@ -73,6 +113,11 @@ class Client(INetworkAttachedStorage):
     FLAG_VOLUME_CREATE_DISABLE_SYSTEM_CACHE = 1 << 2
     FLAG_VOLUME_CREATE_DISABLE_IO_PASSTHROUGH = 1 << 3
 
+    #
+    # Used for default page size of the *_page() and *_iter() methods
+    #
+    PAGE_SIZE_DEFAULT = 1000
+
     """
     Client side class used for managing storage that utilises RPC mechanism.
     """
@@ -90,9 +135,12 @@ def plugin_register(self, uri, plain_text_password, timeout_ms, flags=0):
     # @returns None
     def __start(self, uri, password, timeout, flags=0):
         """
-        Instruct the plug-in to get ready
+        Instruct the plug-in to get ready, and agree on the transport options
+        to use with it.
         """
-        self._tp.rpc('plugin_register', _del_self(locals()))
+        args = _del_self(locals())
+        args[_TransPort.OPTIONS_KEY] = self._tp.options_offer()
+        self._tp.options_set(self._tp.rpc('plugin_register', args))
 
     # Checks to see if any unix domain sockets exist in the base directory
     # and opens a socket to one to see if the server is actually there.
@@ -184,6 +232,130 @@ def close(self, flags=FLAG_RSVD):
         self._tp.close()
         self._tp = None
 
+    # Issues a number of calls without waiting for each reply in between.
+    # @param    self    The this pointer
+    # @param    calls   List of (method name, dict of arguments) tuples
+    # @returns  List of results, in the same order as calls
+    def pipeline(self, calls):
+        """
+        Sends all the calls to the plug-in back to back and then collects the
+        replies, which are matched to the calls by message id.  This saves a
+        round trip per call, eg. for refreshing a full inventory:
+
+            vols, pools, disks = client.pipeline(
+                [('volumes', {}), ('pools', {}), ('disks', {})])
+
+        Each call is a tuple of a Client method name and a dict of the keyword
+        arguments for it.  The arguments are checked the same way as when
+        calling the method directly.
+
+        Returns a list with the result of each call.  If any of the calls
+        failed, the LsmError of the first failed call is raised after all the
+        replies have been read.
+        """
+        requests = []
+
+        for (method, args) in calls:
+            func = Client.__dict__.get(method)
+            if method in ('plugin_register', 'plugin_unregister', 'close',
+                          'pipeline') or method.startswith('_') or \
+                    method.endswith('_iter') or method.endswith('_many') or \
+                    not inspect.isfunction(func):
+                raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                               "Method '%s' can not be pipelined" % method)
+            try:
+                func(_RpcRecorder(), **args)
+            except _RpcRecorded as rec:
+                requests.append((rec.method, rec.params))
+                continue
+            except TypeError as te:
+                raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                               "Invalid arguments for '%s': %s" %
+                               (method, str(te)))
+            raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                           "Method '%s' can not be pipelined" % method)
+
+        return self._tp.rpc_many(requests)
+
+    # Does a batch call, or each of its calls one by one
+    # @param    self        The this pointer
+    # @param    method      Name of the batch method, eg. 'volume_mask_many'
+    # @param    params      Arguments of the batch method
+    # @param    items       The items of the batch
+    # @param    func        Calls the single item method for an item
+    # @returns  List of the result or LsmError of each item
+    def _many(self, method, params, items, func):
+        """
+        Behind the *_many() methods.  The plug-in replies with a [result,
+        error] pair per item, which we turn into the result or an LsmError.
+
+        Plug-ins which know nothing about the batch method (eg. the C
+        plug-ins) answer NO_SUPPORT, in which case the items are done one
+        request at a time.
+        """
+        try:
+            pairs = self._tp.rpc(method, params)
+        except LsmError as lsm_err:
+            if lsm_err.code != ErrorNumber.NO_SUPPORT:
+                raise
+        else:
+            return [result if error is None else LsmError(*error)
+                    for (result, error) in pairs]
+
+        rc = []
+        for item in items:
+            try:
+                rc.append(func(item))
+            except LsmError as lsm_err:
+                rc.append(lsm_err)
+        return rc
+
+    # Walks a listing one page at a time.
+    # @param    self        The this pointer
+    # @param    name        Name of the list method, eg. 'volumes'
+    # @param    filters     Dict of search key and value pairs
+    # @param    page_size   Maximum number of objects per page
+    # @param    flags       Flags passed to the list method
+    # @returns  Generator of the listed objects
+    def _list_iter(self, name, filters, page_size, flags):
+        """
+        Generator behind the *_iter() methods.  Requests one page at a time
+        from the plug-in with <name>_page, passing back the cursor of the
+        previous page until the plug-in says there is no more.
+
+        Plug-ins which do not know about paging (eg. the C plug-ins) answer
+        the first page with NO_SUPPORT, in which case we fall back to the
+        plain listing and do the filtering on this side.
+        """
+        page_method = getattr(self, name + '_page')
+        cursor = None
+
+        while True:
+            try:
+                lsm_objs, cursor = page_method(
+                    filters, page_size, cursor, flags)
+            except LsmError as lsm_err:
+                if lsm_err.code != ErrorNumber.NO_SUPPORT or \
+                        cursor is not None:
+                    raise
+                break
+
+            for lsm_obj in lsm_objs:
+                yield lsm_obj
+
+            if cursor is None:
+                return
+
+        search_key = None
+        search_value = None
+        if filters and len(filters) == 1:
+            search_key, search_value = list(filters.items())[0]
+
+        for lsm_obj in getattr(self, name)(search_key, search_value, flags):
+            if not filters or \
+                    all(getattr(lsm_obj, k) == v for k, v in filters.items()):
+                yield lsm_obj
+
     # Retrieves all the available plug-ins
     # @param    field_sep   Field separator
     # @param    flags:      Reserved for future use
@@ -256,6 +428,35 @@ def job_status(self, job_id, flags=FLAG_RSVD):
         """
         return self._tp.rpc('job_status', _del_self(locals()))
 
+    # Waits for the specified job to finish.
+    # @param    self        The this pointer
+    # @param    job_id      The job identifier
+    # @param    timeout_ms  Longest time to wait in ms, None for the time-out
+    #                       of the plug-in
+    # @param    flags       Reserved for future use, must be zero.
+    # @returns A tuple ( status (enumeration), percent_complete,
+    # completed item)
+    @_return_requires(int, int, _IData)
+    def job_wait(self, job_id, timeout_ms=None, flags=FLAG_RSVD):
+        """
+        Waits until the given job is no longer in progress, or timeout_ms
+        have passed, and returns its status like job_status() does.  The job
+        still has to be freed with job_free().
+
+        The plug-in does the waiting, so there are no job_status() calls
+        going back and forth meanwhile.  Plug-ins which can't wait on a job
+        answer NO_SUPPORT, job_status() is polled from here for those.
+        """
+        try:
+            return self._tp.rpc('job_wait', _del_self(locals()))
+        except LsmError as lsm_err:
+            if lsm_err.code != ErrorNumber.NO_SUPPORT:
+                raise
+
+        if timeout_ms is None:
+            timeout_ms = self._timeout
+        return _job_wait_poll(self.job_status, job_id, timeout_ms, flags)
+
     # Frees the resources for the specified job id.
     # @param    self    The this pointer
     # @param    job_id  Job id in which to release resource for
@@ -294,6 +495,34 @@ def plugin_info(self, flags=FLAG_RSVD):
         """
         return self._tp.rpc('plugin_info', _del_self(locals()))
 
+    # Gets the request statistics of the plug-in
+    # @param    self    The this pointer
+    # @param    flags   Reserved for future use, must be zero.
+    # @returns  Dict of method name to a dict of its statistics
+    @_return_requires(dict)
+    def plugin_stats(self, flags=FLAG_RSVD):
+        """
+        Returns what the plug-in has measured of the requests it served,
+        when it was registered with plugin_stats=yes in the URI or started
+        with LSM_PLUGIN_STATS in its environment.  For each method:
+
+            count, errors       Calls, and those which failed
+            p50_ms, p95_ms,     Latency percentiles over the most recent
+            p99_ms              calls, in the plug-in process
+            decode_ms,          Mean time spent parsing the request,
+            execute_ms,         running it and encoding and sending the
+            encode_ms           reply
+            reply_bytes,        Mean and largest reply size
+            reply_bytes_max
+
+        Plug-ins may add numbers of their own under other names, which are
+        there whether or not the above are enabled.
+
+        Raises LsmError with NO_SUPPORT when statistics are not enabled or
+        the plug-in doesn't keep any.
+        """
+        return self._tp.rpc('plugin_stats', _del_self(locals()))
+
     # Returns an array of pool objects.
     # @param    self            The this pointer
     # @param    search_key      Search key
@@ -309,6 +538,49 @@ def pools(self, search_key=None, search_value=None, flags=FLAG_RSVD):
         _check_search_key(search_key, Pool.SUPPORTED_SEARCH_KEYS)
         return self._tp.rpc('pools', _del_self(locals()))
 
+    # Returns one page of pool objects.
+    # @param    self            The this pointer
+    # @param    filters         Dict of search key and value pairs, objects
+    #                           must match all of them
+    # @param    page_size       Maximum number of objects to return
+    # @param    cursor          None for the first page, else the cursor
+    #                           returned with the previous page
+    # @param    flags           Reserved for future use, must be zero.
+    # @returns  A tuple (list of pool objects, cursor of next page), the
+    #           cursor is None on the last page.
+    @_return_requires([Pool], six.string_types[0])
+    def pools_page(self, filters=None, page_size=PAGE_SIZE_DEFAULT,
+                   cursor=None, flags=FLAG_RSVD):
+        """
+        Returns one page of pool objects and the cursor for the next
+        page
+        """
+        _check_filters(filters, Pool.SUPPORTED_SEARCH_KEYS)
+        _check_page_size(page_size)
+        return self._tp.rpc('pools_page', _del_self(locals()))
+
+    # Iterates over pool objects, a page at a time.
+    # @param    self            The this pointer
+    # @param    filters         Dict of search key and value pairs, objects
+    #                           must match all of them
+    # @param    page_size       Number of objects to request at a time
+    # @param    flags           Reserved for future use, must be zero.
+    # @returns  Generator of pool objects.
+    def pools_iter(self, filters=None, page_size=PAGE_SIZE_DEFAULT,
+                   flags=FLAG_RSVD):
+        """
+        Generator version of pools(), eg.
+
+            for obj in client.pools_iter(filters={'system_id': s.id}):
+                ...
+
+        Only page_size objects are fetched from the plug-in per request, so
+        large arrays can be walked without one huge reply.
+        """
+        _check_filters(filters, Pool.SUPPORTED_SEARCH_KEYS)
+        _check_page_size(page_size)
+        return self._list_iter('pools', filters, page_size, flags)
+
     # Returns an array of system objects.
     # @param    self    The this pointer
     # @param    flags   Reserved for future use, must be zero.
@@ -404,6 +676,49 @@ def volumes(self, search_key=None, search_value=None, flags=FLAG_RSVD):
         _check_search_key(search_key, Volume.SUPPORTED_SEARCH_KEYS)
         return self._tp.rpc('volumes', _del_self(locals()))
 
+    # Returns one page of volume objects.
+    # @param    self            The this pointer
+    # @param    filters         Dict of search key and value pairs, objects
+    #                           must match all of them
+    # @param    page_size       Maximum number of objects to return
+    # @param    cursor          None for the first page, else the cursor
+    #                           returned with the previous page
+    # @param    flags           Reserved for future use, must be zero.
+    # @returns  A tuple (list of volume objects, cursor of next page), the
+    #           cursor is None on the last page.
+    @_return_requires([Volume], six.string_types[0])
+    def volumes_page(self, filters=None, page_size=PAGE_SIZE_DEFAULT,
+                     cursor=None, flags=FLAG_RSVD):
+        """
+        Returns one page of volume objects and the cursor for the next
+        page
+        """
+        _check_filters(filters, Volume.SUPPORTED_SEARCH_KEYS)
+        _check_page_size(page_size)
+        return self._tp.rpc('volumes_page', _del_self(locals()))
+
+    # Iterates over volume objects, a page at a time.
+    # @param    self            The this pointer
+    # @param    filters         Dict of search key and value pairs, objects
+    #                           must match all of them
+    # @param    page_size       Number of objects to request at a time
+    # @param    flags           Reserved for future use, must be zero.
+    # @returns  Generator of volume objects.
+    def volumes_iter(self, filters=None, page_size=PAGE_SIZE_DEFAULT,
+                     flags=FLAG_RSVD):
+        """
+        Generator version of volumes(), eg.
+
+            for obj in client.volumes_iter(filters={'system_id': s.id}):
+                ...
+
+        Only page_size objects are fetched from the plug-in per request, so
+        large arrays can be walked without one huge reply.
+        """
+        _check_filters(filters, Volume.SUPPORTED_SEARCH_KEYS)
+        _check_page_size(page_size)
+        return self._list_iter('volumes', filters, page_size, flags)
+
     # Creates a volume
     # @param    self            The this pointer
     # @param    pool            The pool object to allocate storage from
@@ -425,6 +740,31 @@ def volume_create(self, pool, volume_name, size_bytes, provisioning,
         """
         return self._tp.rpc('volume_create', _del_self(locals()))
 
+    # Creates volumes of the same size and provisioning in one request
+    # @param    self            The this pointer
+    # @param    pool            The pool object to allocate storage from
+    # @param    volume_names    List of the names of the new volumes
+    # @param    size_bytes      Size of each volume in bytes
+    # @param    provisioning    How the volumes are to be provisioned
+    # @param    flags           Reserved for future use, must be zero.
+    # @returns  List with the (job_id, new volume) tuple or the LsmError of
+    #           each name
+    def volume_create_many(self, pool, volume_names, size_bytes,
+                           provisioning, flags=FLAG_RSVD):
+        """
+        Creates a volume for each of volume_names, all in pool and of the
+        same size and provisioning, in a single request.
+
+        Returns a list with an entry per name, in order: the (job_id, new
+        volume) tuple volume_create() would have returned, or the LsmError
+        it would have raised.  A failing name does not stop the others, an
+        unusable pool may fail the whole call though.
+        """
+        return self._many(
+            'volume_create_many', _del_self(locals()), volume_names,
+            lambda name: self.volume_create(pool, name, size_bytes,
+                                            provisioning, flags))
+
     # Re-sizes a volume
     # @param    self    The this pointer
     # @param    volume  The volume object to re-size
@@ -514,6 +854,23 @@ def volume_delete(self, volume, flags=FLAG_RSVD):
         """
         return self._tp.rpc('volume_delete', _del_self(locals()))
 
+    # Deletes volumes in one request
+    # @param    self    The this pointer
+    # @param    volumes List of the volumes to delete
+    # @param    flags   Reserved for future use, must be zero.
+    # @returns  List with the job id, None or LsmError of each volume
+    def volume_delete_many(self, volumes, flags=FLAG_RSVD):
+        """
+        Deletes each of volumes in a single request.
+
+        Returns a list with an entry per volume, in order: what
+        volume_delete() would have returned, or the LsmError it would have
+        raised.
+        """
+        return self._many(
+            'volume_delete_many', _del_self(locals()), volumes,
+            lambda volume: self.volume_delete(volume, flags))
+
     # Makes a volume online and available to the host.
     # @param    self    The this pointer
     # @param    volume  The volume to place online
@@ -559,6 +916,49 @@ def disks(self, search_key=None, search_value=None, flags=FLAG_RSVD):
         _check_search_key(search_key, Disk.SUPPORTED_SEARCH_KEYS)
         return self._tp.rpc('disks', _del_self(locals()))
 
+    # Returns one page of disk objects.
+    # @param    self            The this pointer
+    # @param    filters         Dict of search key and value pairs, objects
+    #                           must match all of them
+    # @param    page_size       Maximum number of objects to return
+    # @param    cursor          None for the first page, else the cursor
+    #                           returned with the previous page
+    # @param    flags           Same as for disks().
+    # @returns  A tuple (list of disk objects, cursor of next page), the
+    #           cursor is None on the last page.
+    @_return_requires([Disk], six.string_types[0])
+    def disks_page(self, filters=None, page_size=PAGE_SIZE_DEFAULT,
+                   cursor=None, flags=FLAG_RSVD):
+        """
+        Returns one page of disk objects and the cursor for the next
+        page
+        """
+        _check_filters(filters, Disk.SUPPORTED_SEARCH_KEYS)
+        _check_page_size(page_size)
+        return self._tp.rpc('disks_page', _del_self(locals()))
+
+    # Iterates over disk objects, a page at a time.
+    # @param    self            The this pointer
+    # @param    filters         Dict of search key and value pairs, objects
+    #                           must match all of them
+    # @param    page_size       Number of objects to request at a time
+    # @param    flags           Same as for disks().
+    # @returns  Generator of disk objects.
+    def disks_iter(self, filters=None, page_size=PAGE_SIZE_DEFAULT,
+                   flags=FLAG_RSVD):
+        """
+        Generator version of disks(), eg.
+
+            for obj in client.disks_iter(filters={'system_id': s.id}):
+                ...
+
+        Only page_size objects are fetched from the plug-in per request, so
+        large arrays can be walked without one huge reply.
+        """
+        _check_filters(filters, Disk.SUPPORTED_SEARCH_KEYS)
+        _check_page_size(page_size)
+        return self._list_iter('disks', filters, page_size, flags)
+
     # Access control for allowing an access group to access a volume
     # @param    self            The this pointer
     # @param    access_group    The access group
@@ -572,6 +972,25 @@ def volume_mask(self, access_group, volume, flags=FLAG_RSVD):
         """
         return self._tp.rpc('volume_mask', _del_self(locals()))
 
+    # Access control for allowing an access group to access volumes
+    # @param    self            The this pointer
+    # @param    access_group    The access group
+    # @param    volumes         List of the volumes to grant access to
+    # @param    flags           Reserved for future use, must be zero.
+    # @returns  List with None or the LsmError of each volume
+    def volume_mask_many(self, access_group, volumes, flags=FLAG_RSVD):
+        """
+        Allows an access group to access each of volumes, in a single
+        request.
+
+        Returns a list with an entry per volume, in order: None, or the
+        LsmError volume_mask() would have raised.  An unusable access group
+        may fail the whole call.
+        """
+        return self._many(
+            'volume_mask_many', _del_self(locals()), volumes,
+            lambda volume: self.volume_mask(access_group, volume, flags))
+
     # Revokes access to a volume to initiators in an access group
     # @param    self            The this pointer
     # @param    access_group    The access group
@@ -600,6 +1019,49 @@ def access_groups(self, search_key=None, search_value=None,
         _check_search_key(search_key, AccessGroup.SUPPORTED_SEARCH_KEYS)
         return self._tp.rpc('access_groups', _del_self(locals()))
 
+    # Returns one page of access group objects.
+    # @param    self            The this pointer
+    # @param    filters         Dict of search key and value pairs, objects
+    #                           must match all of them
+    # @param    page_size       Maximum number of objects to return
+    # @param    cursor          None for the first page, else the cursor
+    #                           returned with the previous page
+    # @param    flags           Reserved for future use, must be zero.
+    # @returns  A tuple (list of access group objects, cursor of next
+    #           page), the cursor is None on the last page.
+    @_return_requires([AccessGroup], six.string_types[0])
+    def access_groups_page(self, filters=None, page_size=PAGE_SIZE_DEFAULT,
+                           cursor=None, flags=FLAG_RSVD):
+        """
+        Returns one page of access group objects and the cursor for the next
+        page
+        """
+        _check_filters(filters, AccessGroup.SUPPORTED_SEARCH_KEYS)
+        _check_page_size(page_size)
+        return self._tp.rpc('access_groups_page', _del_self(locals()))
+
+    # Iterates over access group objects, a page at a time.
+    # @param    self            The this pointer
+    # @param    filters         Dict of search key and value pairs, objects
+    #                           must match all of them
+    # @param    page_size       Number of objects to request at a time
+    # @param    flags           Reserved for future use, must be zero.
+    # @returns  Generator of access group objects.
+    def access_groups_iter(self, filters=None, page_size=PAGE_SIZE_DEFAULT,
+                           flags=FLAG_RSVD):
+        """
+        Generator version of access_groups(), eg.
+
+            for obj in client.access_groups_iter(filters={'system_id': s.id}):
+                ...
+
+        Only page_size objects are fetched from the plug-in per request, so
+        large arrays can be walked without one huge reply.
+        """
+        _check_filters(filters, AccessGroup.SUPPORTED_SEARCH_KEYS)
+        _check_page_size(page_size)
+        return self._list_iter('access_groups', filters, page_size, flags)
+
     # Creates an access a group with the specified initiator in it.
     # @param    self                The this pointer
     # @param    name                The initiator group name
@@ -17,11 +17,13 @@
 import hashlib
 
 import os
+import operator
 import unittest
 import re
 
 import sys
 import syslog
+import time
 
 try:
     # Python 3.8 required change
@@ -32,16 +34,12 @@
 import inspect
 
 try:
-    from urllib.error import (URLError, HTTPError)
     from urllib.parse import urlparse
 except ImportError:
-    from urllib2 import (URLError,
-                         HTTPError)
     from urlparse import urlparse
 import functools
 import traceback
 import six
-import ssl
 import socket
 
 
@@ -54,13 +52,11 @@ def default_property(name, allow_set=True, doc=None):
     """
     attribute_name = '_' + name
 
-    def getter(self):
-        return getattr(self, attribute_name)
-
     def setter(self, value):
         setattr(self, attribute_name, value)
 
-    prop = property(getter, setter if allow_set else None, None, doc)
+    prop = property(operator.attrgetter(attribute_name),
+                    setter if allow_set else None, None, doc)
 
     def decorator(cls):
         setattr(cls, name, prop)
@@ -70,6 +66,14 @@ def decorator(cls):
 
 
 def common_urllib2_error_handler(exp):
+    # Only the plug-ins talking http need these, don't load them for
+    # everybody else.
+    import ssl
+    try:
+        from urllib.error import (URLError, HTTPError)
+    except ImportError:
+        from urllib2 import (URLError,
+                             HTTPError)
 
     if isinstance(exp, HTTPError):
         raise LsmError(ErrorNumber.PLUGIN_AUTH_FAILED, str(exp))
@@ -541,6 +545,21 @@ class JobStatus(object):
     ERROR = 3
 
 
+def job_wait_poll(job_status, job_id, timeout_ms, flags=0, interval=0.25):
+    """
+    Calls job_status(job_id, flags) every interval seconds until the job is
+    no longer in progress or timeout_ms have passed and returns what it
+    returned last.  For job_wait() on top of plug-ins which can only tell
+    the status of a job.
+    """
+    end = time.time() + timeout_ms / 1000.0
+    while True:
+        result = job_status(job_id, flags)
+        if result[0] != JobStatus.INPROGRESS or time.time() >= end:
+            return result
+        time.sleep(max(0, min(interval, end - time.time())))
+
+
 def type_compare(method_name, exp_type, act_val):
     if isinstance(exp_type, Sequence):
         if not isinstance(act_val, Sequence):
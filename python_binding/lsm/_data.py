@@ -20,6 +20,7 @@
 from abc import ABCMeta as _ABCMeta
 import re
 import binascii
+import unittest
 from six import with_metaclass
 
 try:
@@ -27,12 +28,20 @@
 except ImportError:
     import json
 
-from json.decoder import WHITESPACE
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 from lsm._common import get_class, default_property, ErrorNumber, LsmError
 
 import six
 
+# Keys other than strings are only unpacked by msgpack 1.0 when asked to
+_MSGPACK_UNPACK_ARGS = {}
+if msgpack is not None and msgpack.version >= (0, 6, 1):
+    _MSGPACK_UNPACK_ARGS['strict_map_key'] = False
+
 
 class DataEncoder(json.JSONEncoder):
     """
@@ -49,59 +58,150 @@ def default(self, my_class):
 class DataDecoder(json.JSONDecoder):
     """
     Custom json decoder for objects derived from ILsmData
+
+    Objects are built by the parser's object_hook as each json object is
+    completed, so nested objects are already converted when their parent is
+    and the parsed tree is never walked a second time.
     """
 
-    @staticmethod
-    def __process_dict(d):
-        """
-        Processes a dictionary
-        """
-        rc = {}
+    def __init__(self, *args, **kwargs):
+        kwargs['object_hook'] = _data_object_hook
+        json.JSONDecoder.__init__(self, *args, **kwargs)
 
-        if 'class' in d:
-            rc = IData._factory(d)
-        else:
-            for (k, v) in d.items():
-                rc[k] = DataDecoder.__decode(v)
 
-        return rc
+# Populated at the end of the module once all the classes exist.
+# Class name -> class
+_DATA_CLASSES = {}
+# Serialized key -> constructor argument name, eg. 'id' -> '_id'
+_DATA_ARGS = {}
 
-    @staticmethod
-    def __process_list(l):
-        """
-        Processes a list
-        """
-        rc = []
-        for elem, value in enumerate(l):
-            if type(value) is list:
-                rc.append(DataDecoder.__process_list(value))
-            elif type(value) is dict:
-                rc.append(DataDecoder.__process_dict(value))
-            else:
-                rc.append(value)
-        return rc
 
-    @staticmethod
-    def __decode(e):
-        """
-        Decodes the parsed json
-        """
-        if type(e) is dict:
-            return DataDecoder.__process_dict(e)
-        elif type(e) is list:
-            return DataDecoder.__process_list(e)
-        else:
-            return e
+def _data_object_hook(d):
+    """
+    Turns a parsed json object into the IData it represents, other objects
+    are returned as is.
+    """
+    if 'class' not in d:
+        return d
+
+    class_name = d.pop('class')
+    c = _DATA_CLASSES.get(class_name)
+    if c is None:
+        c = get_class(__name__ + '.' + class_name)
+
+    args = {}
+    for k, v in d.items():
+        arg = _DATA_ARGS.get(k)
+        if arg is None:
+            arg = '_' + k
+        args[arg] = v
+    return c(**args)
+
+
+# msgpack extension type code used to tag the class of an IData.  An IData
+# is packed as a list of the tag followed by the values of its fields, which
+# saves repeating the key names in every object.  Both sides have to agree
+# on the fields of every class for that, see msgpack_fields().
+_MSGPACK_EXT_DATA_CLASS = 1
+_MSGPACK_TAGS = {}
+# Class name -> serialized keys of its fields, in packing order
+_MSGPACK_FIELDS = {}
+
+
+def _msgpack_default(obj):
+    if not isinstance(obj, IData):
+        raise TypeError('incorrect class type:' + str(type(obj)))
+
+    tag = _MSGPACK_TAGS.get(obj.__class__)
+    if tag is None:
+        tag = msgpack.ExtType(_MSGPACK_EXT_DATA_CLASS,
+                              obj.__class__.__name__.encode('utf-8'))
+    return [tag] + obj._to_list()
+
+
+def _msgpack_ext_hook(code, data):
+    if code != _MSGPACK_EXT_DATA_CLASS:
+        return msgpack.ExtType(code, data)
+
+    class_name = data.decode('utf-8')
+    c = _DATA_CLASSES.get(class_name)
+    if c is None:
+        c = get_class(__name__ + '.' + class_name)
+    return c
+
+
+def _msgpack_list_hook(l):
+    # Class objects only come out of _msgpack_ext_hook()
+    if l and isinstance(l[0], type):
+        c = l[0]
+        if len(l) - 1 != len(c._FIELDS):
+            raise LsmError(ErrorNumber.TRANSPORT_SERIALIZATION,
+                           "%s packed with %d fields, expected %d" %
+                           (c.__name__, len(l) - 1, len(c._FIELDS)))
+        return c(**dict(zip(c.__slots__, l[1:])))
+    return l
+
+
+def json_key(k):
+    """
+    Returns the string json.dumps() turns dict key k into, k itself when it
+    is not a string, number, bool or None.
+    """
+    if isinstance(k, six.string_types):
+        return k
+    if k is None or isinstance(k, (bool, float) + six.integer_types):
+        return json.dumps(k)
+    return k
 
-    def decode(self, json_string, _w=WHITESPACE.match):
-        return DataDecoder.__decode(json.loads(json_string))
+
+def _msgpack_object_hook(d):
+    # msgpack keeps the type of dict keys, json makes strings of them.  Do
+    # the same so a reply decodes the same whichever codec carried it.
+    for k in d:
+        if not isinstance(k, six.string_types):
+            return dict((json_key(k), v) for (k, v) in d.items())
+    return d
+
+
+def msgpack_fields():
+    """
+    Returns {class name: [serialized keys of its fields]} of the IData
+    classes in the order msgpack packs them, to be compared with the other
+    side's before using msgpack.
+    """
+    return _MSGPACK_FIELDS
+
+
+def msgpack_packer():
+    """
+    Returns a msgpack.Packer which knows how to pack IData objects.
+    """
+    return msgpack.Packer(default=_msgpack_default, use_bin_type=True)
+
+
+def msgpack_loads(data):
+    """
+    Unpacks data packed by msgpack_packer(), IData objects included.
+    """
+    return msgpack.unpackb(data, ext_hook=_msgpack_ext_hook,
+                           list_hook=_msgpack_list_hook,
+                           object_hook=_msgpack_object_hook, raw=False,
+                           **_MSGPACK_UNPACK_ARGS)
 
 
 class IData(with_metaclass(_ABCMeta, object)):
     """
     Base class functionality of serializable
     classes.
+
+    Subclasses keep their state in __slots__, one '_' prefixed slot per
+    constructor argument, which are also the keys they are serialized with.
     """
+    __slots__ = ()
+
+    # Tuple of (slot name, serialized key) filled in for each class at the
+    # end of the module.
+    _FIELDS = ()
 
     def _to_dict(self):
         """
@@ -111,14 +211,22 @@ def _to_dict(self):
 
         # If one of the attributes is another IData we will
         # process that too, is there a better way to handle this?
-        for (k, v) in list(self.__dict__.items()):
+        for (attr, k) in self._FIELDS:
+            v = getattr(self, attr)
             if isinstance(v, IData):
-                rc[k[1:]] = v._to_dict()
+                rc[k] = v._to_dict()
             else:
-                rc[k[1:]] = v
+                rc[k] = v
 
         return rc
 
+    def _to_list(self):
+        """
+        Represent the class as a list of its field values in the order of
+        _FIELDS, used by the msgpack encoding.
+        """
+        return [getattr(self, attr) for (attr, k) in self._FIELDS]
+
     @staticmethod
     def _factory(d):
         """
@@ -126,18 +234,11 @@ def _factory(d):
         This only works for objects that inherit from IData
         """
         if 'class' in d:
-            class_name = d['class']
-            del d['class']
-            c = get_class(__name__ + '.' + class_name)
-
             # If any of the parameters are themselves an IData process them
             for k, v in list(d.items()):
                 if isinstance(v, dict) and 'class' in v:
-                    d['_' + k] = IData._factory(d.pop(k))
-                else:
-                    d['_' + k] = d.pop(k)
-
-            return c(**d)
+                    d[k] = IData._factory(v)
+            return _data_object_hook(d)
 
     def __str__(self):
         """
@@ -158,6 +259,10 @@ class Disk(IData):
     """
     Represents a disk.
     """
+    __slots__ = ('_id', '_name', '_disk_type', '_block_size', '_num_of_blocks',
+                 '_status', '_system_id', '_plugin_data', '_vpd83',
+                 '_location', '_rpm', '_link_type')
+
     SUPPORTED_SEARCH_KEYS = ['id', 'system_id']
 
     # We use '-1' to indicate we failed to get the requested number.
@@ -380,6 +485,9 @@ class Volume(IData):
     """
     Represents a volume.
     """
+    __slots__ = ('_id', '_name', '_vpd83', '_block_size', '_num_of_blocks',
+                 '_admin_state', '_system_id', '_pool_id', '_plugin_data')
+
     SUPPORTED_SEARCH_KEYS = ['id', 'system_id', 'pool_id']
 
     # Replication types
@@ -505,6 +613,9 @@ def vpd83_verify(vpd):
 @default_property('status_info', doc="Detail status information of system")
 @default_property("plugin_data", doc="Private plugin data")
 class System(IData):
+    __slots__ = ('_id', '_name', '_status', '_status_info', '_plugin_data',
+                 '_fw_version', '_mode', '_read_cache_pct')
+
     STATUS_UNKNOWN = 1 << 0
     STATUS_OK = 1 << 1
     STATUS_ERROR = 1 << 2
@@ -601,6 +712,10 @@ class Pool(IData):
     """
     Pool specific information
     """
+    __slots__ = ('_id', '_name', '_element_type', '_unsupported_actions',
+                 '_total_space', '_free_space', '_status', '_status_info',
+                 '_system_id', '_plugin_data')
+
     SUPPORTED_SEARCH_KEYS = ['id', 'system_id']
 
     TOTAL_SPACE_NOT_FOUND = -1
@@ -665,6 +780,9 @@ def __init__(self, _id, _name, _element_type, _unsupported_actions,
 @default_property('system_id', doc="System ID")
 @default_property("plugin_data", doc="Private plugin data")
 class FileSystem(IData):
+    __slots__ = ('_id', '_name', '_total_space', '_free_space', '_pool_id',
+                 '_system_id', '_plugin_data')
+
     SUPPORTED_SEARCH_KEYS = ['id', 'system_id', 'pool_id']
 
     def __init__(self, _id, _name, _total_space, _free_space, _pool_id,
@@ -683,6 +801,7 @@ def __init__(self, _id, _name, _total_space, _free_space, _pool_id,
 @default_property('ts', doc="Time stamp the snapshot was created")
 @default_property("plugin_data", doc="Private plugin data")
 class FsSnapshot(IData):
+    __slots__ = ('_id', '_name', '_ts', '_plugin_data')
 
     def __init__(self, _id, _name, _ts, _plugin_data=None):
         self._id = _id
@@ -703,6 +822,9 @@ def __init__(self, _id, _name, _ts, _plugin_data=None):
 @default_property('options', doc="String containing advanced options")
 @default_property('plugin_data', doc="Plugin private data")
 class NfsExport(IData):
+    __slots__ = ('_id', '_fs_id', '_export_path', '_auth', '_root', '_rw',
+                 '_ro', '_anonuid', '_anongid', '_options', '_plugin_data')
+
     SUPPORTED_SEARCH_KEYS = ['id', 'fs_id']
     ANON_UID_GID_NA = -1
     ANON_UID_GID_ERROR = -2
@@ -729,6 +851,8 @@ def __init__(self, _id, _fs_id, _export_path, _auth, _root, _rw, _ro,
 @default_property('dest_block', doc="Destination logical block address")
 @default_property('block_count', doc="Number of blocks")
 class BlockRange(IData):
+    __slots__ = ('_src_block', '_dest_block', '_block_count')
+
     def __init__(self, _src_block, _dest_block, _block_count):
         self._src_block = _src_block
         self._dest_block = _dest_block
@@ -742,6 +866,9 @@ def __init__(self, _src_block, _dest_block, _block_count):
 @default_property('system_id', doc="System identifier")
 @default_property('plugin_data', doc="Plugin private data")
 class AccessGroup(IData):
+    __slots__ = ('_id', '_name', '_init_ids', '_init_type', '_system_id',
+                 '_plugin_data')
+
     SUPPORTED_SEARCH_KEYS = ['id', 'system_id']
 
     INIT_TYPE_UNKNOWN = 0
@@ -856,6 +983,10 @@ def _wwpn_to_lsm_type(wwpn, raise_error=True):
 @default_property('system_id', doc="System identifier")
 @default_property('plugin_data', doc="Plugin private data")
 class TargetPort(IData):
+    __slots__ = ('_id', '_port_type', '_service_address', '_network_address',
+                 '_physical_address', '_physical_name', '_system_id',
+                 '_plugin_data')
+
     SUPPORTED_SEARCH_KEYS = ['id', 'system_id']
 
     TYPE_OTHER = 1
@@ -898,6 +1029,8 @@ def __init__(self, _id, _port_type, _service_address,
 
 
 class Capabilities(IData):
+    __slots__ = ('_cap',)
+
     UNSUPPORTED = 0
     SUPPORTED = 1
 
@@ -1014,6 +1147,9 @@ def _to_dict(self):
         return {'class': self.__class__.__name__,
                 'cap': ''.join(['%02x' % b for b in self._cap])}
 
+    def _to_list(self):
+        return [''.join(['%02x' % b for b in self._cap])]
+
     def __init__(self, _cap=None):
         if _cap is not None:
             self._cap = bytearray(binascii.unhexlify(_cap))
@@ -1074,6 +1210,9 @@ def enable_all(self):
 @default_property('system_id', doc="System identifier")
 @default_property("plugin_data", doc="Private plugin data")
 class Battery(IData):
+    __slots__ = ('_id', '_name', '_type', '_status', '_system_id',
+                 '_plugin_data')
+
     SUPPORTED_SEARCH_KEYS = ['id', 'system_id']
 
     TYPE_UNKNOWN = 1
@@ -1100,6 +1239,118 @@ def __init__(self, _id, _name, _type, _status, _system_id,
         self._plugin_data = _plugin_data
 
 
+def _data_classes_init():
+    for c in (Disk, Volume, System, Pool, FileSystem, FsSnapshot, NfsExport,
+              BlockRange, AccessGroup, TargetPort, Capabilities, Battery):
+        _DATA_CLASSES[c.__name__] = c
+        c._FIELDS = tuple((attr, attr[1:]) for attr in c.__slots__)
+        for attr in c.__slots__:
+            _DATA_ARGS[attr[1:]] = attr
+        _MSGPACK_FIELDS[c.__name__] = [k for (attr, k) in c._FIELDS]
+        if msgpack is not None:
+            _MSGPACK_TAGS[c] = msgpack.ExtType(
+                _MSGPACK_EXT_DATA_CLASS, c.__name__.encode('utf-8'))
+
+
+_data_classes_init()
+
+
+class TestData(unittest.TestCase):
+
+    @staticmethod
+    def _objs():
+        cap = Capabilities()
+        cap.set(Capabilities.VOLUMES)
+        return [
+            Disk('DISK_ID_1', 'Disk 1', Disk.TYPE_SAS, 512, 2 ** 20,
+                 Disk.STATUS_OK, 'sim-01', _vpd83='5000c500a1b2c3d4',
+                 _location='Port: 1 Box: 1 Bay: 1', _rpm=10000,
+                 _link_type=Disk.LINK_TYPE_SAS),
+            Volume('VOL_ID_1', 'Volume 1', '600508b1001c79ade5178f0626caaa9c',
+                   512, 2 ** 21, Volume.ADMIN_STATE_ENABLED, 'sim-01',
+                   'POOL_ID_1', {'array': 'private'}),
+            System('sim-01', 'LSM simulated storage plug-in', System.STATUS_OK,
+                   '', _fw_version='1.0', _mode=System.MODE_HBA,
+                   _read_cache_pct=50),
+            Pool('POOL_ID_1', 'Pool 1', Pool.ELEMENT_TYPE_VOLUME, 0, 2 ** 40,
+                 2 ** 39, Pool.STATUS_OK, '', 'sim-01'),
+            FileSystem('FS_ID_1', 'fs 1', 2 ** 30, 2 ** 29, 'POOL_ID_1',
+                       'sim-01'),
+            FsSnapshot('SS_ID_1', 'snapshot 1', 1234567890),
+            NfsExport('EXP_ID_1', 'FS_ID_1', '/mnt/fs1', 'sys', ['host1'],
+                      ['host2'], [], NfsExport.ANON_UID_GID_NA,
+                      NfsExport.ANON_UID_GID_NA, ''),
+            BlockRange(0, 100, 50),
+            AccessGroup('AG_ID_1', 'ag 1',
+                        ['iqn.1994-05.com.domain:01.89bd01'],
+                        AccessGroup.INIT_TYPE_ISCSI_IQN, 'sim-01'),
+            TargetPort('TGT_ID_1', TargetPort.TYPE_ISCSI,
+                       'iqn.1986-05.com.example:sim-tgt-03',
+                       'sim-iscsi-tgt-3.example.com:3260', 'a4:4e:31:47:f4:e0',
+                       'iSCSI_c_0_hba0', 'sim-01'),
+            cap,
+            Battery('BAT_ID_1', 'battery 1', Battery.TYPE_CHEMICAL,
+                    Battery.STATUS_OK, 'sim-01')]
+
+    def _round_trip(self, value):
+        return json.loads(json.dumps(value, cls=DataEncoder),
+                          cls=DataDecoder)
+
+    def test_round_trip(self):
+        for o in TestData._objs():
+            rc = self._round_trip(o)
+            self.assertTrue(type(rc) is type(o))
+            self.assertEqual(rc._to_dict(), o._to_dict())
+
+    def test_nested(self):
+        objs = TestData._objs()
+        value = {'id': 1, 'result': [objs, [objs[0], None, 'text'],
+                                     {'key': objs[1], 'n': 2 ** 40}]}
+        rc = self._round_trip(value)
+        self.assertEqual(rc['id'], 1)
+        self.assertEqual([o._to_dict() for o in rc['result'][0]],
+                         [o._to_dict() for o in objs])
+        self.assertEqual(rc['result'][1][0].id, objs[0].id)
+        self.assertEqual(rc['result'][1][1:], [None, 'text'])
+        self.assertTrue(isinstance(rc['result'][2]['key'], Volume))
+        self.assertEqual(rc['result'][2]['n'], 2 ** 40)
+
+    def test_slots(self):
+        for o in TestData._objs():
+            code = type(o).__init__.__code__
+            self.assertEqual(set(type(o).__slots__),
+                             set(code.co_varnames[1:code.co_argcount]))
+            self.assertFalse(hasattr(o, '__dict__'))
+
+    def test_factory(self):
+        for o in TestData._objs():
+            rc = IData._factory(json.loads(json.dumps(o, cls=DataEncoder)))
+            self.assertEqual(rc._to_dict(), o._to_dict())
+
+
+@unittest.skipIf(msgpack is None, 'msgpack is not installed')
+class TestDataMsgpack(TestData):
+
+    def _round_trip(self, value):
+        return msgpack_loads(msgpack_packer().pack(value))
+
+    def test_tuple(self):
+        objs = TestData._objs()
+        self.assertEqual(self._round_trip((None, objs[1]))[1].id, objs[1].id)
+
+    def test_keys(self):
+        value = {1: 'a', 2.5: 'b', None: 'c', False: 'd', 'e': {3: 'f'}}
+        self.assertEqual(self._round_trip(value),
+                         TestData._round_trip(self, value))
+
+    def test_fields_mismatch(self):
+        packed = msgpack.packb(
+            [_MSGPACK_TAGS[BlockRange], 0, 100], use_bin_type=True)
+        with self.assertRaises(LsmError) as cm:
+            msgpack_loads(packed)
+        self.assertEqual(cm.exception.code,
+                         ErrorNumber.TRANSPORT_SERIALIZATION)
+
+
 if __name__ == '__main__':
-    # TODO Need some unit tests that encode/decode all the types with nested
-    pass
+    unittest.main()
@@ -20,6 +20,20 @@
 from six import with_metaclass
 
 
+def _call_each(func, items):
+    """
+    Calls func on each item and returns the [result, error] pair of each,
+    error being the [code, message] of the LsmError func raised, if any.
+    """
+    rc = []
+    for item in items:
+        try:
+            rc.append([func(item), None])
+        except LsmError as lsm_err:
+            rc.append([None, [lsm_err.code, lsm_err.msg]])
+    return rc
+
+
 class IPlugin(with_metaclass(_ABCMeta, object)):
     """
     Plug-in interface that all plug-ins must implement for basic
@@ -147,6 +161,24 @@ def volume_create(self, pool, volume_name, size_bytes, provisioning,
         """
         raise LsmError(ErrorNumber.NO_SUPPORT, "Not supported")
 
+    def volume_create_many(self, pool, volume_names, size_bytes,
+                           provisioning, flags=0):
+        """
+        Creates a volume for each of volume_names, all in the same pool and
+        of the same size and provisioning.
+
+        Returns a list of [result, error] pairs, one per name in order:
+        either what volume_create() returned and None, or None and the
+        [code, message] of the error volume_create() raised.
+
+        This one calls volume_create() for each name, plug-ins which can do
+        them all at once should override it.
+        """
+        return _call_each(
+            lambda name: self.volume_create(pool, name, size_bytes,
+                                            provisioning, flags),
+            volume_names)
+
     def volume_delete(self, volume, flags=0):
         """
         Deletes a volume.
@@ -155,6 +187,17 @@ def volume_delete(self, volume, flags=0):
         """
         raise LsmError(ErrorNumber.NO_SUPPORT, "Not supported")
 
+    def volume_delete_many(self, volumes, flags=0):
+        """
+        Deletes each of volumes.
+
+        Returns a list of [result, error] pairs like volume_create_many(),
+        with what volume_delete() returned as result.  This one calls
+        volume_delete() for each volume.
+        """
+        return _call_each(lambda volume: self.volume_delete(volume, flags),
+                          volumes)
+
     def volume_resize(self, volume, new_size_bytes, flags=0):
         """
         Re-sizes a volume.
@@ -237,6 +280,18 @@ def volume_mask(self, access_group, volume, flags=0):
         """
         raise LsmError(ErrorNumber.NO_SUPPORT, "Not supported")
 
+    def volume_mask_many(self, access_group, volumes, flags=0):
+        """
+        Allows an access group to access each of volumes.
+
+        Returns a list of [result, error] pairs like volume_create_many(),
+        with what volume_mask() returned as result.  This one calls
+        volume_mask() for each volume.
+        """
+        return _call_each(
+            lambda volume: self.volume_mask(access_group, volume, flags),
+            volumes)
+
     def volume_unmask(self, access_group, volume, flags=0):
         """
         Revokes access for an access group for a volume
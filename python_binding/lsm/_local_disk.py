@@ -19,17 +19,12 @@
 
 from lsm import LsmError, ErrorNumber
 
-from lsm._clib import (_local_disk_vpd83_search, _local_disk_vpd83_get,
-                       _local_disk_health_status_get,
-                       _local_disk_rpm_get, _local_disk_list,
-                       _local_disk_link_type_get, _local_disk_ident_led_on,
-                       _local_disk_ident_led_off, _local_disk_fault_led_on,
-                       _local_disk_fault_led_off, _local_disk_serial_num_get,
-                       _local_disk_led_status_get, _local_disk_link_speed_get)
 
-
-def _use_c_lib_function(func_ref, arg):
-    (data, err_no, err_msg) = func_ref(arg)
+def _use_c_lib_function(func_name, arg):
+    # The C extension, and libstoragemgmt with it, is only loaded once a
+    # LocalDisk method is actually used.
+    from lsm import _clib
+    (data, err_no, err_msg) = getattr(_clib, func_name)(arg)
     if err_no != ErrorNumber.OK:
         raise LsmError(err_no, err_msg)
     return data
@@ -64,7 +59,7 @@ def vpd83_search(vpd83):
             N/A
                 No capability required as this is a library level method.
         """
-        return _use_c_lib_function(_local_disk_vpd83_search, vpd83)
+        return _use_c_lib_function('_local_disk_vpd83_search', vpd83)
 
     @staticmethod
     def serial_num_get(disk_path):
@@ -94,7 +89,7 @@ def serial_num_get(disk_path):
             N/A
                 No capability required as this is a library level method.
         """
-        return _use_c_lib_function(_local_disk_serial_num_get, disk_path)
+        return _use_c_lib_function('_local_disk_serial_num_get', disk_path)
 
     @staticmethod
     def vpd83_get(disk_path):
@@ -125,7 +120,7 @@ def vpd83_get(disk_path):
             N/A
                 No capability required as this is a library level method.
         """
-        return _use_c_lib_function(_local_disk_vpd83_get, disk_path)
+        return _use_c_lib_function('_local_disk_vpd83_get', disk_path)
 
     @staticmethod
     def health_status_get(disk_path):
@@ -164,7 +159,7 @@ def health_status_get(disk_path):
             N/A
                 No capability required as this is a library level method.
         """
-        return _use_c_lib_function(_local_disk_health_status_get, disk_path)
+        return _use_c_lib_function('_local_disk_health_status_get', disk_path)
 
     @staticmethod
     def rpm_get(disk_path):
@@ -205,7 +200,7 @@ def rpm_get(disk_path):
             N/A
                 No capability required as this is a library level method.
         """
-        return _use_c_lib_function(_local_disk_rpm_get, disk_path)
+        return _use_c_lib_function('_local_disk_rpm_get', disk_path)
 
     @staticmethod
     def list():
@@ -234,7 +229,8 @@ def list():
             N/A
                 No capability required as this is a library level method.
         """
-        (disk_paths, err_no, err_msg) = _local_disk_list()
+        from lsm import _clib
+        (disk_paths, err_no, err_msg) = _clib._local_disk_list()
         if err_no != ErrorNumber.OK:
             raise LsmError(err_no, err_msg)
         return disk_paths
@@ -296,7 +292,7 @@ def link_type_get(disk_path):
             N/A
                 No capability required as this is a library level method.
         """
-        return _use_c_lib_function(_local_disk_link_type_get, disk_path)
+        return _use_c_lib_function('_local_disk_link_type_get', disk_path)
 
     @staticmethod
     def ident_led_on(disk_path):
@@ -324,7 +320,7 @@ def ident_led_on(disk_path):
             N/A
                 No capability required as this is a library level method.
         """
-        return _use_c_lib_function(_local_disk_ident_led_on, disk_path)
+        return _use_c_lib_function('_local_disk_ident_led_on', disk_path)
 
     @staticmethod
     def ident_led_off(disk_path):
@@ -352,7 +348,7 @@ def ident_led_off(disk_path):
             N/A
                 No capability required as this is a library level method.
         """
-        return _use_c_lib_function(_local_disk_ident_led_off, disk_path)
+        return _use_c_lib_function('_local_disk_ident_led_off', disk_path)
 
     @staticmethod
     def fault_led_on(disk_path):
@@ -380,7 +376,7 @@ def fault_led_on(disk_path):
             N/A
                 No capability required as this is a library level method.
         """
-        return _use_c_lib_function(_local_disk_fault_led_on, disk_path)
+        return _use_c_lib_function('_local_disk_fault_led_on', disk_path)
 
     @staticmethod
     def fault_led_off(disk_path):
@@ -410,7 +406,7 @@ def fault_led_off(disk_path):
             N/A
                 No capability required as this is a library level method.
         """
-        return _use_c_lib_function(_local_disk_fault_led_off, disk_path)
+        return _use_c_lib_function('_local_disk_fault_led_off', disk_path)
 
     @staticmethod
     def led_status_get(disk_path):
@@ -460,7 +456,7 @@ def led_status_get(disk_path):
             N/A
                 No capability required as this is a library level method.
         """
-        return _use_c_lib_function(_local_disk_led_status_get, disk_path)
+        return _use_c_lib_function('_local_disk_led_status_get', disk_path)
 
     @staticmethod
     def link_speed_get(disk_path):
@@ -492,4 +488,4 @@ def link_speed_get(disk_path):
             N/A
                 No capability required as this is a library level method.
         """
-        return _use_c_lib_function(_local_disk_link_speed_get, disk_path)
+        return _use_c_lib_function('_local_disk_link_speed_get', disk_path)
@@ -17,12 +17,21 @@
 import socket
 import traceback
 import sys
-from lsm import LsmError, error, ErrorNumber
-from lsm.lsmcli import cmd_line_wrapper
+import os
+import signal
+import time
+from lsm import LsmError, error, ErrorNumber, JobStatus
 import six
 import errno
+import select
+import threading
+import collections
+import shutil
+import tempfile
+import unittest
+from six.moves import queue
 
-from lsm._common import SocketEOF as _SocketEOF
+from lsm._common import SocketEOF as _SocketEOF, job_wait_poll, uri_parse
 from lsm._transport import TransPort
 
 def search_property(lsm_objs, search_key, search_value):
@@ -36,12 +45,157 @@ def search_property(lsm_objs, search_key, search_value):
                 if getattr(lsm_obj, search_key) == search_value)
 
 
+def search_properties(lsm_objs, filters):
+    """
+    Like search_property(), but keeps the objects which match all the
+    search key and value pairs in the filters dict.
+    """
+    if not filters:
+        return lsm_objs
+    return list(lsm_obj for lsm_obj in lsm_objs
+                if all(getattr(lsm_obj, k) == v for k, v in filters.items()))
+
+
+class _RpcStats(object):
+    """
+    Per method call count, error count, latency percentiles over the last
+    SAMPLES_MAX calls, the mean time spent decoding the request, executing
+    it and encoding the reply, and the mean and largest reply size.  Shared
+    by the worker threads.
+    """
+
+    SAMPLES_MAX = 1000
+
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._methods = {}
+
+    def add(self, method, decode, execute, encode=0, reply_bytes=0,
+            failed=False):
+        """
+        Records one call, times in seconds.  Failed calls have no reply
+        of their own and count towards the latency with what they took.
+        """
+        with self._lock:
+            rec = self._methods.get(method)
+            if rec is None:
+                rec = self._methods[method] = {
+                    'count': 0, 'errors': 0, 'decode': 0.0, 'execute': 0.0,
+                    'encode': 0.0, 'reply_bytes': 0, 'reply_bytes_max': 0,
+                    'latencies': collections.deque(
+                        maxlen=_RpcStats.SAMPLES_MAX)}
+            rec['count'] += 1
+            if failed:
+                rec['errors'] += 1
+            rec['decode'] += decode
+            rec['execute'] += execute
+            rec['encode'] += encode
+            rec['reply_bytes'] += reply_bytes
+            rec['reply_bytes_max'] = max(rec['reply_bytes_max'], reply_bytes)
+            rec['latencies'].append(decode + execute + encode)
+
+    def report(self):
+        """
+        Returns a dict of method name to a dict of its numbers, times in
+        milliseconds.
+        """
+        rc = {}
+        with self._lock:
+            for (method, rec) in self._methods.items():
+                count = rec['count']
+                latencies = sorted(rec['latencies'])
+                stats = {
+                    'count': count,
+                    'errors': rec['errors'],
+                    'decode_ms': rec['decode'] * 1000 / count,
+                    'execute_ms': rec['execute'] * 1000 / count,
+                    'encode_ms': rec['encode'] * 1000 / count,
+                    'reply_bytes': rec['reply_bytes'] // count,
+                    'reply_bytes_max': rec['reply_bytes_max'],
+                }
+                for pct in _RpcStats.PERCENTILES:
+                    # Nearest rank
+                    stats['p%d_ms' % pct] = latencies[
+                        max(0, -(-len(latencies) * pct // 100) - 1)] * 1000
+                rc[method] = stats
+        return rc
+
+
 class PluginRunner(object):
     """
     Plug-in side common code which uses the passed in plugin to do meaningful
     work.
+
+    By default requests are executed one at a time in the order they arrive.
+    When workers > 1 requests are handed to that many threads and replies are
+    sent as they complete, tagged with the id of the request so the client can
+    match them up.  Only plug-ins which are safe to call from multiple threads
+    should ask for this.  The methods in SERIAL_METHODS always wait for the
+    requests in flight to finish and are executed on their own.
+
+    The paged list methods (volumes_page() and friends) can be implemented by
+    the plug-in.  For a plug-in which does not, the full list is fetched once
+    with the plain list method when the first page is asked for and then
+    handed out a page at a time.  Only the most recent PAGED_LISTINGS_MAX
+    such listings are kept around.
+
+    Likewise job_wait() is answered by polling job_status() of the plug-in
+    every JOB_POLL_INTERVAL seconds when the plug-in has no job_wait() of
+    its own.
+
+    Setting LSM_PLUGIN_STATS in the environment of the plug-in, or
+    plugin_stats=yes in the URI it is registered with, makes the runner
+    keep per method statistics of the requests it serves: call and error
+    counts, latency percentiles, where the time went (decoding the request,
+    executing it in the plug-in, encoding and sending the reply) and reply
+    sizes.  The plugin_stats() call returns them, see _RpcStats.report(),
+    along with the numbers of the plug-in's own plugin_stats() if it has
+    one.
+    The numbers are those of the plug-in process answering, which in server
+    mode is one of several.
+
+    Started as '<plug-in> --server <socket path> [<processes> [<max>]]' the
+    runner does not serve a single client handed over by lsmd but listens
+    on the socket path itself, with that many pre-forked processes (1 by
+    default) accepting clients one after the other.  Each process creates
+    the plug-in once and keeps it registered between clients: a client
+    calling plugin_register with the same arguments as the previous one
+    gets the existing session, plugin_unregister only ends the connection.
+    A process serves one client at a time, for as long as the client stays
+    connected.  When they are all busy and a client is waiting, a process
+    is forked for that client alone, up to max processes in all
+    (SERVER_PROCESSES_MAX by default).  Clients beyond that get a
+    PLUGIN_IPC_FAIL error to plugin_register.  Point LSM_UDS_PATH at the
+    directory of the socket, named after the plug-in, to use it.
     """
 
+    SERIAL_METHODS = ['plugin_register', 'plugin_unregister', 'time_out_set']
+
+    PAGED_METHODS = {
+        'pools_page': 'pools',
+        'volumes_page': 'volumes',
+        'disks_page': 'disks',
+        'access_groups_page': 'access_groups',
+    }
+
+    PAGED_LISTINGS_MAX = 8
+
+    JOB_POLL_INTERVAL = 0.1
+
+    SERVER_BACKLOG = 64
+
+    SERVER_PROCESSES_MAX = 32
+
+    # A process forked for a waiting client exits when it hasn't got one
+    # within this many seconds, another process got to it first.
+    SERVER_EXTRA_IDLE = 1
+
+    # Seconds a waiting client is left for a process just done with its
+    # client before another process is forked for it.
+    SERVER_BUSY_GRACE = 0.1
+
     @staticmethod
     def _is_number(val):
         """
@@ -53,8 +207,18 @@ def _is_number(val):
         except ValueError:
             return False
 
-    def __init__(self, plugin, args):
+    def __init__(self, plugin, args, workers=1):
         self.cmdline = False
+        self.workers = workers
+        self._listings = collections.OrderedDict()
+        self._listings_lock = threading.Lock()
+        self._listing_id = 0
+        self.server_path = None
+        self._registered = False
+        self._session_key = None
+        self.stats = None
+        if os.getenv('LSM_PLUGIN_STATS'):
+            self.stats = _RpcStats()
         if len(args) == 2 and PluginRunner._is_number(args[1]):
             try:
                 fd = int(args[1])
@@ -77,17 +241,269 @@ def __init__(self, plugin, args):
                 error('Plug-in exiting.')
                 sys.exit(2)
 
+        elif len(args) in (3, 4, 5) and args[1] == '--server':
+            self.server_path = args[2]
+            for count in args[3:]:
+                if not PluginRunner._is_number(count) or int(count) < 1:
+                    error('Invalid number of server processes: %s' % count)
+                    sys.exit(2)
+            self.server_processes = 1
+            if len(args) >= 4:
+                self.server_processes = int(args[3])
+            self.server_processes_max = max(
+                PluginRunner.SERVER_PROCESSES_MAX, self.server_processes)
+            if len(args) == 5:
+                self.server_processes_max = int(args[4])
+                if self.server_processes_max < self.server_processes:
+                    error('Usage: %s --server <socket path> [<processes> '
+                          '[<max processes>]], max processes less than '
+                          'processes' % args[0])
+                    sys.exit(2)
+            self._plugin_class = plugin
+
         else:
+            # Only pull in lsmcli when run by hand, not for every plug-in
+            # started by lsmd.
+            from lsm.lsmcli import cmd_line_wrapper
             self.cmdline = True
             cmd_line_wrapper(plugin)
 
-    def run(self):
-        # Don't need to invoke this when running stand alone as a cmdline
-        if self.cmdline:
-            return
+    def _execute(self, msg, decode_time=0):
+        """
+        Invokes the plug-in method named in the request and sends the result.
+        decode_time is what parsing the request took, for the statistics.
+        """
+        method = msg['method']
+        params = msg['params']
+        options = None
+
+        # The transport options are for us, not the plug-in
+        if method == 'plugin_register' and params:
+            options = self.tp.options_accept(
+                params.pop(TransPort.OPTIONS_KEY, None))
+            if self.stats is None and \
+                    PluginRunner._stats_wanted(params.get('uri')):
+                self.stats = _RpcStats()
+
+        stats = self.stats
+        if stats is not None:
+            started = time.time()
+
+        try:
+            result = self._dispatch(method, params)
+        except Exception:
+            if stats is not None:
+                stats.add(method, decode_time, time.time() - started,
+                          failed=True)
+            raise
+
+        if stats is not None:
+            executed = time.time()
+
+        if options is not None:
+            # plugin_register has no result of its own, tell the client what
+            # we agreed to and switch over once it has been sent.
+            reply_bytes = self.tp.send_resp(options, msg['id'])
+            self.tp.options_set(options)
+        else:
+            reply_bytes = self.tp.send_resp(result, msg['id'])
+
+        if stats is not None:
+            stats.add(method, decode_time, executed - started,
+                      time.time() - executed, reply_bytes)
+
+    def _dispatch(self, method, params):
+        """
+        Returns the result of the request, from the plug-in or the generic
+        code standing in for it.
+        """
+        # Check to see if this plug-in implements this operation
+        # if not return the expected error.
+        if self.server_path is not None and \
+                method in ('plugin_register', 'plugin_unregister',
+                           'time_out_set'):
+            return self._session_call(method, params or {})
+        elif method == 'plugin_stats':
+            return self._plugin_stats(**(params or {}))
+        elif hasattr(self.plugin, method):
+            if params is None:
+                return getattr(self.plugin, method)()
+            return getattr(self.plugin, method)(**params)
+        elif method in PluginRunner.PAGED_METHODS:
+            return self._page(PluginRunner.PAGED_METHODS[method],
+                              **(params or {}))
+        elif method == 'job_wait':
+            return self._job_wait(**(params or {}))
+        raise LsmError(ErrorNumber.NO_SUPPORT, "Unsupported operation")
+
+    @staticmethod
+    def _stats_wanted(uri):
+        try:
+            return uri_parse(uri)['parameters'].get('plugin_stats') == 'yes'
+        except (LsmError, AttributeError):
+            # The plug-in will complain about a bad URI itself
+            return False
+
+    def _plugin_stats(self, flags=0):
+        own_stats = getattr(self.plugin, 'plugin_stats', None)
+        if self.stats is None and own_stats is None:
+            raise LsmError(ErrorNumber.NO_SUPPORT,
+                           "Plug-in statistics are not enabled, add "
+                           "plugin_stats=yes to the URI or set "
+                           "LSM_PLUGIN_STATS for the plug-in")
+        rc = {}
+        if own_stats is not None:
+            rc.update(own_stats(flags))
+        if self.stats is not None:
+            rc.update(self.stats.report())
+        return rc
+
+    def _session_call(self, method, params):
+        """
+        Server mode handling of the methods which start, end or change the
+        plug-in session, which is kept across clients.
+        """
+        if method == 'plugin_unregister':
+            return None
+
+        if method == 'time_out_set':
+            # The next client has to register again to undo this
+            self._session_key = None
+            return self.plugin.time_out_set(**params)
+
+        session_key = tuple(sorted(params.items()))
+        if self._registered and session_key == self._session_key:
+            return None
+
+        self._session_end()
+        result = self.plugin.plugin_register(**params)
+        self._registered = True
+        self._session_key = session_key
+        return result
+
+    def _session_end(self):
+        if self._registered:
+            self._registered = False
+            self._session_key = None
+            try:
+                self.plugin.plugin_unregister()
+            except Exception:
+                error("Error in plugin_unregister\n" + traceback.format_exc())
+
+    def _job_wait(self, job_id, timeout_ms=None, flags=0):
+        if timeout_ms is None:
+            timeout_ms = self.plugin.time_out_get()
+        return job_wait_poll(self.plugin.job_status, job_id, timeout_ms,
+                             flags, PluginRunner.JOB_POLL_INTERVAL)
+
+    def _page(self, list_method, filters=None, page_size=1000, cursor=None,
+              flags=0):
+        """
+        Generic paging on top of the plain list method of the plug-in.  The
+        cursor handed back is '<listing id>:<offset>'.
+        """
+        if cursor is None:
+            search_key = None
+            search_value = None
+            if filters and len(filters) == 1:
+                search_key, search_value = list(filters.items())[0]
+
+            lsm_objs = search_properties(
+                getattr(self.plugin, list_method)(
+                    search_key=search_key, search_value=search_value,
+                    flags=flags),
+                filters)
+            offset = 0
+
+            with self._listings_lock:
+                self._listing_id += 1
+                listing_id = self._listing_id
+        else:
+            try:
+                listing_id, offset = (int(x) for x in cursor.split(':'))
+            except (AttributeError, ValueError):
+                raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                               "Invalid cursor: '%s'" % cursor)
+
+            with self._listings_lock:
+                lsm_objs = self._listings.pop(listing_id, None)
 
+            if lsm_objs is None:
+                raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                               "Cursor '%s' has expired" % cursor)
+
+        end = offset + page_size
+        if end >= len(lsm_objs):
+            return lsm_objs[offset:], None
+
+        with self._listings_lock:
+            self._listings[listing_id] = lsm_objs
+            while len(self._listings) > PluginRunner.PAGED_LISTINGS_MAX:
+                self._listings.popitem(last=False)
+
+        return lsm_objs[offset:end], '%d:%d' % (listing_id, end)
+
+    def _worker(self, requests):
+        """
+        Worker thread body, executes requests until it gets None.
+        """
+        while True:
+            item = requests.get()
+            try:
+                if item is None:
+                    break
+
+                (msg, decode_time) = item
+                msg_id = msg['id']
+                try:
+                    self._execute(msg, decode_time)
+                except ValueError as ve:
+                    error(traceback.format_exc())
+                    self.tp.send_error(msg_id, -32700, str(ve))
+                except AttributeError as ae:
+                    error(traceback.format_exc())
+                    self.tp.send_error(msg_id, -32601, str(ae))
+                except LsmError as lsm_err:
+                    self.tp.send_error(msg_id, lsm_err.code, lsm_err.msg,
+                                       lsm_err.data)
+                except (socket.error, _SocketEOF):
+                    # Client went away, the main loop will notice.
+                    pass
+                except Exception:
+                    error("Unhandled exception in plug-in!\n" +
+                          traceback.format_exc())
+                    self.tp.send_error(msg_id, ErrorNumber.PLUGIN_BUG,
+                                       "Unhandled exception in plug-in",
+                                       str(traceback.format_exc()))
+            except Exception:
+                error("Unable to send reply!\n" + traceback.format_exc())
+            finally:
+                requests.task_done()
+
+    def _workers_start(self):
+        requests = queue.Queue()
+        for _ in range(self.workers):
+            t = threading.Thread(target=self._worker, args=(requests,))
+            t.daemon = True
+            t.start()
+        return requests
+
+    def _workers_stop(self, requests):
+        for _ in range(self.workers):
+            requests.put(None)
+        requests.join()
+
+    def _serve(self):
+        """
+        Executes the requests of the client on self.tp until it unregisters
+        or goes away.  Returns True when it went away while registered.
+        """
         need_shutdown = False
         msg_id = 0
+        requests = None
+
+        if self.workers > 1:
+            requests = self._workers_start()
 
         try:
             while True:
@@ -95,24 +511,19 @@ def run(self):
                     # result = None
 
                     msg = self.tp.read_req()
+                    decode_time = self.tp.decode_time
 
                     method = msg['method']
                     msg_id = msg['id']
-                    params = msg['params']
 
-                    # Check to see if this plug-in implements this operation
-                    # if not return the expected error.
-                    if hasattr(self.plugin, method):
-                        if params is None:
-                            result = getattr(self.plugin, method)()
-                        else:
-                            result = getattr(self.plugin, method)(
-                                **msg['params'])
-                    else:
-                        raise LsmError(ErrorNumber.NO_SUPPORT,
-                                       "Unsupported operation")
+                    if requests is not None:
+                        if method not in PluginRunner.SERIAL_METHODS:
+                            requests.put((msg, decode_time))
+                            continue
+                        # Let everything in flight finish first
+                        requests.join()
 
-                    self.tp.send_resp(result)
+                    self._execute(msg, decode_time)
 
                     if method == 'plugin_register':
                         need_shutdown = True
@@ -155,7 +566,412 @@ def run(self):
                 pass
 
         finally:
-            if need_shutdown:
-                # Client wasn't nice, we will allow plug-in to cleanup
-                self.plugin.plugin_unregister()
-                sys.exit(2)
+            if requests is not None:
+                self._workers_stop(requests)
+
+        return need_shutdown
+
+    @staticmethod
+    def _select(rlist, timeout):
+        try:
+            return select.select(rlist, [], [], timeout)[0]
+        except select.error as se:
+            if se.args[0] == errno.EINTR:
+                return []
+            raise
+
+    @staticmethod
+    def _server_accept(listener, timeout=None):
+        """
+        Returns the next client connection on the non-blocking listener, or
+        None when none came within timeout seconds.  Several processes wait
+        on the listener, the one which doesn't get the client waits on.
+        """
+        while True:
+            try:
+                (conn, addr) = listener.accept()
+                conn.setblocking(True)
+                return conn
+            except socket.error as se:
+                if se.errno not in (errno.EAGAIN, errno.EWOULDBLOCK,
+                                    errno.EINTR):
+                    raise
+            if timeout is not None and \
+                    not PluginRunner._select([listener], timeout):
+                return None
+            elif timeout is None:
+                PluginRunner._select([listener], None)
+
+    @staticmethod
+    def _server_status(status, busy):
+        """
+        Tells the supervisor that this process got a client or is done with
+        it.
+        """
+        try:
+            os.write(status, ('%d%s\n' % (os.getpid(), '+' if busy else '-'))
+                     .encode('ascii'))
+        except OSError:
+            pass
+
+    def _server_process(self, listener, status, extra):
+        """
+        Body of a server process, serves clients accepted on the listener
+        one at a time until told to terminate.  An extra process serves a
+        single client.
+        """
+        def _terminate(signum, frame):
+            sys.exit(0)
+
+        signal.signal(signal.SIGTERM, _terminate)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        self.plugin = self._plugin_class()
+        try:
+            while True:
+                conn = PluginRunner._server_accept(
+                    listener,
+                    PluginRunner.SERVER_EXTRA_IDLE if extra else None)
+                if conn is None:
+                    break
+
+                PluginRunner._server_status(status, True)
+                self.tp = TransPort(conn)
+                try:
+                    self._serve()
+                finally:
+                    conn.close()
+                    with self._listings_lock:
+                        self._listings.clear()
+                    PluginRunner._server_status(status, False)
+                if extra:
+                    break
+        finally:
+            self._session_end()
+
+    def _server_refuse(self, listener):
+        """
+        Answers the plugin_register of a client waiting while all of
+        server_processes_max processes are busy with an error, instead of
+        leaving it waiting for one of them.
+        """
+        conn = PluginRunner._server_accept(listener, 0)
+        if conn is None:
+            return
+        try:
+            conn.settimeout(PluginRunner.SERVER_EXTRA_IDLE)
+            tp = TransPort(conn)
+            msg = tp.read_req()
+            tp.send_error(msg['id'], ErrorNumber.PLUGIN_IPC_FAIL,
+                          "All %d plug-in server processes are busy" %
+                          self.server_processes_max)
+        except Exception:
+            pass
+        finally:
+            conn.close()
+
+    def _server_run(self):
+        """
+        Listens on server_path and keeps server_processes processes serving
+        it, forking extra ones for clients waiting on busy ones, until
+        terminated.
+        """
+        if os.path.exists(self.server_path):
+            os.unlink(self.server_path)
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.server_path)
+        listener.listen(PluginRunner.SERVER_BACKLOG)
+        # All processes wait on it, only one of them gets a client
+        listener.setblocking(False)
+
+        # The processes write '<pid>+' and '<pid>-' lines to it as they get
+        # a client and are done with it.
+        (status_r, status_w) = os.pipe()
+        status_buf = b''
+
+        children = {}           # pid -> (start time, extra)
+        busy = set()            # pids of children with a client
+
+        def _stop(signum, frame):
+            sys.exit(0)
+
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+
+        def _fork(extra):
+            pid = os.fork()
+            if pid == 0:
+                os.close(status_r)
+                rc = 0
+                try:
+                    self._server_process(listener, status_w, extra)
+                except SystemExit as se:
+                    rc = se.code or 0
+                except Exception:
+                    error("Unhandled exception in plug-in!\n" +
+                          traceback.format_exc())
+                    rc = 2
+                os._exit(rc)
+            children[pid] = (time.time(), extra)
+
+        try:
+            while True:
+                while children:
+                    try:
+                        (pid, status) = os.waitpid(-1, os.WNOHANG)
+                    except OSError as oe:
+                        if oe.errno == errno.EINTR:
+                            continue
+                        raise
+                    if pid == 0:
+                        break
+                    busy.discard(pid)
+                    (started, extra) = children.pop(pid, (None, True))
+                    if not extra and time.time() - started < 1:
+                        # Don't spin when the plug-in can't even start
+                        error('Plug-in server process %d exited with %d '
+                              'right after starting' % (pid, status))
+                        time.sleep(1)
+
+                while len([c for c in children.values() if not c[1]]) < \
+                        self.server_processes:
+                    _fork(False)
+
+                rlist = [status_r]
+                if len(busy) == len(children):
+                    rlist.append(listener)
+                readable = PluginRunner._select(rlist, 1)
+
+                if status_r in readable:
+                    status_buf += os.read(status_r, 4096)
+                    lines = status_buf.split(b'\n')
+                    status_buf = lines.pop()
+                    for line in lines:
+                        pid = int(line[:-1])
+                        if pid not in children:
+                            continue
+                        if line.endswith(b'+'):
+                            busy.add(pid)
+                        else:
+                            busy.discard(pid)
+                    continue
+
+                if listener in readable:
+                    if PluginRunner._select(
+                            [status_r], PluginRunner.SERVER_BUSY_GRACE):
+                        continue
+                    if len(children) < self.server_processes_max:
+                        _fork(True)
+                    else:
+                        self._server_refuse(listener)
+        finally:
+            for pid in children:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except OSError:
+                    pass
+            for pid in children:
+                try:
+                    os.waitpid(pid, 0)
+                except OSError:
+                    pass
+            os.close(status_r)
+            os.close(status_w)
+            listener.close()
+            os.unlink(self.server_path)
+
+    def run(self):
+        # Don't need to invoke this when running stand alone as a cmdline
+        if self.cmdline:
+            return
+
+        if self.server_path is not None:
+            self._server_run()
+            return
+
+        if self._serve():
+            # Client wasn't nice, we will allow plug-in to cleanup
+            self.plugin.plugin_unregister()
+            sys.exit(2)
+
+
+class _ServerPlugin(object):
+    """
+    Counts the sessions it is asked to start and end, has a job which is
+    done on the third look at it.
+    """
+    def __init__(self):
+        self.registers = 0
+        self.unregisters = 0
+        self.job_polls = 0
+
+    def plugin_register(self, uri, password, timeout, flags=0):
+        if 'fail' in uri:
+            raise LsmError(ErrorNumber.PLUGIN_AUTH_FAILED, 'Failed')
+        self.registers += 1
+
+    def plugin_unregister(self, flags=0):
+        self.unregisters += 1
+
+    def time_out_set(self, ms, flags=0):
+        pass
+
+    def time_out_get(self, flags=0):
+        return 30000
+
+    def session_counts(self, flags=0):
+        return [self.registers, self.unregisters, os.getpid()]
+
+    def plugin_stats(self, flags=0):
+        return {'sessions': {'registers': self.registers}}
+
+    def job_status(self, job_id, flags=0):
+        self.job_polls += 1
+        if self.job_polls < 3:
+            return [JobStatus.INPROGRESS, 50, None]
+        return [JobStatus.COMPLETE, 100, None]
+
+
+class TestPluginRunnerServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'test')
+        self.pid = os.fork()
+        if self.pid == 0:
+            rc = 0
+            try:
+                PluginRunner(_ServerPlugin,
+                             ['test', '--server', self.path, '1', '2']).run()
+            except BaseException:
+                rc = 1
+            os._exit(rc)
+
+        for _ in range(100):
+            if os.path.exists(self.path):
+                break
+            time.sleep(0.05)
+
+    def tearDown(self):
+        os.kill(self.pid, signal.SIGTERM)
+        os.waitpid(self.pid, 0)
+        self.assertFalse(os.path.exists(self.path))
+        shutil.rmtree(self.tmpdir)
+
+    def _session(self, uri='test://', unregister=True):
+        tp = TransPort(TransPort.get_socket(self.path))
+        tp.rpc('plugin_register', dict(uri=uri, password=None,
+                                       timeout=30000, flags=0))
+        rc = tp.rpc('session_counts', dict(flags=0))
+        if unregister:
+            tp.rpc('plugin_unregister', dict(flags=0))
+        tp.close()
+        return rc
+
+    def test_warm_session(self):
+        (registers, unregisters, pid) = self._session()
+        self.assertEqual((registers, unregisters), (1, 0))
+        self.assertEqual(self._session(), [1, 0, pid])
+        # Going away without unregistering keeps the session too
+        self.assertEqual(self._session(unregister=False), [1, 0, pid])
+        self.assertEqual(self._session(), [1, 0, pid])
+
+    def test_new_session(self):
+        self._session()
+        self.assertEqual(self._session(uri='test://?other=1')[:2], [2, 1])
+        self.assertEqual(self._session()[:2], [3, 2])
+
+    def test_failed_register(self):
+        self._session()
+        self.assertRaises(LsmError, self._session, uri='test://?fail=1')
+        # The session which failed to start is not ended
+        self.assertEqual(self._session()[:2], [2, 1])
+
+    def test_busy(self):
+        first = self._register('test://')
+        second = self._register('test://')
+        # The second client got a process forked for it
+        self.assertNotEqual(first.rpc('session_counts', dict(flags=0))[2],
+                            second.rpc('session_counts', dict(flags=0))[2])
+        with self.assertRaises(LsmError) as cm:
+            self._register('test://')
+        self.assertEqual(cm.exception.code, ErrorNumber.PLUGIN_IPC_FAIL)
+        first.close()
+        second.close()
+        # The pre-forked process still has the session
+        self.assertEqual(self._session()[:2], [1, 0])
+
+    def test_job_wait(self):
+        tp = TransPort(TransPort.get_socket(self.path))
+        tp.rpc('plugin_register', dict(uri='test://', password=None,
+                                       timeout=30000, flags=0))
+        self.assertEqual(tp.rpc('job_wait', dict(job_id='JOB_1',
+                                                 timeout_ms=10, flags=0)),
+                         [JobStatus.INPROGRESS, 50, None])
+        self.assertEqual(tp.rpc('job_wait', dict(job_id='JOB_1',
+                                                 timeout_ms=None, flags=0)),
+                         [JobStatus.COMPLETE, 100, None])
+        tp.close()
+
+    def _register(self, uri):
+        tp = TransPort(TransPort.get_socket(self.path))
+        tp.rpc('plugin_register', dict(uri=uri, password=None,
+                                       timeout=30000, flags=0))
+        return tp
+
+    def test_plugin_stats(self):
+        tp = self._register('test://')
+        # Only the plug-in's own numbers
+        self.assertEqual(tp.rpc('plugin_stats', dict(flags=0)),
+                         {'sessions': {'registers': 1}})
+        tp.close()
+
+        tp = self._register('test://?plugin_stats=yes')
+        for _ in range(3):
+            tp.rpc('session_counts', dict(flags=0))
+        self.assertRaises(LsmError, tp.rpc, 'no_such_method', dict(flags=0))
+        stats = tp.rpc('plugin_stats', dict(flags=0))
+        tp.close()
+
+        counts = stats['session_counts']
+        self.assertEqual((counts['count'], counts['errors']), (3, 0))
+        self.assertTrue(counts['reply_bytes'] > 0)
+        self.assertTrue(counts['reply_bytes_max'] >= counts['reply_bytes'])
+        self.assertTrue(0 <= counts['p50_ms'] <= counts['p95_ms'] <=
+                        counts['p99_ms'])
+        for key in ('decode_ms', 'execute_ms', 'encode_ms'):
+            self.assertTrue(counts[key] >= 0)
+        self.assertEqual(stats['no_such_method']['errors'], 1)
+        self.assertEqual(stats['plugin_register']['count'], 1)
+        self.assertEqual(stats['sessions'], {'registers': 2})
+
+
+class TestRpcStats(unittest.TestCase):
+
+    def test_percentiles(self):
+        stats = _RpcStats()
+        for i in range(1, 101):
+            stats.add('volumes', 0, i / 1000.0, 0, i)
+        rc = stats.report()['volumes']
+        self.assertEqual(rc['count'], 100)
+        self.assertAlmostEqual(rc['p50_ms'], 50)
+        self.assertAlmostEqual(rc['p95_ms'], 95)
+        self.assertAlmostEqual(rc['p99_ms'], 99)
+        self.assertAlmostEqual(rc['execute_ms'], 50.5)
+        self.assertEqual((rc['reply_bytes'], rc['reply_bytes_max']),
+                         (50, 100))
+
+    def test_window(self):
+        stats = _RpcStats()
+        for i in range(_RpcStats.SAMPLES_MAX):
+            stats.add('pools', 0, 1)
+        stats.add('pools', 0, 0, failed=True)
+        rc = stats.report()['pools']
+        self.assertEqual((rc['count'], rc['errors']),
+                         (_RpcStats.SAMPLES_MAX + 1, 1))
+        self.assertAlmostEqual(rc['p99_ms'], 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,392 @@
+# Copyright (C) 2026 Red Hat, Inc.
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; If not, see <http://www.gnu.org/licenses/>.
+
+import contextlib
+import functools
+import socket
+import threading
+import time
+import unittest
+
+from lsm._common import LsmError, ErrorNumber
+from lsm._common import SocketEOF as _SocketEOF
+from lsm._client import Client
+from lsm._cache import CachedClient
+
+_now = getattr(time, 'monotonic', time.time)
+
+
+class ClientPool(object):
+    """
+    Keeps up to size registered lsm.Client sessions with one URI and hands
+    one out for each call, for applications with many threads talking to
+    the same array:
+
+        pool = lsm.ClientPool(uri, password, size=8)
+        pool.volumes()          # From any thread
+
+    Every session is a plug-in process of its own, so calls made at the
+    same time are executed side by side instead of one after the other in
+    a single plug-in.  Sessions are opened as they are needed, a call
+    waits when all size of them are busy.
+
+    A session found dead, the plug-in having gone away, is closed and
+    replaced by a new one.  Calls which don't change anything on the array
+    (CachedClient.CACHEABLE) are then retried once on the new session, any
+    other call raises the error as it isn't known whether the plug-in got
+    to it.  Sessions idle for more than idle_check seconds are checked with
+    time_out_get() before being handed out again.
+
+    The *_iter() methods keep their session until the iteration ends.  Use
+    client() for several calls which have to go to the same session; the
+    job ids of most plug-ins can be used from any session but plug-ins
+    which keep their jobs in memory need this.  time_out_set() applies to
+    all the sessions.
+    """
+
+    def __init__(self, uri, plain_text_password=None, timeout_ms=30000,
+                 size=4, idle_check=30, flags=0):
+        if size < 1:
+            raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                           "Invalid pool size: %s" % size)
+        self._uri = uri
+        self._password = plain_text_password
+        self._timeout = timeout_ms
+        self._flags = flags
+        self._size = size
+        self._idle_check = idle_check
+
+        self._cond = threading.Condition()
+        self._idle = []         # [client, last used, time-out set on it]
+        self._open = 0          # Sessions, idle and in use
+        self._closed = False
+        self._reconnects = 0
+
+        # A bad URI or password should show up here, not on the first call
+        self._idle.append([self._connect(self._timeout), _now(),
+                           self._timeout])
+        self._open = 1
+
+    def _connect(self, timeout):
+        return Client(self._uri, self._password, timeout, self._flags)
+
+    @staticmethod
+    def _is_dead(err):
+        """
+        Returns True if err means the session can't be used any more.
+        """
+        if isinstance(err, LsmError):
+            return err.code == ErrorNumber.TRANSPORT_COMMUNICATION
+        return isinstance(err, (socket.error, _SocketEOF))
+
+    @staticmethod
+    def _close_quietly(client):
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    def _alive(self, client):
+        try:
+            client.time_out_get()
+        except Exception as e:
+            if ClientPool._is_dead(e):
+                ClientPool._close_quietly(client)
+                return False
+        return True
+
+    def _acquire(self):
+        """
+        Returns a session to use and the time-out set on it, waits for one
+        when all are busy.
+        """
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise LsmError(ErrorNumber.INVALID_ARGUMENT,
+                                   "Client pool is closed")
+                if self._idle:
+                    # The most recently used one, it is least likely dead
+                    entry = self._idle.pop()
+                    break
+                if self._open < self._size:
+                    self._open += 1
+                    entry = None
+                    break
+                self._cond.wait()
+
+        try:
+            if entry is not None:
+                (client, last_used, timeout) = entry
+                if _now() - last_used < self._idle_check or \
+                        self._alive(client):
+                    wanted = self._timeout
+                    if timeout != wanted:
+                        client.time_out_set(wanted)
+                    return client, wanted
+                with self._cond:
+                    self._reconnects += 1
+            timeout = self._timeout
+            return self._connect(timeout), timeout
+        except Exception:
+            if entry is not None:
+                ClientPool._close_quietly(entry[0])
+            self._release(None, None, True)
+            raise
+
+    def _release(self, client, timeout, dead=False):
+        """
+        Hands a session back along with the time-out set on it, a dead one
+        is dropped.
+        """
+        with self._cond:
+            if dead or self._closed:
+                self._open -= 1
+            else:
+                self._idle.append([client, _now(), timeout])
+                client = None
+            self._cond.notify()
+        if client is not None:
+            ClientPool._close_quietly(client)
+
+    def __getattr__(self, name):
+        if name.startswith('_') or not callable(getattr(Client, name, None)):
+            raise AttributeError(
+                "'ClientPool' object has no attribute '%s'" % name)
+        if name.endswith('_iter'):
+            return functools.partial(self._iter_call, name)
+        return functools.partial(self._call, name)
+
+    def _call(self, method, *args, **kwargs):
+        retry = method in CachedClient.CACHEABLE
+        while True:
+            (client, timeout) = self._acquire()
+            try:
+                result = getattr(client, method)(*args, **kwargs)
+            except Exception as e:
+                dead = ClientPool._is_dead(e)
+                self._release(client, timeout, dead)
+                if dead:
+                    with self._cond:
+                        self._reconnects += 1
+                    if retry:
+                        retry = False
+                        continue
+                raise
+            self._release(client, timeout)
+            return result
+
+    def _iter_call(self, method, *args, **kwargs):
+        with self.client() as client:
+            for item in getattr(client, method)(*args, **kwargs):
+                yield item
+
+    @contextlib.contextmanager
+    def client(self):
+        """
+        Hands out a session for the duration of the with block:
+
+            with pool.client() as c:
+                (job, vol) = c.volume_create(...)
+                c.job_wait(job)
+        """
+        (client, timeout) = self._acquire()
+        dead = False
+        try:
+            yield client
+        except Exception as e:
+            dead = ClientPool._is_dead(e)
+            raise
+        finally:
+            self._release(client, timeout, dead)
+
+    def time_out_set(self, ms, flags=Client.FLAG_RSVD):
+        """
+        Sets the time-out of every session, idle ones get it when they are
+        next handed out.
+        """
+        with self._cond:
+            self._timeout = ms
+
+    def time_out_get(self, flags=Client.FLAG_RSVD):
+        return self._timeout
+
+    def pool_stats(self):
+        """
+        Returns a dict with the pool 'size', the number of 'open' and 'idle'
+        sessions and how many dead ones were replaced ('reconnects').
+        """
+        with self._cond:
+            return {'size': self._size, 'open': self._open,
+                    'idle': len(self._idle), 'reconnects': self._reconnects}
+
+    def close(self, flags=Client.FLAG_RSVD):
+        """
+        Closes the idle sessions, the ones in use are closed when the calls
+        on them return.
+        """
+        with self._cond:
+            self._closed = True
+            idle = [entry[0] for entry in self._idle]
+            self._open -= len(idle)
+            del self._idle[:]
+            self._cond.notify_all()
+        for client in idle:
+            ClientPool._close_quietly(client)
+
+    def plugin_unregister(self, flags=Client.FLAG_RSVD):
+        """
+        Synonym for close.
+        """
+        self.close(flags)
+
+
+class _FakeClient(object):
+    """
+    Stands in for a Client connected to a plug-in, counts the calls made
+    to it and can be told to fail like a dead session.
+    """
+    def __init__(self, pool, timeout):
+        self.pool = pool
+        self.dead = False
+        self.closed = False
+        self.timeout = timeout
+
+    def _check(self):
+        if self.dead:
+            raise LsmError(ErrorNumber.TRANSPORT_COMMUNICATION,
+                           "Error while reading a message from the plug-in")
+
+    def systems(self, flags=0):
+        self._check()
+        with self.pool.lock:
+            self.pool.busy += 1
+            self.pool.busy_max = max(self.pool.busy_max, self.pool.busy)
+        time.sleep(0.01)
+        with self.pool.lock:
+            self.pool.busy -= 1
+        return [self]
+
+    def volume_delete(self, volume, flags=0):
+        self._check()
+
+    def volumes_iter(self, filters=None, page_size=1000, flags=0):
+        for i in range(3):
+            yield i
+
+    def time_out_get(self, flags=0):
+        self._check()
+        return self.timeout
+
+    def time_out_set(self, ms, flags=0):
+        self.timeout = ms
+
+    def close(self, flags=0):
+        self.closed = True
+
+
+class _TestPool(ClientPool):
+    def __init__(self, **kwargs):
+        self.lock = threading.Lock()
+        self.busy = 0
+        self.busy_max = 0
+        self.clients = []
+        ClientPool.__init__(self, 'fake://', **kwargs)
+
+    def _connect(self, timeout):
+        client = _FakeClient(self, timeout)
+        self.clients.append(client)
+        return client
+
+
+class TestClientPool(unittest.TestCase):
+
+    def test_threads(self):
+        pool = _TestPool(size=3)
+        threads = [threading.Thread(target=pool.systems) for _ in range(12)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(pool.clients), 3)
+        self.assertEqual(pool.busy_max, 3)
+        self.assertEqual(pool.pool_stats(),
+                         {'size': 3, 'open': 3, 'idle': 3, 'reconnects': 0})
+
+    def test_dead_retried(self):
+        pool = _TestPool(size=2)
+        pool.clients[0].dead = True
+        self.assertEqual(pool.systems(), [pool.clients[1]])
+        self.assertTrue(pool.clients[0].closed)
+        self.assertEqual(pool.pool_stats()['reconnects'], 1)
+        self.assertEqual(pool.pool_stats()['open'], 1)
+
+    def test_dead_not_retried(self):
+        pool = _TestPool(size=2)
+        pool.clients[0].dead = True
+        with self.assertRaises(LsmError) as cm:
+            pool.volume_delete(None)
+        self.assertEqual(cm.exception.code,
+                         ErrorNumber.TRANSPORT_COMMUNICATION)
+        # The next call gets a new session
+        pool.volume_delete(None)
+        self.assertEqual(len(pool.clients), 2)
+
+    def test_idle_check(self):
+        pool = _TestPool(idle_check=0)
+        pool.systems()
+        pool.clients[0].dead = True
+        pool.systems()
+        self.assertEqual(len(pool.clients), 2)
+        self.assertEqual(pool.pool_stats()['reconnects'], 1)
+
+    def test_time_out_set(self):
+        pool = _TestPool()
+        pool.time_out_set(1000)
+        pool.systems()
+        self.assertEqual(pool.clients[0].timeout, 1000)
+        self.assertEqual(pool.time_out_get(), 1000)
+
+    def test_time_out_set_in_use(self):
+        pool = _TestPool(size=1)
+        with pool.client() as c:
+            pool.time_out_set(1000)
+            self.assertEqual(c.timeout, 30000)
+        pool.systems()
+        self.assertEqual(pool.clients[0].timeout, 1000)
+
+    def test_iter(self):
+        pool = _TestPool(size=1)
+        it = pool.volumes_iter()
+        self.assertEqual(next(it), 0)
+        self.assertEqual(pool.pool_stats()['idle'], 0)
+        self.assertEqual(list(it), [1, 2])
+        self.assertEqual(pool.pool_stats()['idle'], 1)
+
+    def test_client(self):
+        pool = _TestPool(size=2)
+        with pool.client() as c:
+            self.assertTrue(c is pool.clients[0])
+            self.assertEqual(pool.systems(), [pool.clients[1]])
+
+    def test_close(self):
+        pool = _TestPool()
+        pool.close()
+        self.assertTrue(pool.clients[0].closed)
+        self.assertRaises(LsmError, pool.systems)
+        self.assertRaises(AttributeError, getattr, pool, 'no_such_method')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,15 +16,24 @@
 
 import json
 import socket
-import string
 import os
 import unittest
 import threading
+import time
+
+import six
 
 from lsm._common import LsmError, ErrorNumber
 from lsm._common import SocketEOF as _SocketEOF
 from lsm._data import DataDecoder as _DataDecoder
 from lsm._data import DataEncoder as _DataEncoder
+from lsm._data import BlockRange
+from lsm._data import msgpack as _msgpack
+from lsm._data import msgpack_packer as _msgpack_packer
+from lsm._data import msgpack_loads as _msgpack_loads
+from lsm._data import msgpack_fields as _msgpack_fields
+from lsm._data import json_key as _json_key
+
 
 class TransPort(object):
     """
@@ -36,33 +45,70 @@ class TransPort(object):
     valid json.
 
     Notes:
-    id field (json-rpc) is present but currently not being used.
-    This is available to be expanded on later.
+    Every request carries its own id (json-rpc) and replies are matched to
+    requests by it, which allows several requests to be in flight on one
+    connection.  Plug-ins which predate this always reply with id
+    LEGACY_MSG_ID and process requests in order, so replies carrying that id
+    are matched to the oldest outstanding request.
+
+    Transport options are negotiated with plugin_register: the client adds
+    the dict from options_offer() to its params under OPTIONS_KEY, the
+    plug-in side answers with what it accepted from it (options_accept()) as
+    the result and both sides then apply that with options_set().  Plug-ins
+    which don't know about it return None, so nothing changes.
+
+    With the 'chunked_replies' option the plug-in sends replies as a number
+    of fragments, each with its own length header, followed by a fragment
+    of length zero.  The reply is encoded and sent a piece at a time, so
+    the plug-in never holds the whole encoded reply in memory.
+
+    The 'codec' option switches the messages after plugin_register from json
+    to msgpack when both sides have it installed and the same fields in
+    every lsm data class, which msgpack packs by position.  The framing is
+    the same, only the message bodies change.
     """
 
     HDR_LEN = 10
 
+    LEGACY_MSG_ID = 100
+    _MSG_ID_MAX = 2 ** 31 - 1
+
+    OPTIONS_KEY = 'transport_options'
+    CHUNK_SIZE = 64 * 1024
+
+    # Supported codecs, most preferred first
+    if _msgpack is not None:
+        CODECS = ['msgpack', 'json']
+    else:
+        CODECS = ['json']
+
     def _read_all(self, l):
         """
         Reads l number of bytes before returning.  Will raise a SocketEOF
         if socket returns zero bytes (i.e. socket no longer connected)
+
+        The returned bytearray is allocated once at its final size and
+        filled in place, so large messages are not copied while they are
+        being received.
         """
 
         if l < 1:
             raise ValueError("Trying to read less than 1 byte!")
 
-        data = bytearray()
-        while len(data) < l:
-            r = self.s.recv(l - len(data))
+        data = bytearray(l)
+        view = memoryview(data)
+        got = 0
+        while got < l:
+            r = self.s.recv_into(view[got:], l - got)
             if not r:
                 raise _SocketEOF()
-            data += r
+            got += r
 
-        return data.decode("utf-8")
+        return data
 
     def _send_msg(self, msg):
         """
-        Sends the json formatted message by pre-appending the length
+        Sends the encoded message by pre-appending the length
         first.
         """
 
@@ -70,18 +116,136 @@ def _send_msg(self, msg):
             raise ValueError("Msg argument empty")
 
         # Note: Don't catch io exceptions at this level!
-        s = str.zfill(str(len(msg)), self.HDR_LEN) + msg
+        s = str.zfill(str(len(msg)), self.HDR_LEN).encode('utf-8') + msg
         # common.Info("SEND: ", msg)
-        self.s.sendall(bytes(s.encode('utf-8')))
+        with self._send_lock:
+            self.s.sendall(s)
+
+    def _dumps(self, obj):
+        """
+        Returns obj encoded with the codec in use.
+        """
+        if self.codec == 'msgpack':
+            return _msgpack_packer().pack(obj)
+        return json.dumps(obj, cls=_DataEncoder).encode('utf-8')
+
+    def _send_fragment(self, data):
+        """
+        Sends one fragment of a chunked message, an empty fragment ends the
+        message.  Must be called with _send_lock held.
+        """
+        self.s.sendall(str.zfill(str(len(data)), self.HDR_LEN).encode('utf-8'))
+        if len(data):
+            self.s.sendall(data)
+
+    @staticmethod
+    def _json_pieces(obj, encoder=None):
+        """
+        Generator which returns the json for obj in pieces, lists and dicts
+        are walked and everything else is encoded on its own.  The joined
+        pieces are the same as json.dumps(obj, cls=DataEncoder) returns.
+        """
+        if encoder is None:
+            encoder = _DataEncoder()
+
+        if isinstance(obj, (list, tuple)):
+            yield '['
+            for i, o in enumerate(obj):
+                if i:
+                    yield ', '
+                if isinstance(o, (list, tuple, dict)):
+                    for piece in TransPort._json_pieces(o, encoder):
+                        yield piece
+                else:
+                    # Saves a generator per element for the usual list of
+                    # lsm data objects.
+                    yield encoder.encode(o)
+            yield ']'
+        elif isinstance(obj, dict):
+            yield '{'
+            for i, (k, v) in enumerate(obj.items()):
+                # Keys are strings in json, json.dumps() converts numbers,
+                # bools and None and refuses anything else.
+                key = _json_key(k)
+                if not isinstance(key, six.string_types):
+                    raise TypeError('keys must be str, int, float, bool or '
+                                    'None, not %s' % type(k).__name__)
+                yield '%s%s: ' % (', ' if i else '', encoder.encode(key))
+                for piece in TransPort._json_pieces(v, encoder):
+                    yield piece
+            yield '}'
+        else:
+            yield encoder.encode(obj)
+
+    @staticmethod
+    def _msgpack_pieces(obj, packer=None):
+        """
+        Same as _json_pieces() but for msgpack, the joined pieces are the same
+        as msgpack_packer().pack(obj) returns.
+        """
+        if packer is None:
+            packer = _msgpack_packer()
+
+        if isinstance(obj, (list, tuple)):
+            yield packer.pack_array_header(len(obj))
+            for o in obj:
+                if isinstance(o, (list, tuple, dict)):
+                    for piece in TransPort._msgpack_pieces(o, packer):
+                        yield piece
+                else:
+                    yield packer.pack(o)
+        elif isinstance(obj, dict):
+            yield packer.pack_map_header(len(obj))
+            for k, v in obj.items():
+                yield packer.pack(k)
+                for piece in TransPort._msgpack_pieces(v, packer):
+                    yield piece
+        else:
+            yield packer.pack(obj)
+
+    def _pieces(self, obj):
+        """
+        Generator which returns obj encoded with the codec in use, in pieces.
+        """
+        if self.codec == 'msgpack':
+            return TransPort._msgpack_pieces(obj)
+        return (piece.encode('utf-8')
+                for piece in TransPort._json_pieces(obj))
+
+    def _send_obj(self, obj):
+        """
+        Encodes and sends obj, in fragments of about CHUNK_SIZE bytes when
+        chunked replies were negotiated.  Returns the size of the encoded
+        obj in bytes.
+        """
+        if not self.chunked_replies:
+            msg = self._dumps(obj)
+            self._send_msg(msg)
+            return len(msg)
+
+        size = 0
+        buf = bytearray()
+        with self._send_lock:
+            for piece in self._pieces(obj):
+                buf += piece
+                if len(buf) >= self.CHUNK_SIZE:
+                    self._send_fragment(buf)
+                    size += len(buf)
+                    del buf[:]
+            if len(buf):
+                self._send_fragment(buf)
+                size += len(buf)
+            self._send_fragment(b'')
+        return size
 
     def _recv_msg(self):
         """
         Reads header first to get the length and then the remaining
-        bytes of the message.
+        bytes of the message.  Returns the undecoded message bytes.
         """
         try:
             l = self._read_all(self.HDR_LEN)
-            msg = self._read_all(int(l))
+            msg = self._read_all(int(bytes(l)))
             # common.Info("RECV: ", msg)
         except socket.error as e:
             raise LsmError(ErrorNumber.TRANSPORT_COMMUNICATION,
@@ -89,8 +253,62 @@ def _recv_msg(self):
                            str(e))
         return msg
 
+    def _recv_chunked_msg(self):
+        """
+        Reads the fragments of a chunked message up to the empty one which
+        ends it.  Returns the undecoded message bytes.
+        """
+        msg = bytearray()
+        try:
+            while True:
+                l = int(bytes(self._read_all(self.HDR_LEN)))
+                if l == 0:
+                    break
+                msg += self._read_all(l)
+        except socket.error as e:
+            raise LsmError(ErrorNumber.TRANSPORT_COMMUNICATION,
+                           "Error while reading a message from the plug-in",
+                           str(e))
+        return msg
+
+    def _recv_obj(self, chunked=False):
+        """
+        Reads a message and returns it parsed.  The receive buffer is released
+        before parsing starts, the json parser works on a string so it would
+        otherwise be held alongside the decoded text and the parsed objects.
+
+        The seconds spent parsing, without the wait for the message, are
+        left in decode_time.
+        """
+        if chunked:
+            data = self._recv_chunked_msg()
+        else:
+            data = self._recv_msg()
+        start = time.time()
+        if self.codec == 'msgpack':
+            rc = _msgpack_loads(data)
+        else:
+            text = data.decode('utf-8')
+            del data
+            rc = json.loads(text, cls=_DataDecoder)
+        self.decode_time = time.time() - start
+        return rc
+
     def __init__(self, socket_descriptor):
         self.s = socket_descriptor
+        # Held while sending, re-entrant as send_req() needs to hold it
+        # across allocating the message id and sending the message.
+        self._send_lock = threading.RLock()
+        # Protects the response demultiplexing state below.
+        self._recv_cond = threading.Condition()
+        self._reader_active = False
+        self._msg_id = 0
+        self._pending = []      # Outstanding message ids, in send order
+        self._replies = {}      # Message id -> reply not yet collected
+        self._broken = False    # A read failed, see _broken_set()
+        self.chunked_replies = False
+        self.codec = 'json'
+        self.decode_time = 0
 
     @staticmethod
     def get_socket(path):
@@ -122,38 +340,203 @@ def close(self):
         """
         self.s.close()
 
+    @staticmethod
+    def options_offer():
+        """
+        Returns the transport options the client would like to use, to be
+        sent with plugin_register.
+        """
+        rc = {'chunked_replies': True, 'codecs': TransPort.CODECS}
+        if _msgpack is not None:
+            rc['msgpack_fields'] = _msgpack_fields()
+        return rc
+
+    @staticmethod
+    def options_accept(offer):
+        """
+        Plug-in side, returns the options out of the offer that are supported
+        or None when nothing was offered.
+        """
+        if not isinstance(offer, dict):
+            return None
+
+        codec = 'json'
+        for c in offer.get('codecs', []):
+            if c == 'msgpack' and \
+                    offer.get('msgpack_fields') != _msgpack_fields():
+                # Objects are packed by field position, which needs the
+                # same fields on both sides.
+                continue
+            if c in TransPort.CODECS:
+                codec = c
+                break
+
+        return {'chunked_replies': offer.get('chunked_replies') is True,
+                'codec': codec}
+
+    def options_set(self, options):
+        """
+        Applies the negotiated transport options, does nothing for None.
+        """
+        if isinstance(options, dict):
+            codec = options.get('codec', 'json')
+            if codec not in TransPort.CODECS:
+                raise LsmError(ErrorNumber.TRANSPORT_INVALID_ARG,
+                               "Unsupported codec '%s'" % codec)
+            self.chunked_replies = options.get('chunked_replies') is True
+            self.codec = codec
+
+    def _msg_id_next(self):
+        """
+        Allocates the id for the next request.  LEGACY_MSG_ID is never handed
+        out so that replies from plug-ins which don't echo it back can't be
+        mistaken for the reply to a specific request.
+        """
+        self._msg_id += 1
+        if self._msg_id > TransPort._MSG_ID_MAX:
+            self._msg_id = 1
+        if self._msg_id == TransPort.LEGACY_MSG_ID:
+            self._msg_id += 1
+        return self._msg_id
+
     def send_req(self, method, args):
         """
-        Sends a request given a method and arguments.
+        Sends a request given a method and arguments, returns the message id
+        to wait on with resp_wait().
         Note: arguments must be in the form that can be automatically
         serialized to json
         """
-        try:
-            msg = {'method': method, 'id': 100, 'params': args}
-            data = json.dumps(msg, cls=_DataEncoder)
-            self._send_msg(data)
-        except socket.error as se:
-            raise LsmError(ErrorNumber.TRANSPORT_COMMUNICATION,
-                           "Error while sending a message to the plug-in",
-                           str(se))
+        with self._send_lock:
+            msg_id = self._msg_id_next()
+            with self._recv_cond:
+                self._broken_check()
+                self._pending.append(msg_id)
+            try:
+                msg = {'method': method, 'id': msg_id, 'params': args}
+                self._send_msg(self._dumps(msg))
+            except Exception as e:
+                with self._recv_cond:
+                    self._pending.remove(msg_id)
+                if isinstance(e, socket.error):
+                    raise LsmError(
+                        ErrorNumber.TRANSPORT_COMMUNICATION,
+                        "Error while sending a message to the plug-in",
+                        str(e))
+                raise
+        return msg_id
 
     def read_req(self):
         """
         Reads a message and returns the parsed version of it.
         """
-        data = self._recv_msg()
-        if len(data):
-            # common.Info(str(data))
-            return json.loads(data, cls=_DataDecoder)
+        return self._recv_obj()
+
+    def _resp_store(self, resp):
+        """
+        Files a reply under the id of the request it answers.  Must be called
+        with _recv_cond held.
+        """
+        msg_id = resp.get('id')
+        if msg_id in self._pending:
+            self._pending.remove(msg_id)
+        elif self._pending:
+            # Legacy plug-in, replies come back in request order.
+            msg_id = self._pending.pop(0)
+        else:
+            raise LsmError(ErrorNumber.TRANSPORT_COMMUNICATION,
+                           "Received reply for unknown request id %s" %
+                           str(msg_id))
+        self._replies[msg_id] = resp
+
+    def _broken_set(self):
+        """
+        After a failed read the connection can't be trusted to be at the start
+        of a message, nor can replies of legacy plug-ins be matched to their
+        requests any more.  Fails the requests waiting for a reply and any
+        sent later.  Must be called with _recv_cond held.
+        """
+        self._broken = True
+        del self._pending[:]
+        self._recv_cond.notify_all()
+
+    def _broken_check(self):
+        if self._broken:
+            raise LsmError(ErrorNumber.TRANSPORT_COMMUNICATION,
+                           "Connection to the plug-in failed on an earlier "
+                           "read")
+
+    def resp_wait(self, msg_id):
+        """
+        Waits for the reply to the request with id msg_id, replies to other
+        requests read in the mean time are kept for their waiters.  Safe to be
+        called from multiple threads at the same time, only one of them reads
+        from the socket at any time.
+        """
+        with self._recv_cond:
+            while msg_id not in self._replies:
+                self._broken_check()
+                if self._reader_active:
+                    self._recv_cond.wait()
+                    continue
+
+                self._reader_active = True
+                self._recv_cond.release()
+                try:
+                    try:
+                        resp = self._recv_obj(self.chunked_replies)
+                    finally:
+                        self._recv_cond.acquire()
+                        self._reader_active = False
+                        self._recv_cond.notify_all()
+                    self._resp_store(resp)
+                except Exception:
+                    self._broken_set()
+                    raise
+
+            resp = self._replies.pop(msg_id)
+
+        return TransPort._resp_result(resp)
+
+    @staticmethod
+    def _resp_result(resp):
+        if 'result' in resp:
+            return resp['result']
+        else:
+            e = resp['error']
+            raise LsmError(**e)
 
     def rpc(self, method, args):
         """
         Sends a request and waits for a response.
         """
-        self.send_req(method, args)
-        (reply, msg_id) = self.read_resp()
-        assert msg_id == 100
-        return reply
+        return self.resp_wait(self.send_req(method, args))
+
+    def rpc_many(self, requests):
+        """
+        Sends all the requests, a list of (method, args) tuples, without
+        waiting for the replies in between and then collects the replies.
+
+        Returns a list of results in request order.  When any of the requests
+        failed, the error of the first failed one is raised once all replies
+        have been read.
+        """
+        msg_ids = [self.send_req(method, args) for (method, args) in requests]
+        rc = []
+        first_error = None
+
+        for msg_id in msg_ids:
+            try:
+                rc.append(self.resp_wait(msg_id))
+            except LsmError as lsm_err:
+                if lsm_err.code == ErrorNumber.TRANSPORT_COMMUNICATION:
+                    raise
+                rc.append(None)
+                if first_error is None:
+                    first_error = lsm_err
+
+        if first_error is not None:
+            raise first_error
+        return rc
 
     def send_error(self, msg_id, error_code, msg, data=None):
         """
@@ -161,31 +544,32 @@ def send_error(self, msg_id, error_code, msg, data=None):
         """
         e = {'id': msg_id, 'error': {'code': error_code, 'message': msg,
                                      'data': data}}
-        self._send_msg(json.dumps(e, cls=_DataEncoder))
+        self._send_obj(e)
 
-    def send_resp(self, result, msg_id=100):
+    def send_resp(self, result, msg_id=LEGACY_MSG_ID):
         """
-        Used to transmit a response
+        Used to transmit a response, returns its size in bytes.
         """
         r = {'id': msg_id, 'result': result}
-        self._send_msg(json.dumps(r, cls=_DataEncoder))
+        return self._send_obj(r)
 
     def read_resp(self):
-        data = self._recv_msg()
-        resp = json.loads(data, cls=_DataDecoder)
-
-        if 'result' in resp:
-            return resp['result'], resp['id']
-        else:
-            e = resp['error']
-            raise LsmError(**e)
+        """
+        Reads the next reply from the wire, returns a tuple (result, msg_id).
+        Does not take part in demultiplexing, use resp_wait() when more than
+        one request may be in flight.
+        """
+        resp = self._recv_obj(self.chunked_replies)
+        return TransPort._resp_result(resp), resp['id']
 
 
-def _server(s):
+def _server(s, options=None, chunk_size=TransPort.CHUNK_SIZE):
     """
     Test echo server for test case.
     """
     srv = TransPort(s)
+    srv.options_set(options)
+    srv.CHUNK_SIZE = chunk_size
 
     msg = srv.read_req()
 
@@ -198,9 +582,33 @@ def _server(s):
                     msg['params']['errorcode'],
                     msg['params']['errormsg'])
             else:
-                srv.send_resp(msg['params'])
+                srv.send_resp(msg['params'], msg['id'])
             msg = srv.read_req()
-        srv.send_resp(msg['params'])
+        srv.send_resp(msg['params'], msg['id'])
+    finally:
+        s.close()
+
+
+def _reorder_server(s, count, legacy):
+    """
+    Test server which reads count requests before replying to any of them.
+    Replies in reverse order, or in order with the legacy fixed id when
+    legacy is True.
+    """
+    srv = TransPort(s)
+
+    try:
+        msgs = [srv.read_req() for _ in range(count)]
+        if legacy:
+            for msg in msgs:
+                srv.send_resp(msg['params'])
+        else:
+            for msg in reversed(msgs):
+                if msg['method'] == 'error':
+                    srv.send_error(msg['id'], msg['params']['errorcode'],
+                                   msg['params']['errormsg'])
+                else:
+                    srv.send_resp(msg['params'], msg['id'])
     finally:
         s.close()
 
@@ -219,11 +627,14 @@ def test_simple(self):
         tc = ['0', ' ', '   ', '{}:""', "Some text message", 'DEADBEEF']
 
         for t in tc:
-            self.client.send_req('test', t)
+            sent_id = self.client.send_req('test', t)
             reply, msg_id = self.client.read_resp()
-            self.assertTrue(msg_id == 100)
+            self.assertTrue(msg_id == sent_id)
             self.assertTrue(reply == t)
 
+        for t in tc:
+            self.assertTrue(self.client.rpc('test', t) == t)
+
     def test_exceptions(self):
 
         e_msg = 'Test error message'
@@ -250,16 +661,21 @@ def test_slow(self):
             msg = {'method': 'drip', 'id': 100, 'params': payload}
             data = json.dumps(msg, cls=_DataEncoder)
 
-            wire = string.zfill(len(data), TransPort.HDR_LEN) + data
+            wire = (str.zfill(str(len(data)), TransPort.HDR_LEN) +
+                    data).encode('utf-8')
 
             self.assertTrue(len(msg) >= 1)
 
-            for i in wire:
-                self.c.send(i)
+            for i in range(len(wire)):
+                self.c.send(wire[i:i + 1])
 
             reply, msg_id = self.client.read_resp()
             self.assertTrue(payload == reply)
 
+    def test_large(self):
+        payload = ["\u00e9x" * 1024] * 4096
+        self.assertTrue(self.client.rpc('large', payload) == payload)
+
     def tearDown(self):
         self.client.send_req("done", None)
         resp, msg_id = self.client.read_resp()
@@ -267,5 +683,205 @@ def tearDown(self):
         self.server.join()
 
 
+class _TestTransportChunked(unittest.TestCase):
+    CODEC = 'json'
+
+    def setUp(self):
+        (self.c, self.s) = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_STREAM)
+
+        self.client = TransPort(self.c)
+        self.server = None
+
+    def _server_start(self, chunk_size=TransPort.CHUNK_SIZE, chunked=True):
+        options = {'chunked_replies': chunked, 'codec': self.CODEC}
+        self.client.options_set(options)
+        self.server = threading.Thread(target=_server,
+                                       args=(self.s, options, chunk_size))
+        self.server.start()
+
+    def test_options(self):
+        self.assertTrue(TransPort.options_accept(None) is None)
+        self.assertTrue(TransPort.options_accept({}) ==
+                        {'chunked_replies': False, 'codec': 'json'})
+        offer = TransPort.options_offer()
+        offer['codecs'] = ['bogus', self.CODEC]
+        options = TransPort.options_accept(offer)
+        self.assertTrue(options == {'chunked_replies': True,
+                                    'codec': self.CODEC})
+        # msgpack only with the same fields on both sides
+        offer['msgpack_fields'] = {'Volume': ['id']}
+        self.assertTrue(TransPort.options_accept(offer)['codec'] == 'json')
+        self.assertRaises(LsmError, self.client.options_set,
+                          {'codec': 'bogus'})
+
+    def test_pieces(self):
+        tc = [None, 1, "\u00e9x", [], {}, [1, [2, [3]], {'a': [4, None]}],
+              {'id': 1, 'result': [{'x': 'y'}, 5, ['z']]}, (1, 'a'),
+              [BlockRange(0, 100, 50), {'r': BlockRange(1, 2, 3)}],
+              {1: 'a', None: [{2.5: True}], False: 'b'}]
+
+        self.client.options_set({'codec': self.CODEC})
+        for t in tc:
+            self.assertTrue(b''.join(self.client._pieces(t)) ==
+                            self.client._dumps(t))
+
+    def test_objects(self):
+        self._server_start(chunk_size=100)
+        ranges = [BlockRange(i, i + 1, 2 ** 40) for i in range(50)]
+        rc = self.client.rpc('test', [None, ranges])
+        self.assertTrue(rc[0] is None)
+        self.assertTrue([r.src_block for r in rc[1]] == list(range(50)))
+        self.assertTrue(rc[1][-1].block_count == 2 ** 40)
+
+    def test_keys(self):
+        self._server_start(chunk_size=10)
+        # Whatever the codec and chunking, keys come back as json makes them
+        self.assertTrue(self.client.rpc('test', {1: 'a', None: {2.5: 'b'}}) ==
+                        {'1': 'a', 'null': {'2.5': 'b'}})
+
+    def test_large(self):
+        self._server_start()
+        payload = ["\u00e9x" * 1024] * 4096
+        self.assertTrue(self.client.rpc('large', payload) == payload)
+
+    def test_small_chunks(self):
+        self._server_start(chunk_size=7)
+        tc = ['', 'x', ['a' * 20, {'b': 'c' * 13}], list(range(100))]
+
+        for t in tc:
+            self.assertTrue(self.client.rpc('test', t) == t)
+
+        try:
+            self.client.rpc('error', {'errorcode': 100, 'errormsg': 'E' * 30})
+            self.fail('Expected LsmError')
+        except LsmError as e:
+            self.assertTrue(e.code == 100 and e.msg == 'E' * 30)
+
+    def test_unchunked(self):
+        self._server_start(chunked=False)
+        payload = ["\u00e9x" * 1024] * 64
+        self.assertTrue(self.client.rpc('large', payload) == payload)
+
+    def tearDown(self):
+        if self.server is not None:
+            self.client.send_req("done", None)
+            resp, msg_id = self.client.read_resp()
+            self.assertTrue(resp is None)
+            self.server.join()
+        self.c.close()
+
+
+@unittest.skipIf(_msgpack is None, 'msgpack is not installed')
+class _TestTransportMsgpack(_TestTransportChunked):
+    CODEC = 'msgpack'
+
+
+class _TestTransportMux(unittest.TestCase):
+    def setUp(self):
+        (self.c, self.s) = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_STREAM)
+
+        self.client = TransPort(self.c)
+        self.server = None
+
+    def _server_start(self, count, legacy=False):
+        self.server = threading.Thread(target=_reorder_server,
+                                       args=(self.s, count, legacy))
+        self.server.start()
+
+    def test_out_of_order(self):
+        tc = ['volumes', 'pools', 'disks', 'access_groups']
+        self._server_start(len(tc))
+
+        msg_ids = [self.client.send_req('test', t) for t in tc]
+        self.assertTrue(len(set(msg_ids)) == len(tc))
+        self.assertTrue(TransPort.LEGACY_MSG_ID not in msg_ids)
+
+        for msg_id, t in zip(msg_ids, tc):
+            self.assertTrue(self.client.resp_wait(msg_id) == t)
+
+    def test_rpc_many(self):
+        tc = [('test', str(i)) for i in range(32)]
+        self._server_start(len(tc))
+        self.assertTrue(self.client.rpc_many(tc) == [t for _, t in tc])
+
+    def test_rpc_many_error(self):
+        tc = [('test', 'a'),
+              ('error', {'errorcode': 100, 'errormsg': 'Failed'}),
+              ('test', 'b')]
+        self._server_start(len(tc))
+
+        try:
+            self.client.rpc_many(tc)
+            self.fail('Expected LsmError')
+        except LsmError as e:
+            self.assertTrue(e.code == 100)
+        self.assertTrue(len(self.client._replies) == 0)
+
+    def test_legacy_ids(self):
+        tc = [str(i) for i in range(8)]
+        self._server_start(len(tc), legacy=True)
+
+        msg_ids = [self.client.send_req('test', t) for t in tc]
+        for msg_id, t in zip(msg_ids, tc):
+            self.assertTrue(self.client.resp_wait(msg_id) == t)
+
+    def test_threads(self):
+        tc = [str(i) for i in range(16)]
+        results = {}
+        self._server_start(len(tc))
+
+        def _call(t):
+            results[t] = self.client.rpc('test', t)
+
+        threads = [threading.Thread(target=_call, args=(t,)) for t in tc]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for t in tc:
+            self.assertTrue(results[t] == t)
+
+    def test_broken(self):
+        tc = [str(i) for i in range(4)]
+        errors = []
+
+        def _server():
+            srv = TransPort(self.s)
+            for _ in tc:
+                srv.read_req()
+            # Half a message, then the connection goes away
+            self.s.sendall(b'0000000100{"id"')
+            self.s.close()
+
+        def _call(t):
+            try:
+                self.client.rpc('test', t)
+            except (LsmError, _SocketEOF) as e:
+                errors.append(e)
+
+        self.server = threading.Thread(target=_server)
+        self.server.start()
+        threads = [threading.Thread(target=_call, args=(t,)) for t in tc]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertTrue(len(errors) == len(tc))
+        self.assertTrue(self.client._pending == [])
+        with self.assertRaises(LsmError) as cm:
+            self.client.send_req('test', 'late')
+        self.assertTrue(cm.exception.code ==
+                        ErrorNumber.TRANSPORT_COMMUNICATION)
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.join()
+        self.c.close()
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,557 @@
+# Copyright (C) 2026 Red Hat, Inc.
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; If not, see <http://www.gnu.org/licenses/>.
+
+"""
+asyncio version of lsm.Client, python 3.7 or later only.
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import os
+import shutil
+import signal
+import tempfile
+import time
+import unittest
+
+from lsm._common import LsmError, ErrorNumber, JobStatus, uri_parse
+from lsm._data import (Volume, Pool, Disk, AccessGroup, System,
+                       DataDecoder as _DataDecoder,
+                       msgpack_loads as _msgpack_loads)
+from lsm._client import (Client, _RpcRecorder, _RpcRecorded,
+                         _check_filters, _check_page_size, _raise_no_daemon)
+from lsm._transport import TransPort
+from lsm._pluginrunner import PluginRunner
+
+
+class _AsyncTransPort(TransPort):
+    """
+    Client side TransPort on asyncio streams, for use from a single event
+    loop.  Any number of tasks can have a request in flight, replies are
+    matched up by message id as TransPort.resp_wait() does.  Replies are
+    only read while somebody waits for one, so options negotiated with
+    plugin_register are in effect before the next reply is read.
+    """
+
+    def __init__(self, reader, writer):
+        TransPort.__init__(self, None)
+        self._reader = reader
+        self._writer = writer
+        self._drain_lock = asyncio.Lock()
+        self._reading = None        # Task reading the next reply
+        self._abandoned = set()     # Ids of requests nobody waits for
+
+    def _loads(self, data):
+        if self.codec == 'msgpack':
+            return _msgpack_loads(data)
+        return json.loads(data.decode('utf-8'), cls=_DataDecoder)
+
+    async def send_req(self, method, args):
+        msg_id = self._msg_id_next()
+        msg = self._dumps({'method': method, 'id': msg_id, 'params': args})
+        self._pending.append(msg_id)
+        self._writer.write(
+            str.zfill(str(len(msg)), self.HDR_LEN).encode('utf-8') + msg)
+        try:
+            async with self._drain_lock:
+                await self._writer.drain()
+        except OSError as e:
+            self._pending.remove(msg_id)
+            raise LsmError(ErrorNumber.TRANSPORT_COMMUNICATION,
+                           "Error while sending a message to the plug-in",
+                           str(e))
+        return msg_id
+
+    async def _recv_msg(self):
+        try:
+            if not self.chunked_replies:
+                l = int(await self._reader.readexactly(self.HDR_LEN))
+                return await self._reader.readexactly(l)
+
+            msg = bytearray()
+            while True:
+                l = int(await self._reader.readexactly(self.HDR_LEN))
+                if l == 0:
+                    return msg
+                msg += await self._reader.readexactly(l)
+        except (asyncio.IncompleteReadError, OSError) as e:
+            raise LsmError(ErrorNumber.TRANSPORT_COMMUNICATION,
+                           "Error while reading a message from the plug-in",
+                           str(e))
+
+    async def _recv_one(self):
+        try:
+            self._resp_store(self._loads(await self._recv_msg()))
+            for msg_id in self._abandoned & set(self._replies):
+                self._abandoned.remove(msg_id)
+                del self._replies[msg_id]
+        finally:
+            self._reading = None
+
+    async def resp_wait(self, msg_id):
+        try:
+            while msg_id not in self._replies:
+                if self._reading is None:
+                    self._reading = asyncio.ensure_future(self._recv_one())
+                # A cancelled waiter must not stop the read half way
+                await asyncio.shield(self._reading)
+        except asyncio.CancelledError:
+            if self._replies.pop(msg_id, None) is None:
+                self._abandoned.add(msg_id)
+            raise
+        return TransPort._resp_result(self._replies.pop(msg_id))
+
+    async def rpc(self, method, args):
+        return await self.resp_wait(await self.send_req(method, args))
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+class _RpcReplay(object):
+    """
+    Stands in for the Client when a Client method is run again after the
+    request it makes has been answered: rpc() hands out the reply, and
+    rpc_many() returns the requests of pipeline() instead of sending them.
+    """
+    def __init__(self, reply=None):
+        self._tp = self
+        self._reply = reply
+
+    def rpc(self, method, args):
+        return self._reply
+
+    @staticmethod
+    def rpc_many(requests):
+        return requests
+
+
+class AsyncClient(object):
+    """
+    Talks to a plug-in through lsmd like lsm.Client, with every method a
+    coroutine, so one event loop can keep requests going to many arrays at
+    once:
+
+        clients = await asyncio.gather(
+            *(AsyncClient.connect(uri, password) for uri in uris))
+        inventories = await asyncio.gather(
+            *(c.volumes() for c in clients))
+
+    The methods, their arguments and what they return or raise are those
+    of lsm.Client.  Requests of several tasks can be in flight on one
+    client at the same time.  The *_iter() methods return asynchronous
+    iterators:
+
+        async for vol in client.volumes_iter():
+            ...
+
+    Create with connect(), end with close() or use it as an asynchronous
+    context manager.
+    """
+
+    FLAG_RSVD = Client.FLAG_RSVD
+
+    # Seconds between job_status() calls when the plug-in can't wait on a
+    # job itself
+    JOB_POLL_INTERVAL = 0.25
+
+    def __init__(self, tp, timeout_ms):
+        self._tp = tp
+        self._timeout = timeout_ms
+
+    @classmethod
+    async def connect(cls, uri, plain_text_password=None, timeout_ms=30000,
+                      flags=FLAG_RSVD):
+        """
+        Connects to the plug-in of the uri through lsmd and registers with
+        it, like lsm.Client(uri, plain_text_password, timeout_ms) does.
+        """
+        scheme = uri_parse(uri, ['scheme'])['scheme'].split('+')[0]
+        path = os.path.join(Client._plugin_uds_path(), scheme)
+        if not os.path.exists(path):
+            if Client._check_daemon_exists():
+                raise LsmError(ErrorNumber.PLUGIN_NOT_EXIST,
+                               "Plug-in %s not found!" % path)
+            _raise_no_daemon()
+
+        try:
+            (reader, writer) = await asyncio.open_unix_connection(path)
+        except OSError:
+            raise LsmError(ErrorNumber.PLUGIN_IPC_FAIL,
+                           "Unable to connect to lsmd, daemon started?")
+
+        tp = _AsyncTransPort(reader, writer)
+        try:
+            args = dict(uri=uri, password=plain_text_password,
+                        timeout=timeout_ms, flags=flags)
+            args[TransPort.OPTIONS_KEY] = TransPort.options_offer()
+            tp.options_set(await tp.rpc('plugin_register', args))
+        except BaseException:
+            await tp.close()
+            raise
+        return cls(tp, timeout_ms)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        await self.close()
+
+    async def _call(self, func, *args, **kwargs):
+        """
+        Does the request the Client method func makes, and returns what
+        func makes of the reply.
+        """
+        try:
+            func(_RpcRecorder(), *args, **kwargs)
+        except _RpcRecorded as rec:
+            reply = await self._tp.rpc(rec.method, rec.params)
+        else:
+            raise LsmError(ErrorNumber.PLUGIN_BUG,
+                           "Method '%s' did not issue a request" %
+                           func.__name__)
+        return func(_RpcReplay(reply), *args, **kwargs)
+
+    async def close(self, flags=FLAG_RSVD):
+        """
+        Does an orderly plugin_unregister of the plug-in
+        """
+        try:
+            await self._tp.rpc('plugin_unregister', dict(flags=flags))
+        finally:
+            await self._tp.close()
+
+    async def plugin_unregister(self, flags=FLAG_RSVD):
+        """
+        Synonym for close.
+        """
+        await self.close(flags)
+
+    @staticmethod
+    async def available_plugins(field_sep=':', flags=FLAG_RSVD):
+        """
+        lsm.Client.available_plugins() in the default executor, it talks
+        to every plug-in in turn.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            None, Client.available_plugins, field_sep, flags)
+
+    async def pipeline(self, calls):
+        """
+        Like lsm.Client.pipeline(), all the requests are sent before the
+        first reply is waited for.
+        """
+        requests = Client.pipeline(_RpcReplay(), calls)
+        replies = await asyncio.gather(
+            *(self._tp.rpc(method, params) for (method, params) in requests),
+            return_exceptions=True)
+        for reply in replies:
+            if isinstance(reply, BaseException):
+                raise reply
+        return replies
+
+    async def job_wait(self, job_id, timeout_ms=None, flags=FLAG_RSVD):
+        """
+        Like lsm.Client.job_wait(), job_status() is polled from here for
+        plug-ins which can't wait on a job.
+        """
+        try:
+            return await self._call(Client.job_wait, job_id, timeout_ms,
+                                    flags)
+        except LsmError as lsm_err:
+            if lsm_err.code != ErrorNumber.NO_SUPPORT:
+                raise
+
+        if timeout_ms is None:
+            timeout_ms = self._timeout
+        loop = asyncio.get_running_loop()
+        end = loop.time() + timeout_ms / 1000.0
+        while True:
+            result = await self.job_status(job_id, flags)
+            if result[0] != JobStatus.INPROGRESS or loop.time() >= end:
+                return result
+            await asyncio.sleep(max(0, min(AsyncClient.JOB_POLL_INTERVAL,
+                                           end - loop.time())))
+
+    async def _many(self, method, params, items, single):
+        """
+        Like lsm.Client._many(), single is a coroutine function doing the
+        request of one item.
+        """
+        try:
+            pairs = await self._tp.rpc(method, params)
+        except LsmError as lsm_err:
+            if lsm_err.code != ErrorNumber.NO_SUPPORT:
+                raise
+        else:
+            return [result if error is None else LsmError(*error)
+                    for (result, error) in pairs]
+
+        rc = []
+        for item in items:
+            try:
+                rc.append(await single(item))
+            except LsmError as lsm_err:
+                rc.append(lsm_err)
+        return rc
+
+    async def volume_create_many(self, pool, volume_names, size_bytes,
+                                 provisioning, flags=FLAG_RSVD):
+        return await self._many(
+            'volume_create_many',
+            dict(pool=pool, volume_names=volume_names, size_bytes=size_bytes,
+                 provisioning=provisioning, flags=flags),
+            volume_names,
+            lambda name: self.volume_create(pool, name, size_bytes,
+                                            provisioning, flags))
+
+    async def volume_delete_many(self, volumes, flags=FLAG_RSVD):
+        return await self._many(
+            'volume_delete_many', dict(volumes=volumes, flags=flags), volumes,
+            lambda volume: self.volume_delete(volume, flags))
+
+    async def volume_mask_many(self, access_group, volumes, flags=FLAG_RSVD):
+        return await self._many(
+            'volume_mask_many',
+            dict(access_group=access_group, volumes=volumes, flags=flags),
+            volumes,
+            lambda volume: self.volume_mask(access_group, volume, flags))
+
+    async def _list_iter(self, name, filters, page_size, flags):
+        """
+        Like lsm.Client._list_iter(), as an asynchronous generator.
+        """
+        page_method = getattr(self, name + '_page')
+        cursor = None
+
+        while True:
+            try:
+                lsm_objs, cursor = await page_method(
+                    filters, page_size, cursor, flags)
+            except LsmError as lsm_err:
+                if lsm_err.code != ErrorNumber.NO_SUPPORT or \
+                        cursor is not None:
+                    raise
+                break
+
+            for lsm_obj in lsm_objs:
+                yield lsm_obj
+
+            if cursor is None:
+                return
+
+        search_key = None
+        search_value = None
+        if filters and len(filters) == 1:
+            search_key, search_value = list(filters.items())[0]
+
+        for lsm_obj in await getattr(self, name)(search_key, search_value,
+                                                 flags):
+            if not filters or \
+                    all(getattr(lsm_obj, k) == v for k, v in filters.items()):
+                yield lsm_obj
+
+    def pools_iter(self, filters=None, page_size=Client.PAGE_SIZE_DEFAULT,
+                   flags=FLAG_RSVD):
+        _check_filters(filters, Pool.SUPPORTED_SEARCH_KEYS)
+        _check_page_size(page_size)
+        return self._list_iter('pools', filters, page_size, flags)
+
+    def volumes_iter(self, filters=None, page_size=Client.PAGE_SIZE_DEFAULT,
+                     flags=FLAG_RSVD):
+        _check_filters(filters, Volume.SUPPORTED_SEARCH_KEYS)
+        _check_page_size(page_size)
+        return self._list_iter('volumes', filters, page_size, flags)
+
+    def disks_iter(self, filters=None, page_size=Client.PAGE_SIZE_DEFAULT,
+                   flags=FLAG_RSVD):
+        _check_filters(filters, Disk.SUPPORTED_SEARCH_KEYS)
+        _check_page_size(page_size)
+        return self._list_iter('disks', filters, page_size, flags)
+
+    def access_groups_iter(self, filters=None,
+                           page_size=Client.PAGE_SIZE_DEFAULT,
+                           flags=FLAG_RSVD):
+        _check_filters(filters, AccessGroup.SUPPORTED_SEARCH_KEYS)
+        _check_page_size(page_size)
+        return self._list_iter('access_groups', filters, page_size, flags)
+
+
+def _coroutine(func):
+    @functools.wraps(func)
+    async def call(self, *args, **kwargs):
+        return await self._call(func, *args, **kwargs)
+    return call
+
+
+# Every other Client method does a single request, which _call() handles
+for _name, _func in list(Client.__dict__.items()):
+    if inspect.isfunction(_func) and not _name.startswith('_') and \
+            _name != 'plugin_register' and _name not in AsyncClient.__dict__:
+        setattr(AsyncClient, _name, _coroutine(_func))
+
+# Same documentation as the Client methods done by hand
+for _name in ('volume_create_many', 'volume_delete_many', 'volume_mask_many',
+              'pools_iter', 'volumes_iter', 'disks_iter',
+              'access_groups_iter'):
+    getattr(AsyncClient, _name).__doc__ = getattr(Client, _name).__doc__
+
+
+class _TestPlugin(object):
+    """
+    Has five volumes and a job which is done on the third look at it.
+    """
+    def __init__(self):
+        self.job_polls = 0
+
+    def plugin_register(self, uri, password, timeout, flags=0):
+        pass
+
+    def plugin_unregister(self, flags=0):
+        pass
+
+    def time_out_get(self, flags=0):
+        return 30000
+
+    def systems(self, flags=0):
+        return [System('sys-1', 'system', System.STATUS_OK, '')]
+
+    def volumes(self, search_key=None, search_value=None, flags=0):
+        return [Volume('VOL_%d' % i, 'vol_%d' % i, '', 512, 2048,
+                       Volume.ADMIN_STATE_ENABLED, 'sys-1', 'POOL_1')
+                for i in range(5)]
+
+    def volume_delete(self, volume, flags=0):
+        if volume.id == 'VOL_3':
+            raise LsmError(ErrorNumber.NOT_FOUND_VOLUME, "Volume not found")
+        return 'JOB_%s' % volume.id
+
+    def job_status(self, job_id, flags=0):
+        self.job_polls += 1
+        if self.job_polls < 3:
+            return [JobStatus.INPROGRESS, 50, None]
+        return [JobStatus.COMPLETE, 100, None]
+
+
+class TestAsyncClient(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'test')
+        self.uds_path = os.environ.get('LSM_UDS_PATH')
+        os.environ['LSM_UDS_PATH'] = self.tmpdir
+        self.pid = os.fork()
+        if self.pid == 0:
+            rc = 0
+            try:
+                PluginRunner(_TestPlugin,
+                             ['test', '--server', self.path, '1']).run()
+            except BaseException:
+                rc = 1
+            os._exit(rc)
+
+        for _ in range(100):
+            if os.path.exists(self.path):
+                break
+            time.sleep(0.05)
+
+    def tearDown(self):
+        os.kill(self.pid, signal.SIGTERM)
+        os.waitpid(self.pid, 0)
+        shutil.rmtree(self.tmpdir)
+        if self.uds_path is None:
+            del os.environ['LSM_UDS_PATH']
+        else:
+            os.environ['LSM_UDS_PATH'] = self.uds_path
+
+    @staticmethod
+    def _run(func):
+        async def _session():
+            async with await AsyncClient.connect('test://') as client:
+                return await func(client)
+        return asyncio.run(_session())
+
+    def test_calls(self):
+        async def _calls(client):
+            return await asyncio.gather(
+                *([client.systems() for _ in range(10)] +
+                  [client.volumes(), client.time_out_get()]))
+
+        rc = self._run(_calls)
+        self.assertEqual([s[0].id for s in rc[:10]], ['sys-1'] * 10)
+        self.assertEqual(len(rc[10]), 5)
+        self.assertTrue(isinstance(rc[10][0], Volume))
+        self.assertEqual(rc[11], 30000)
+
+    def test_errors(self):
+        async def _errors(client):
+            with self.assertRaises(LsmError) as cm:
+                await client.pools()
+            self.assertEqual(cm.exception.code, ErrorNumber.NO_SUPPORT)
+            # Checked before anything is sent, like lsm.Client does
+            with self.assertRaises(LsmError) as cm:
+                client.volumes_iter(page_size=0)
+            self.assertEqual(cm.exception.code,
+                             ErrorNumber.INVALID_ARGUMENT)
+            return await client.systems()
+
+        self.assertEqual(self._run(_errors)[0].id, 'sys-1')
+
+    def test_iter(self):
+        async def _iter(client):
+            return [v.id async for v in client.volumes_iter(page_size=2)]
+
+        self.assertEqual(self._run(_iter),
+                         ['VOL_%d' % i for i in range(5)])
+
+    def test_job_wait(self):
+        async def _wait(client):
+            return await client.job_wait('JOB_1')
+
+        self.assertEqual(self._run(_wait)[:2], [JobStatus.COMPLETE, 100])
+
+    def test_many(self):
+        async def _many(client):
+            return await client.volume_delete_many(await client.volumes())
+
+        rc = self._run(_many)
+        self.assertEqual(rc[:3], ['JOB_VOL_0', 'JOB_VOL_1', 'JOB_VOL_2'])
+        self.assertEqual(rc[3].code, ErrorNumber.NOT_FOUND_VOLUME)
+
+    def test_pipeline(self):
+        async def _pipeline(client):
+            return await client.pipeline([('systems', {}), ('volumes', {})])
+
+        (systems, volumes) = self._run(_pipeline)
+        self.assertEqual(systems[0].id, 'sys-1')
+        self.assertEqual(len(volumes), 5)
+
+    def test_cancel(self):
+        async def _cancel(client):
+            task = asyncio.ensure_future(client.volumes())
+            await asyncio.sleep(0)
+            task.cancel()
+            # The reply to the cancelled request must not get in the way
+            return await asyncio.gather(client.systems(), client.volumes())
+
+        (systems, volumes) = self._run(_cancel)
+        self.assertEqual(systems[0].id, 'sys-1')
+        self.assertEqual(len(volumes), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026 Red Hat, Inc.
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Takes an inventory (systems, pools, volumes and disks) of a number of
+simulated arrays a number of times, once with a thread and an lsm.Client
+per array and once with an lsm.aio.AsyncClient per array on one event
+loop, and reports the time taken and the threads used by each.
+
+Needs a running lsmd.  Each array is a simulator state file of its own in
+the given directory.
+
+Usage: aio_fanout_bench.py [--arrays 32] [--rounds 10] [--dir /tmp]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import lsm
+from lsm.aio import AsyncClient
+
+INVENTORY = ('systems', 'pools', 'volumes', 'disks')
+
+
+def _threads(uris, rounds):
+    peak = [0]
+
+    def _array(uri):
+        client = lsm.Client(uri)
+        for _ in range(rounds):
+            for method in INVENTORY:
+                getattr(client, method)()
+            peak[0] = max(peak[0], threading.active_count())
+        client.close()
+
+    workers = [threading.Thread(target=_array, args=(uri,)) for uri in uris]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return peak[0]
+
+
+async def _aio(uris, rounds):
+    clients = await asyncio.gather(*(AsyncClient.connect(uri)
+                                     for uri in uris))
+    for _ in range(rounds):
+        await asyncio.gather(*(getattr(c, method)()
+                               for c in clients for method in INVENTORY))
+    await asyncio.gather(*(c.close() for c in clients))
+    return threading.active_count()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--arrays', type=int, default=32)
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--dir', default='/tmp')
+    args = parser.parse_args()
+
+    uris = ['sim://?statefile=%s' %
+            os.path.join(args.dir, 'aio_fanout_%d.db' % i)
+            for i in range(args.arrays)]
+    # Create the state files before the clock starts
+    for uri in uris:
+        lsm.Client(uri).close()
+
+    sys.stdout.write("%d arrays, %d inventory rounds\n" %
+                     (args.arrays, args.rounds))
+    for (label, func) in (
+            ('threads', lambda: _threads(uris, args.rounds)),
+            ('asyncio', lambda: asyncio.run(_aio(uris, args.rounds)))):
+        start = time.time()
+        threads = func()
+        sys.stdout.write("%-8s %8.2f s %6d threads\n" %
+                         (label, time.time() - start, threads))
+
+
+if __name__ == '__main__':
+    main()
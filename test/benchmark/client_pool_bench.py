@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# Copyright (C) 2026 Red Hat, Inc.
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Has a number of threads list volumes and pools for a while, once through
+one lsm.Client shared by all of them and once through an lsm.ClientPool,
+and reports the calls per second of each.
+
+Needs a running lsmd.  Give the simulator a state file with some volumes
+to list:
+
+    client_pool_bench.py \
+        --uri 'sim://?statefile=/tmp/c.db&pools=4&disks=16&volumes=1000'
+
+Usage: client_pool_bench.py [--uri sim://] [--threads 16] [--size 4]
+                            [--duration 10]
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+import lsm
+
+
+def _run(target, threads, duration):
+    counts = [0] * threads
+    end = time.time() + duration
+
+    def _worker(index):
+        while time.time() < end:
+            target.volumes()
+            target.pools()
+            counts[index] += 2
+
+    workers = [threading.Thread(target=_worker, args=(i,))
+               for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return sum(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--uri', default='sim://')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--size', type=int, default=4,
+                        help='sessions in the pool')
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    sys.stdout.write("%s, %d threads, %.0f s\n" %
+                     (args.uri, args.threads, args.duration))
+    for label in ('one client', 'pool of %d' % args.size):
+        if label == 'one client':
+            target = lsm.Client(args.uri)
+        else:
+            target = lsm.ClientPool(args.uri, size=args.size)
+        try:
+            calls = _run(target, args.threads, args.duration)
+        finally:
+            target.close()
+        sys.stdout.write("%-12s %10d calls %10.1f calls/s\n" %
+                         (label, calls, calls / args.duration))
+
+
+if __name__ == '__main__':
+    main()
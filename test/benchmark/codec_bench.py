@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# Copyright (C) 2026 Red Hat, Inc.
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compares encode and decode throughput of the wire codecs TransPort can use
+for a reply holding the usual mix of lsm data objects.  msgpack is skipped
+when it is not installed.
+
+Usage: codec_bench.py [--count 100000] [--repeat 3]
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from lsm import (Volume, Pool, Disk, AccessGroup, FileSystem, TargetPort)
+from lsm._data import DataDecoder, msgpack_loads
+from lsm._transport import TransPort
+
+
+def _objs(count):
+    """
+    Per 20 objects: 10 volumes, 4 disks, 2 access groups, 2 file systems,
+    1 pool and 1 target port.
+    """
+    rc = []
+    i = 0
+    while len(rc) < count:
+        for j in range(10):
+            n = i * 10 + j
+            rc.append(Volume('VOL_ID_%08d' % n, 'volume_%08d' % n,
+                             '600508b1001c%020x' % n, 512, 2 ** 21 + n,
+                             Volume.ADMIN_STATE_ENABLED, 'sim-01',
+                             'POOL_ID_%08d' % i))
+        for j in range(4):
+            n = i * 4 + j
+            rc.append(Disk('DISK_ID_%08d' % n, 'disk_%08d' % n,
+                           Disk.TYPE_SAS, 512, 2 ** 31 + n,
+                           Disk.STATUS_OK | Disk.STATUS_FREE, 'sim-01',
+                           _vpd83='5000c500%08x' % n,
+                           _location='Port: %d Box: 1 Bay: %d' % (j, n),
+                           _rpm=10000, _link_type=Disk.LINK_TYPE_SAS))
+        for j in range(2):
+            n = i * 2 + j
+            rc.append(AccessGroup('AG_ID_%08d' % n, 'host_%08d' % n,
+                                  ['iqn.1994-05.com.domain:01.%08x' % n,
+                                   '50060b0000%06x' % n],
+                                  AccessGroup.INIT_TYPE_ISCSI_WWPN_MIXED,
+                                  'sim-01'))
+            rc.append(FileSystem('FS_ID_%08d' % n, 'fs_%08d' % n, 2 ** 40,
+                                 2 ** 39 - n, 'POOL_ID_%08d' % i, 'sim-01'))
+        rc.append(Pool('POOL_ID_%08d' % i, 'pool_%08d' % i,
+                       Pool.ELEMENT_TYPE_VOLUME | Pool.ELEMENT_TYPE_FS, 0,
+                       2 ** 44, 2 ** 43 - i, Pool.STATUS_OK, '', 'sim-01'))
+        rc.append(TargetPort('TGT_PORT_ID_%08d' % i, TargetPort.TYPE_ISCSI,
+                             'iqn.1986-05.com.example:sim-tgt-%d' % i,
+                             'sim-iscsi-tgt-%d.example.com:3260' % i,
+                             'a4:4e:31:47:f4:%02x' % (i % 256),
+                             'iSCSI_c_%d' % i, 'sim-01'))
+        i += 1
+    return rc[:count]
+
+
+def _loads(codec, data):
+    if codec == 'msgpack':
+        return msgpack_loads(data)
+    return json.loads(data.decode('utf-8'), cls=DataDecoder)
+
+
+def _best(func, repeat):
+    best = None
+    rc = None
+    for _ in range(repeat):
+        start = time.time()
+        rc = func()
+        duration = time.time() - start
+        if best is None or duration < best:
+            best = duration
+    return best, rc
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    reply = {'id': 1, 'result': _objs(args.count)}
+
+    sys.stdout.write("%d objects, best of %d\n" % (args.count, args.repeat))
+    sys.stdout.write("%-8s %10s %10s %12s %12s %12s\n" %
+                     ('codec', 'size MiB', 'encode s', 'encode obj/s',
+                      'decode s', 'decode obj/s'))
+
+    for codec in ('json', 'msgpack'):
+        if codec not in TransPort.CODECS:
+            sys.stdout.write("%-8s not available\n" % codec)
+            continue
+
+        tp = TransPort(None)
+        tp.codec = codec
+
+        enc_s, data = _best(lambda: tp._dumps(reply), args.repeat)
+        dec_s, rc = _best(lambda: _loads(codec, data), args.repeat)
+        assert len(rc['result']) == args.count
+
+        sys.stdout.write("%-8s %10.1f %10.3f %12d %12.3f %12d\n" %
+                         (codec, len(data) / 1048576.0, enc_s,
+                          args.count / enc_s, dec_s, args.count / dec_s))
+
+
+if __name__ == '__main__':
+    main()
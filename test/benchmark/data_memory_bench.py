@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# Copyright (C) 2026 Red Hat, Inc.
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures the memory held by a large number of lsm.Volume objects, comparing
+the slotted classes against the previous per instance __dict__ layout.  Each
+layout is measured in its own process.
+
+Usage: data_memory_bench.py [--count 1000000]
+"""
+
+import argparse
+import gc
+import json
+import os
+import resource
+import sys
+import time
+
+import six
+
+from lsm import Volume
+
+
+class LegacyVolume(object):
+    """
+    Volume as it was stored before __slots__, state in the instance __dict__.
+    """
+    __init__ = six.get_unbound_function(Volume.__init__)
+
+
+def _rss_peak_kib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _build(vol_class, count):
+    return [vol_class('VOL_ID_%08d' % i, 'volume_%08d' % i,
+                      '600508b1001c79ade5178f0626caaa9c', 512, 2 ** 21 + i,
+                      Volume.ADMIN_STATE_ENABLED, 'sim-01', 'POOL_ID_00000001')
+            for i in range(count)]
+
+
+def _measure(vol_class, count):
+    """
+    Runs in a child, returns (seconds to build, bytes per object, peak RSS
+    growth in KiB).
+    """
+    # Strings are shared by both layouts, build them first so that only the
+    # objects themselves are counted.
+    strings = _build(lambda *args: args, count)
+    gc.collect()
+    base = _rss_peak_kib()
+
+    start = time.time()
+    vols = [vol_class(*args) for args in strings]
+    duration = time.time() - start
+
+    per_obj = 0
+    if hasattr(sys, 'getsizeof'):
+        v = vols[0]
+        per_obj = sys.getsizeof(v)
+        if hasattr(v, '__dict__'):
+            per_obj += sys.getsizeof(v.__dict__)
+
+    return duration, per_obj, _rss_peak_kib() - base
+
+
+def _run(name, vol_class, count):
+    (r_fd, w_fd) = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r_fd)
+        os.write(w_fd, json.dumps(_measure(vol_class, count)).encode('utf-8'))
+        os._exit(0)
+
+    os.close(w_fd)
+    out = b''
+    while True:
+        chunk = os.read(r_fd, 4096)
+        if not chunk:
+            break
+        out += chunk
+    os.close(r_fd)
+    os.waitpid(pid, 0)
+    (duration, per_obj, rss_kib) = json.loads(out.decode('utf-8'))
+    sys.stdout.write("%-10s %12.2f %14d %16.1f\n" %
+                     (name, duration, per_obj, rss_kib / 1024.0))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--count', type=int, default=1000000)
+    args = parser.parse_args()
+
+    sys.stdout.write("%d Volume objects\n" % args.count)
+    sys.stdout.write("%-10s %12s %14s %16s\n" %
+                     ('layout', 'build (s)', 'bytes/object', 'peak RSS +MiB'))
+    _run('__dict__', LegacyVolume, args.count)
+    _run('__slots__', Volume, args.count)
+
+
+if __name__ == '__main__':
+    main()
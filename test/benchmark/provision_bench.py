@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# Copyright (C) 2026 Red Hat, Inc.
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Provisions a number of volumes and masks them to an access group, once
+with a volume_create() and volume_mask() call per volume and once with
+volume_create_many() and volume_mask_many(), and reports the volumes per
+second of each.  The volumes are unmasked and deleted afterwards.
+
+Needs a running lsmd.  With the simulator, start lsmd with LSM_SIM_TIME=0
+in its environment or use the virtual clock to leave the job time out:
+
+    provision_bench.py --uri 'sim://?statefile=/tmp/p.db&clock=virtual'
+
+Usage: provision_bench.py [--uri sim://] [--count 500] [--size-mib 100]
+"""
+
+import argparse
+import sys
+import time
+
+import lsm
+from lsm import JobStatus, LsmError
+
+
+def _wait(client, job, item):
+    while job is not None:
+        (status, _, item) = client.job_wait(job)
+        if status == JobStatus.INPROGRESS:
+            continue
+        client.job_free(job)
+        if status != JobStatus.COMPLETE:
+            raise LsmError(lsm.ErrorNumber.PLUGIN_BUG,
+                           "Job %s failed" % job)
+        break
+    return item
+
+
+def _raise_any(results):
+    for result in results:
+        if isinstance(result, LsmError):
+            raise result
+    return results
+
+
+def _single(client, pool, ag, names, size):
+    vols = []
+    for name in names:
+        vols.append(_wait(client, *client.volume_create(
+            pool, name, size, lsm.Volume.PROVISION_DEFAULT)))
+    for vol in vols:
+        client.volume_mask(ag, vol)
+    return vols
+
+
+def _many(client, pool, ag, names, size):
+    vols = [_wait(client, *r) for r in _raise_any(client.volume_create_many(
+        pool, names, size, lsm.Volume.PROVISION_DEFAULT))]
+    _raise_any(client.volume_mask_many(ag, vols))
+    return vols
+
+
+def _cleanup(client, ag, vols):
+    for vol in vols:
+        client.volume_unmask(ag, vol)
+    for job in _raise_any(client.volume_delete_many(vols)):
+        _wait(client, job, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--uri', default='sim://')
+    parser.add_argument('--count', type=int, default=500)
+    parser.add_argument('--size-mib', type=int, default=100)
+    args = parser.parse_args()
+
+    client = lsm.Client(args.uri)
+    system = client.systems()[0]
+    pool = max((p for p in client.pools()
+                if not p.element_type & lsm.Pool.ELEMENT_TYPE_SYS_RESERVED and
+                p.element_type & lsm.Pool.ELEMENT_TYPE_VOLUME),
+               key=lambda p: p.free_space)
+    ag = client.access_group_create(
+        'provision_bench', 'iqn.1994-05.com.example:provision-bench',
+        lsm.AccessGroup.INIT_TYPE_ISCSI_IQN, system)
+
+    sys.stdout.write("%d volumes of %d MiB, created and masked\n" %
+                     (args.count, args.size_mib))
+    try:
+        for (label, func) in (('one by one', _single), ('batch', _many)):
+            names = ['provision_bench_%s_%d' % (func.__name__, i)
+                     for i in range(args.count)]
+            start = time.time()
+            vols = func(client, pool, ag, names, args.size_mib * 1024 ** 2)
+            duration = time.time() - start
+            _cleanup(client, ag, vols)
+            sys.stdout.write("%-12s %8.2f s %10.1f volumes/s\n" %
+                             (label, duration, args.count / duration))
+    finally:
+        client.access_group_delete(ag)
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# Copyright (C) 2026 Red Hat, Inc.
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Starts a number of volume replications at once, then waits for all of them
+either with job_wait() or by polling job_status(), and reports the time
+taken and the number of requests sent.
+
+Needs a running lsmd.  Use the virtual clock of the simulator to have the
+jobs take as long as they would on an array without waiting for real, and
+a populated pool big enough for all the replicas:
+
+    sim_job_bench.py \
+        --uri 'sim://?statefile=/tmp/j.db&clock=virtual&pools=1&disks=4'
+
+Usage: sim_job_bench.py [--uri sim://] [--jobs 1000] [--size-gib 10]
+                        [--poll]
+"""
+
+import argparse
+import sys
+import time
+
+import lsm
+from lsm import JobStatus
+
+
+def _wait(client, job, poll):
+    """
+    Returns the number of requests it took and the item the job made.
+    """
+    requests = 0
+    status = JobStatus.INPROGRESS
+    while status == JobStatus.INPROGRESS:
+        if poll:
+            (status, _, item) = client.job_status(job)
+        else:
+            (status, _, item) = client.job_wait(job)
+        requests += 1
+    client.job_free(job)
+    return requests, item
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--uri', default='sim://')
+    parser.add_argument('--jobs', type=int, default=1000)
+    parser.add_argument('--size-gib', type=int, default=10)
+    parser.add_argument('--poll', action='store_true',
+                        help='poll job_status() instead of job_wait()')
+    args = parser.parse_args()
+
+    client = lsm.Client(args.uri)
+    pool = max((p for p in client.pools()
+                if not p.element_type & lsm.Pool.ELEMENT_TYPE_SYS_RESERVED and
+                p.element_type & lsm.Pool.ELEMENT_TYPE_VOLUME),
+               key=lambda p: p.free_space)
+
+    (job, src) = client.volume_create(pool, 'job_bench_src',
+                                      args.size_gib * 1024 ** 3,
+                                      lsm.Volume.PROVISION_DEFAULT)
+    if job is not None:
+        src = _wait(client, job, args.poll)[1]
+
+    start = time.time()
+    jobs = []
+    for i in range(args.jobs):
+        jobs.append(client.volume_replicate(
+            pool, lsm.Volume.REPLICATE_CLONE, src, 'job_bench_%d' % i)[0])
+    started = time.time()
+
+    requests = 0
+    for job in jobs:
+        if job is not None:
+            requests += _wait(client, job, args.poll)[0]
+    done = time.time()
+
+    # The replicas first, the source can't go while they are around
+    for vol in sorted((v for v in client.volumes()
+                       if v.name.startswith('job_bench_')),
+                      key=lambda v: v.id == src.id):
+        job = client.volume_delete(vol)
+        if job is not None:
+            _wait(client, job, args.poll)
+    client.close()
+
+    sys.stdout.write("%d replications of %d GiB, waiting with %s\n" %
+                     (args.jobs, args.size_gib,
+                      'job_status' if args.poll else 'job_wait'))
+    sys.stdout.write("started in %.2f s, %.0f jobs/s\n" %
+                     (started - start, args.jobs / (started - start)))
+    sys.stdout.write("all done after %.2f s more, %d wait requests\n" %
+                     (done - started, requests))
+
+
+if __name__ == '__main__':
+    main()
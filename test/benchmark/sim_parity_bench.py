@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# Copyright (C) 2026 Red Hat, Inc.
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Runs the same workload through lsm.Client against several plug-ins, by
+default the Python simulator and the C one, and reports per call latency
+percentiles of each, so the time spent in the Python side of the daemon
+protocol shows up as the gap to simc.
+
+The workload is: create a number of volumes, list volumes, pools, disks
+and systems repeatedly, create and delete volumes in turn, mask and unmask
+every volume to an access group and poll the status of every job started.
+The volumes and the access group are removed afterwards.
+
+Needs a running lsmd which has both plug-ins.  Start it with LSM_SIM_TIME=0
+in its environment, both simulators honour it, so every job is done on the
+first job_status() and the numbers don't include simulated job time:
+
+    sim_parity_bench.py --uri 'sim://?statefile=/tmp/p.db' \
+        --uri 'simc://?statefile=/tmp/pc.db'
+
+Usage: sim_parity_bench.py [--uri sim:// --uri simc://] [--volumes 200]
+                           [--repeat 50] [--churn 100]
+"""
+
+import argparse
+import sys
+import time
+
+import lsm
+from lsm import JobStatus, LsmError
+
+PERCENTILES = (50, 90, 99)
+
+
+class _Timer(object):
+    """
+    Keeps the latency of every call made through it, by method name.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.samples = {}
+
+    def __call__(self, method, *args):
+        func = getattr(self.client, method)
+        start = time.time()
+        rc = func(*args)
+        self.samples.setdefault(method, []).append(time.time() - start)
+        return rc
+
+    def wait(self, job, item=None):
+        while job is not None:
+            (status, _, item) = self('job_status', job)
+            if status == JobStatus.INPROGRESS:
+                continue
+            self('job_free', job)
+            if status != JobStatus.COMPLETE:
+                raise LsmError(lsm.ErrorNumber.PLUGIN_BUG,
+                               "Job %s failed" % job)
+            break
+        return item
+
+
+def _workload(uri, args):
+    client = lsm.Client(uri)
+    timer = _Timer(client)
+    system = client.systems()[0]
+    pool = max((p for p in client.pools()
+                if not p.element_type & lsm.Pool.ELEMENT_TYPE_SYS_RESERVED and
+                p.element_type & lsm.Pool.ELEMENT_TYPE_VOLUME),
+               key=lambda p: p.free_space)
+    size = args.size_mib * 1024 ** 2
+    ag = client.access_group_create(
+        'parity_bench', 'iqn.1994-05.com.example:parity-bench',
+        lsm.AccessGroup.INIT_TYPE_ISCSI_IQN, system)
+    vols = []
+    try:
+        for i in range(args.volumes):
+            vols.append(timer.wait(*timer(
+                'volume_create', pool, 'parity_bench_%d' % i, size,
+                lsm.Volume.PROVISION_DEFAULT)))
+
+        for _ in range(args.repeat):
+            timer('volumes')
+            timer('pools')
+            timer('disks')
+            timer('systems')
+
+        for i in range(args.churn):
+            vol = timer.wait(*timer(
+                'volume_create', pool, 'parity_bench_churn_%d' % i, size,
+                lsm.Volume.PROVISION_DEFAULT))
+            timer.wait(timer('volume_delete', vol))
+
+        for vol in vols:
+            timer('volume_mask', ag, vol)
+        timer('volumes_accessible_by_access_group', ag)
+        for vol in vols:
+            timer('volume_unmask', ag, vol)
+    finally:
+        for vol in vols:
+            timer.wait(timer('volume_delete', vol))
+        client.access_group_delete(ag)
+        client.close()
+    return timer.samples
+
+
+def _percentile(samples, pct):
+    """
+    Nearest rank percentile of sorted samples.
+    """
+    return samples[max(0, -(-len(samples) * pct // 100) - 1)]
+
+
+def _report(uris, results):
+    methods = sorted(set(m for r in results for m in r))
+    sys.stdout.write("latency in ms, %s relative to the first plug-in\n" %
+                     '/'.join('p%d' % p for p in PERCENTILES))
+    sys.stdout.write("%-36s %-6s %8s %8s %8s %8s %8s relative\n" %
+                     (('method', 'plugin', 'calls') +
+                      tuple('p%d' % p for p in PERCENTILES) + ('max',)))
+    for method in methods:
+        base = None
+        for (uri, samples) in zip(uris, results):
+            if method not in samples:
+                continue
+            times = sorted(samples[method])
+            pcts = [_percentile(times, p) for p in PERCENTILES]
+            sys.stdout.write(
+                "%-36s %-6s %8d %s %8.3f" %
+                (method, uri.split(':')[0], len(times),
+                 ' '.join('%8.3f' % (t * 1000) for t in pcts),
+                 times[-1] * 1000))
+            if base is None:
+                base = pcts
+                sys.stdout.write("\n")
+            else:
+                sys.stdout.write(" %s\n" % '/'.join(
+                    '%.1fx' % (t / b) if b else '-'
+                    for (t, b) in zip(pcts, base)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--uri', action='append',
+                        help='plug-in to run against, more than once, '
+                             'default sim:// and simc://')
+    parser.add_argument('--volumes', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--churn', type=int, default=100)
+    parser.add_argument('--size-mib', type=int, default=100)
+    args = parser.parse_args()
+    uris = args.uri or ['sim://', 'simc://']
+
+    results = [_workload(uri, args) for uri in uris]
+    sys.stdout.write("%d volumes, %d list rounds, %d create and delete\n" %
+                     (args.volumes, args.repeat, args.churn))
+    _report(uris, results)
+
+
+if __name__ == '__main__':
+    main()
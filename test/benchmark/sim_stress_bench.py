@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# Copyright (C) 2026 Red Hat, Inc.
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Runs N client processes listing volumes and pools and M client processes
+creating and deleting volumes against one simulator state file at the same
+time, then reports throughput and the rate of lock time outs of each.
+
+Needs a running lsmd.  Compare the journal modes with:
+
+    sim_stress_bench.py --uri 'sim://?statefile=/tmp/s.db&journal_mode=delete'
+    sim_stress_bench.py --uri 'sim://?statefile=/tmp/s.db&journal_mode=wal'
+
+Writers wait for their jobs, start lsmd with LSM_SIM_TIME=0 in its
+environment to leave the simulated job time out of the numbers.
+
+Usage: sim_stress_bench.py [--uri sim://] [--readers 4] [--writers 2]
+                           [--duration 10] [--timeout 30000]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import lsm
+from lsm import LsmError, ErrorNumber, JobStatus
+
+
+def _wait(client, job):
+    """
+    Returns the data of the finished job.
+    """
+    while True:
+        (status, _, data) = client.job_status(job)
+        if status == JobStatus.COMPLETE:
+            client.job_free(job)
+            return data
+        if status == JobStatus.ERROR:
+            raise LsmError(ErrorNumber.PLUGIN_BUG, "Job %s failed" % job)
+        time.sleep(0.01)
+
+
+def _reader(client, _, __):
+    client.volumes()
+    client.pools()
+
+
+def _writer(client, pool, name):
+    (job, vol) = client.volume_create(pool, name, 1024 ** 3,
+                                      lsm.Volume.PROVISION_DEFAULT)
+    if job is not None:
+        vol = _wait(client, job)
+    job = client.volume_delete(vol)
+    if job is not None:
+        _wait(client, job)
+
+
+def _worker(args, role, index, results):
+    client = lsm.Client(args.uri, timeout_ms=args.timeout)
+    pool = [p for p in client.pools()
+            if not p.element_type & lsm.Pool.ELEMENT_TYPE_SYS_RESERVED and
+            p.element_type & lsm.Pool.ELEMENT_TYPE_VOLUME][0]
+    func = _reader if role == 'reader' else _writer
+
+    ops = 0
+    timeouts = 0
+    errors = 0
+    end = time.time() + args.duration
+    while time.time() < end:
+        try:
+            func(client, pool, 'stress_%d_%d_%d' % (os.getpid(), index, ops))
+            ops += 1
+        except LsmError as lsm_err:
+            if lsm_err.code == ErrorNumber.TIMEOUT:
+                timeouts += 1
+            else:
+                errors += 1
+    client.close()
+    results.put((role, ops, timeouts, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--uri', default='sim://')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--timeout', type=int, default=30000,
+                        help='client and state file lock time out in ms')
+    args = parser.parse_args()
+
+    # Open the state file once before the clock starts
+    lsm.Client(args.uri, timeout_ms=args.timeout).close()
+
+    results = multiprocessing.Queue()
+    procs = []
+    for (role, count) in (('reader', args.readers),
+                          ('writer', args.writers)):
+        for i in range(count):
+            procs.append(multiprocessing.Process(
+                target=_worker, args=(args, role, i, results)))
+    for proc in procs:
+        proc.start()
+
+    totals = {'reader': [0, 0, 0], 'writer': [0, 0, 0]}
+    for _ in procs:
+        (role, ops, timeouts, errors) = results.get()
+        totals[role][0] += ops
+        totals[role][1] += timeouts
+        totals[role][2] += errors
+    for proc in procs:
+        proc.join()
+
+    sys.stdout.write("%s, %d readers, %d writers, %.0f s\n" %
+                     (args.uri, args.readers, args.writers, args.duration))
+    sys.stdout.write("%-8s %10s %10s %10s %10s %10s\n" %
+                     ('role', 'ops', 'ops/s', 'timeouts', 'timeout %',
+                      'errors'))
+    for role in ('reader', 'writer'):
+        (ops, timeouts, errors) = totals[role]
+        attempts = ops + timeouts + errors
+        sys.stdout.write("%-8s %10d %10.1f %10d %10.2f %10d\n" %
+                         (role, ops, ops / args.duration, timeouts,
+                          100.0 * timeouts / attempts if attempts else 0,
+                          errors))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# Copyright (C) 2026 Red Hat, Inc.
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures cold start: the wall time of 'python -c "import lsm"' and, for
+every *_lsmplugin found in the plug-in directory, the time from starting
+it the way lsmd does (client socket as argv[1]) to its reply to a
+plugin_info request.
+
+Usage: startup_bench.py [--plugin-dir /usr/bin] [--repeat 10]
+"""
+
+import argparse
+import glob
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from lsm._transport import TransPort
+
+
+def _import_lsm():
+    subprocess.check_call([sys.executable, '-c', 'import lsm'])
+
+
+def _first_reply(plugin):
+    (ours, theirs) = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    if hasattr(theirs, 'set_inheritable'):
+        theirs.set_inheritable(True)
+    proc = subprocess.Popen([plugin, str(theirs.fileno())],
+                            close_fds=False)
+    theirs.close()
+    tp = TransPort(ours)
+    try:
+        tp.rpc('plugin_info', dict(flags=0))
+    finally:
+        tp.close()
+        proc.wait()
+
+
+def _times(func, repeat):
+    rc = []
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        rc.append(time.time() - start)
+    return sorted(rc)
+
+
+def _report(name, times):
+    sys.stdout.write("%-24s %10.1f %10.1f %10.1f\n" %
+                     (name, times[0] * 1000, times[len(times) // 2] * 1000,
+                      times[-1] * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--plugin-dir', default='/usr/bin')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    sys.stdout.write("best, median and worst of %d, in ms\n" % args.repeat)
+    sys.stdout.write("%-24s %10s %10s %10s\n" %
+                     ('', 'best', 'median', 'worst'))
+
+    _report('import lsm', _times(_import_lsm, args.repeat))
+
+    for plugin in sorted(glob.glob(os.path.join(args.plugin_dir,
+                                                '*_lsmplugin'))):
+        try:
+            times = _times(lambda: _first_reply(plugin), args.repeat)
+        except Exception as e:
+            sys.stdout.write("%-24s failed: %s\n" %
+                             (os.path.basename(plugin), str(e)))
+            continue
+        _report(os.path.basename(plugin), times)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# Copyright (C) 2026 Red Hat, Inc.
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compares the TransPort receive path against the previous implementation,
+which grew a bytearray from recv() and decoded it to a string before
+parsing.  Each reader runs in its own process so the peak RSS reported is
+its own.
+
+Usage: transport_read_bench.py [--size-mb 50] [--iterations 5]
+"""
+
+import argparse
+import json
+import os
+import resource
+import socket
+import sys
+import time
+
+from lsm._common import SocketEOF
+from lsm._data import DataDecoder, DataEncoder, Volume
+from lsm._transport import TransPort
+
+
+class LegacyTransPort(TransPort):
+    """
+    The receive path as it was before the preallocated reader.
+    """
+    def _read_all(self, l):
+        data = bytearray()
+        while len(data) < l:
+            r = self.s.recv(l - len(data))
+            if not r:
+                raise SocketEOF()
+            data += r
+        return data.decode("utf-8")
+
+    def _recv_msg(self):
+        l = self._read_all(self.HDR_LEN)
+        return self._read_all(int(l))
+
+    def read_resp(self):
+        resp = json.loads(self._recv_msg(), cls=DataDecoder)
+        return resp['result'], resp['id']
+
+
+def _reply_build(size_mb):
+    """
+    Returns a framed volumes() reply of roughly size_mb MiB.
+    """
+    vols = []
+    one = len(json.dumps(Volume('VOL_ID_00000000', 'volume_00000000',
+                                '600508b1001c79ade5178f0626caaa9c', 512,
+                                2 ** 21, 1, 'sim-01', 'POOL_ID_00000001'),
+                         cls=DataEncoder))
+    for i in range(int(size_mb * 2 ** 20 / (one + 2))):
+        vols.append(Volume('VOL_ID_%08d' % i, 'volume_%08d' % i,
+                           '600508b1001c79ade5178f0626caaa9c', 512,
+                           2 ** 21 + i, 1, 'sim-01', 'POOL_ID_00000001'))
+    msg = json.dumps({'id': 1, 'result': vols}, cls=DataEncoder)
+    return (str.zfill(str(len(msg)), TransPort.HDR_LEN) + msg).encode('utf-8')
+
+
+def _writer(s, wire, iterations):
+    for _ in range(iterations):
+        s.sendall(wire)
+    s.close()
+
+
+def _reader(s, tp_class, iterations, decode):
+    """
+    Receives iterations replies, returns a list of per reply latencies.
+    """
+    tp = tp_class(s)
+    latency = []
+    for _ in range(iterations):
+        start = time.time()
+        if decode:
+            rc = tp.read_resp()
+        else:
+            rc = tp._recv_msg()
+        latency.append(time.time() - start)
+        del rc
+    return latency
+
+
+def _rss_peak_kib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _run_one(name, tp_class, wire, iterations, decode):
+    """
+    Forks a reader and a writer, returns (name, latencies, peak rss growth).
+    """
+    (r_fd, w_fd) = os.pipe()
+    (c, s) = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    writer = os.fork()
+    if writer == 0:
+        c.close()
+        _writer(s, wire, iterations)
+        os._exit(0)
+    s.close()
+
+    reader = os.fork()
+    if reader == 0:
+        os.close(r_fd)
+        base = _rss_peak_kib()
+        latency = _reader(c, tp_class, iterations, decode)
+        out = json.dumps(dict(latency=latency,
+                              rss_kib=_rss_peak_kib() - base))
+        os.write(w_fd, out.encode('utf-8'))
+        os._exit(0)
+
+    c.close()
+    os.close(w_fd)
+    out = b''
+    while True:
+        chunk = os.read(r_fd, 65536)
+        if not chunk:
+            break
+        out += chunk
+    os.close(r_fd)
+    os.waitpid(writer, 0)
+    os.waitpid(reader, 0)
+    rc = json.loads(out.decode('utf-8'))
+    return name, rc['latency'], rc['rss_kib']
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--size-mb', type=float, default=50)
+    parser.add_argument('--iterations', type=int, default=5)
+    args = parser.parse_args()
+
+    # Readers are forked after this, their RSS growth is measured from
+    # their own starting point so the reply held here is not counted.
+    wire = _reply_build(args.size_mb)
+    sys.stdout.write("Reply size: %.1f MiB, %d iterations\n" %
+                     (len(wire) / float(2 ** 20), args.iterations))
+    sys.stdout.write("%-24s %12s %12s %16s\n" %
+                     ('reader', 'median (s)', 'max (s)', 'peak RSS +MiB'))
+
+    for decode in (False, True):
+        for (name, tp_class) in (('legacy', LegacyTransPort),
+                                 ('preallocated', TransPort)):
+            name = "%s%s" % (name, ' + decode' if decode else '')
+            (name, latency, rss_kib) = _run_one(name, tp_class, wire,
+                                                args.iterations, decode)
+            latency.sort()
+            sys.stdout.write("%-24s %12.3f %12.3f %16.1f\n" %
+                             (name, latency[len(latency) // 2], latency[-1],
+                              rss_kib / 1024.0))
+
+
+if __name__ == '__main__':
+    main()
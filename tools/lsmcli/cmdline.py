@@ -20,7 +20,6 @@
 import sys
 import getpass
 import re
-import time
 import tty
 import termios
 from argparse import ArgumentParser, ArgumentTypeError
@@ -357,8 +356,37 @@ def _sd_paths_cache():
     return lookup
 
 
+class _VolumeSdPaths(Volume):
+    """
+    Volume with the local SCSI disk paths appended for display.
+    """
+    __slots__ = ('sd_paths',)
+
+
+class _DiskSdPaths(Disk):
+    """
+    Disk with the local SCSI disk paths appended for display.
+    """
+    __slots__ = ('sd_paths',)
+
+
+_SD_PATHS_CLASSES = {Volume: _VolumeSdPaths, Disk: _DiskSdPaths}
+
+
 def _add_sd_paths(lsm_obj):
+    """
+    Returns a copy of the Volume or Disk with a 'sd_paths' property holding
+    the local disk paths of it.  The lsm data classes have no room for extra
+    attributes.  Other objects are returned as is.
+    """
     global LOCAL_DISK_LOOKUP
+    if type(lsm_obj) not in _SD_PATHS_CLASSES:
+        return lsm_obj
+
+    orig_obj = lsm_obj
+    lsm_obj = object.__new__(_SD_PATHS_CLASSES[type(orig_obj)])
+    for attr in type(orig_obj).__slots__:
+        setattr(lsm_obj, attr, getattr(orig_obj, attr))
     lsm_obj.sd_paths = []
 
     if LOCAL_DISK_LOOKUP is None:
@@ -1686,12 +1714,14 @@ def _wait_for_it(self, msg, job, item):
                 self.shutdown(ErrorNumber.JOB_STARTED)
 
             while True:
-                (s, percent, item) = self.c.job_status(job)
+                # The plug-in returns once the job is done or its time-out
+                # passed, no need to sleep in between.
+                (s, percent, item) = self.c.job_wait(job)
 
                 if s == JobStatus.INPROGRESS:
                     # Add an option to spit out progress?
                     # print "%s - Percent %s complete" % (job, percent)
-                    time.sleep(0.25)
+                    continue
                 elif s == JobStatus.COMPLETE:
                     self.c.job_free(job)
                     return item
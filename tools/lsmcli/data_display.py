@@ -940,11 +940,22 @@ def _find_max_width(two_d_list, column_index):
                 max_width = len(row_data[column_index])
         return max_width
 
+    @staticmethod
+    def _value_convert_of(obj):
+        """
+        Returns the VALUE_CONVERT entry for the type of obj or the closest
+        base class of it which has one, None if there is none.
+        """
+        for cls in type(obj).__mro__:
+            if cls in DisplayData.VALUE_CONVERT:
+                return DisplayData.VALUE_CONVERT[cls]
+        return None
+
     @staticmethod
     def _data_dict_gen(obj, flag_human, flag_enum, display_way,
                        extra_properties=None, flag_dsp_all_data=False):
         data_dict = OrderedDict()
-        value_convert = DisplayData.VALUE_CONVERT[type(obj)]
+        value_convert = DisplayData._value_convert_of(obj)
         headers = value_convert['headers']
         value_conv_enum = value_convert['value_conv_enum']
         value_conv_human = value_convert['value_conv_human']
@@ -992,7 +1003,7 @@ def display_data(objs, display_way=None,
             splitter = DisplayData.DEFAULT_SPLITTER
 
         data_dict_list = []
-        if type(objs[0]) in list(DisplayData.VALUE_CONVERT.keys()):
+        if DisplayData._value_convert_of(objs[0]) is not None:
             for obj in objs:
                 data_dict = DisplayData._data_dict_gen(
                     obj, flag_human, flag_enum, display_way,